@@ -0,0 +1,66 @@
+"""Benchmark a sharded batch run on 1 to N worker processes, and check every run records the same history.
+
+Usage: python -m benchmarks.batch_scaling [--lines N] [--max-workers N] [--chunk-size N] [--seed N]
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+from calculator import Calculator
+from calculator.batch import Sharding, run_batch
+from calculator.storage import FlushPolicy
+
+OPERATIONS = ("add", "subtract", "multiply", "divide")
+
+def batch_lines(count: int, seed: int = 0) -> list:
+    """Generate count operation lines from a fixed seed, with nonzero divisors."""
+    rng = random.Random(seed)
+    return [f"{rng.choice(OPERATIONS)} {rng.randint(1, 10**6) / 100} {rng.randint(1, 10**4) / 7:.6f}"
+            for _ in range(count)]
+
+def worker_counts(max_workers: int) -> list:
+    """1, 2, 4, ... up to max_workers, always ending with max_workers itself."""
+    counts = [1]
+    while counts[-1] * 2 < max_workers:
+        counts.append(counts[-1] * 2)
+    return counts if max_workers == 1 else counts + [max_workers]
+
+def run(directory: str, lines: list, workers: int, chunk_size: int) -> dict:
+    """Run the batch once with the given sharding and return its timing and a digest of what it recorded."""
+    path = os.path.join(directory, f"history-{workers}.csv")
+    calculator = Calculator(history_file=path, flush_policy=FlushPolicy(max_entries=sys.maxsize, snapshot_every=0))
+    output = io.StringIO()
+    report = run_batch(calculator, lines, output=output, sharding=Sharding(workers, chunk_size))
+    calculator.close()
+    with open(path, 'rb') as file:
+        digest = hashlib.sha256(file.read() + output.getvalue().encode('utf-8')).hexdigest()
+    os.remove(path)
+    return {"workers": workers, "elapsed": round(report.elapsed, 4), "ops_per_second": round(report.throughput),
+            "failed": report.failed, "digest": digest}
+
+def main(argv: list = None) -> int:
+    """Run the benchmark from the command line, printing the report as JSON."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=200000)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    lines = batch_lines(args.lines, args.seed)
+    with tempfile.TemporaryDirectory() as directory:
+        runs = [run(directory, lines, workers, args.chunk_size) for workers in worker_counts(args.max_workers)]
+    for result in runs:
+        result["speedup"] = round(runs[0]["elapsed"] / result["elapsed"], 2) if result["elapsed"] > 0 else 0.0
+    # Output and history must not depend on how many workers ran the batch
+    report = {"lines": args.lines, "chunk_size": args.chunk_size, "cores": os.cpu_count(), "runs": runs,
+              "identical": len({result["digest"] for result in runs}) == 1}
+    print(json.dumps(report, indent=2))
+    return 0 if report["identical"] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+"""Benchmark many processes and threads appending to one history file, and check no record is lost.
+
+Usage: python -m benchmarks.concurrent_writers [--processes N] [--threads N] [--records N] [--flush-every N]
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+from decimal import Decimal
+from calculator import Calculator
+from calculator.storage import FlushPolicy
+
+def write_records(path: str, writer_id: int, threads: int, records: int, flush_every: int) -> None:
+    """Append records from several threads sharing one Calculator, tagging each with its writer and sequence."""
+    calculator = Calculator(history_file=path, flush_policy=FlushPolicy(max_entries=flush_every))
+
+    def worker(thread_id: int) -> None:
+        tag = Decimal(writer_id * threads + thread_id)
+        for sequence in range(records):
+            calculator.add_to_history("add", [tag, Decimal(sequence)], tag + sequence)
+
+    workers = [threading.Thread(target=worker, args=(thread_id,)) for thread_id in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    calculator.close()
+
+def verify(path: str, writers: int, records: int) -> dict:
+    """Count the records in the file and find any that are missing, duplicated or malformed."""
+    seen = {}
+    malformed = 0
+    with open(path, 'r', newline='', encoding='utf-8') as file:
+        reader = csv.reader(file)
+        next(reader, None)
+        for row in reader:
+            if len(row) != 3 or len(row[1].split()) != 2:
+                malformed += 1
+                continue
+            key = tuple(row[1].split())
+            seen[key] = seen.get(key, 0) + 1
+    expected = {(str(tag), str(sequence)) for tag in range(writers) for sequence in range(records)}
+    return {
+        "rows": sum(seen.values()) + malformed,
+        "missing": len(expected - set(seen)),
+        "duplicated": sum(1 for count in seen.values() if count > 1),
+        "malformed": malformed,
+    }
+
+def run(path: str, processes: int = 4, threads: int = 4, records: int = 1000, flush_every: int = 1) -> dict:
+    """Run the writers concurrently against path and return throughput and integrity figures."""
+    start = time.perf_counter()
+    workers = [multiprocessing.Process(target=write_records, args=(path, writer_id, threads, records, flush_every))
+               for writer_id in range(processes)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join()
+    elapsed = time.perf_counter() - start
+
+    report = verify(path, processes * threads, records)
+    report.update({
+        "processes": processes, "threads": threads, "records_per_writer": records, "flush_every": flush_every,
+        "expected": processes * threads * records, "elapsed": round(elapsed, 4),
+        "records_per_second": round(processes * threads * records / elapsed) if elapsed > 0 else 0,
+    })
+    report["ok"] = report["rows"] == report["expected"] and not (
+        report["missing"] or report["duplicated"] or report["malformed"])
+    return report
+
+def main(argv: list = None) -> int:
+    """Run the benchmark from the command line, printing the report as JSON."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--records", type=int, default=1000, help="records appended by each thread")
+    parser.add_argument("--flush-every", type=int, default=1, help="entries buffered before each write")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        report = run(os.path.join(directory, "history.csv"), args.processes, args.threads, args.records,
+                     args.flush_every)
+    print(json.dumps(report, indent=2))
+    return 0 if report["ok"] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,43 @@
+"""Reproducible synthetic history files for the benchmarks."""
+import csv
+import os
+import random
+from decimal import Decimal
+from calculator.store import HISTORY_COLUMNS
+
+SCALES = {"small": 1_000, "medium": 100_000, "large": 1_000_000}
+OPERATIONS = ("add", "subtract", "multiply", "divide")
+
+def synthetic_rows(count: int, seed: int = 0):
+    """Yield count (operation, operands, result) rows, the same ones for the same seed."""
+    rng = random.Random(seed)
+    for _ in range(count):
+        operation = rng.choice(OPERATIONS)
+        operand1 = Decimal(rng.randint(-10_000, 10_000)) / 100
+        operand2 = Decimal(rng.randint(1, 10_000)) / 100
+        if operation == "add":
+            result = operand1 + operand2
+        elif operation == "subtract":
+            result = operand1 - operand2
+        elif operation == "multiply":
+            result = operand1 * operand2
+        else:
+            result = operand1 / operand2
+        yield operation, f"{operand1} {operand2}", str(result)
+
+def make_history(path: str, count: int, seed: int = 0) -> str:
+    """Write a CSV history file with count synthetic rows, reusing it if it was already generated."""
+    # LBYL: Datasets are deterministic, so an existing file of the same name can be reused as is
+    if not os.path.isfile(path):
+        temp_path = f"{path}.partial"
+        with open(temp_path, 'w', newline='', encoding='utf-8') as file:
+            writer = csv.writer(file, lineterminator='\n')
+            writer.writerow(HISTORY_COLUMNS)
+            writer.writerows(synthetic_rows(count, seed))
+        os.replace(temp_path, path)
+    return path
+
+def dataset_path(directory: str, scale: str, seed: int = 0) -> str:
+    """Return the path of a generated dataset at one of the named scales."""
+    os.makedirs(directory, exist_ok=True)
+    return make_history(os.path.join(directory, f"history-{scale}-{seed}.csv"), SCALES[scale], seed)
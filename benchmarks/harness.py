@@ -0,0 +1,69 @@
+"""Timing, result files and regression checks shared by the benchmarks."""
+import json
+import platform
+import statistics
+import sys
+import time
+
+def measure(func, repeat: int = 5, number: int = 1) -> dict:
+    """Time func over repeat rounds of number calls and return seconds per call."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        timings.append((time.perf_counter() - start) / number)
+    timings.sort()
+    return {
+        "seconds": statistics.median(timings),
+        "min": timings[0],
+        "max": timings[-1],
+        "repeat": repeat,
+        "number": number,
+    }
+
+def environment() -> dict:
+    """Describe where the results were measured, so comparisons across machines can be spotted."""
+    return {"python": sys.version.split()[0], "platform": platform.platform(), "machine": platform.machine()}
+
+def save_results(path: str, results: dict) -> None:
+    """Write benchmark results as JSON."""
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump({"environment": environment(), "results": results}, file, indent=2, sort_keys=True)
+
+def load_results(path: str) -> dict:
+    """Read results written by save_results."""
+    with open(path, 'r', encoding='utf-8') as file:
+        return json.load(file)["results"]
+
+def compare(current: dict, baseline: dict, threshold: float = 0.10) -> list:
+    """Return (name, baseline seconds, current seconds, change) for every benchmark slower than threshold allows.
+
+    Benchmarks missing from either side are not compared.
+    """
+    regressions = []
+    for name in sorted(set(current) & set(baseline)):
+        before, after = baseline[name]["seconds"], current[name]["seconds"]
+        if before > 0 and after > before * (1 + threshold):
+            regressions.append((name, before, after, after / before - 1))
+    return regressions
+
+def format_table(current: dict, baseline: dict = None) -> str:
+    """Format results as a table, with the change against a baseline when one is given."""
+    lines = [f"{'Benchmark':<40} {'Median':>14} {'Baseline':>14} {'Change':>9}"]
+    for name in sorted(current):
+        seconds = current[name]["seconds"]
+        if baseline and name in baseline and baseline[name]["seconds"] > 0:
+            before = baseline[name]["seconds"]
+            lines.append(f"{name:<40} {_duration(seconds):>14} {_duration(before):>14} {seconds / before - 1:>+9.1%}")
+        else:
+            lines.append(f"{name:<40} {_duration(seconds):>14} {'-':>14} {'-':>9}")
+    return "\n".join(lines)
+
+def _duration(seconds: float) -> str:
+    """Show a duration in the most readable unit."""
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.2f} us"
+    if seconds < 1:
+        return f"{seconds * 1e3:.2f} ms"
+    return f"{seconds:.3f} s"
@@ -0,0 +1,196 @@
+"""Benchmark suite for the calculator hot paths, with JSON results and regression checks.
+
+Usage: python -m benchmarks.suite [--scales small,medium] [--output FILE] [--compare BASELINE] [--threshold 0.1]
+"""
+import argparse
+import contextlib
+import functools
+import io
+import os
+import shutil
+import sys
+import tempfile
+from decimal import Decimal
+from unittest import mock
+from benchmarks.datasets import SCALES, dataset_path
+from benchmarks.harness import compare, format_table, load_results, measure, save_results
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_WORKDIR = os.path.join(tempfile.gettempdir(), "calculator-benchmarks")
+
+# Fixed settings so runs are comparable whatever .env says; load_dotenv never overrides these
+BENCHMARK_ENVIRONMENT = {
+    "ENV": "prod",
+    "CALC_EXECUTOR": "inline",
+    "CALC_RESULT_CACHE_SIZE": "0",
+    "CALC_FLUSH_EVERY": "1",
+    "CALC_FLUSH_INTERVAL_MS": "0",
+    "CALC_FSYNC": "0",
+    "CALC_SNAPSHOT_EVERY": "0",  # Snapshots are written explicitly, never by a background thread mid-measurement
+}
+
+REPL_LINES = {
+    "add": "add 1234.5 678.25",
+    "subtract": "subtract 1234.5 678.25",
+    "multiply": "multiply 1234.5 678.25",
+    "divide": "divide 1234.5 678.25",
+    "add_nary": "add 1 2 3 4 5 6 7 8",
+    "eval": "eval (1234.5 + 678.25) * 3 / 7",
+}
+
+@contextlib.contextmanager
+def working_directory(path: str):
+    """Run a block inside path, so the REPL's logs and data directories are created there."""
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+def _quiet_repl(history_file: str, lines: list) -> None:
+    """Drive main.repl with scripted input and discarded output."""
+    import main  # pylint: disable=import-outside-toplevel
+    inputs = iter([history_file, *lines, "exit"])
+    with mock.patch("builtins.input", lambda prompt="": next(inputs)), \
+            mock.patch("builtins.print", lambda *args, **kwargs: None):
+        main.repl()
+
+def _repl_round(history_file: str, lines: list) -> None:
+    """One measured REPL run, always starting from the same empty history."""
+    if os.path.exists(history_file):
+        os.remove(history_file)
+    _quiet_repl(history_file, lines)
+
+def _show_all(calculator, output: io.StringIO) -> None:
+    """Print the whole history and drop what was printed, so the buffer does not grow across rounds."""
+    calculator.show_history()
+    output.seek(0)
+    output.truncate()
+
+def bench_repl_dispatch(workdir: str, repeat: int, lines: int = 2000) -> dict:
+    """Per-line latency of each operation through the REPL loop, history writes included."""
+    results = {}
+    history_file = os.path.join(workdir, "data", "repl-history.csv")
+    # Callables are bound with functools.partial, a closure would see the loop's last values
+    for name, line in REPL_LINES.items():
+        timing = measure(functools.partial(_repl_round, history_file, [line] * lines), repeat=repeat)
+        for key in ("seconds", "min", "max"):
+            timing[key] /= lines
+        timing["number"] = lines
+        results[f"repl_dispatch.{name}"] = timing
+    return results
+
+def bench_add_to_history(workdir: str, scales: list, repeat: int, appends: int = 2000) -> dict:
+    """Seconds per add_to_history call on top of histories of each size, writing every entry."""
+    from calculator import Calculator  # pylint: disable=import-outside-toplevel
+    from calculator.storage import FlushPolicy  # pylint: disable=import-outside-toplevel
+    results = {}
+    operands = [Decimal("1234.5"), Decimal("678.25")]
+    for scale in scales:
+        path = os.path.join(workdir, "data", f"append-{scale}.csv")
+        shutil.copyfile(dataset_path(os.path.join(workdir, "data"), scale), path)
+        calculator = Calculator(history_file=path, flush_policy=FlushPolicy(max_entries=1))
+        results[f"add_to_history.{scale}"] = measure(
+            functools.partial(calculator.add_to_history, "add", operands, Decimal("1912.75")),
+            repeat=repeat, number=appends)
+        calculator.close()
+        os.remove(path)
+    return results
+
+def bench_load_and_show(workdir: str, scales: list, repeat: int) -> dict:
+    """Time to open, reload and display histories of each size."""
+    from calculator import Calculator  # pylint: disable=import-outside-toplevel
+    from calculator.storage import snapshot_path, write_snapshot  # pylint: disable=import-outside-toplevel
+    results = {}
+    for scale in scales:
+        path = dataset_path(os.path.join(workdir, "data"), scale)
+        # Without a snapshot the whole journal is replayed, with one only its header is read
+        if os.path.isfile(snapshot_path(path)):
+            os.remove(snapshot_path(path))
+        results[f"load_journal.{scale}"] = measure(functools.partial(Calculator, history_file=path), repeat=repeat)
+        write_snapshot(path)
+        results[f"load.{scale}"] = measure(functools.partial(Calculator, history_file=path), repeat=repeat)
+        calculator = Calculator(history_file=path)
+        results[f"load_history.{scale}"] = measure(functools.partial(calculator.load_history, path), repeat=repeat)
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            results[f"show_tail.{scale}"] = measure(functools.partial(calculator.show_history, tail=20),
+                                                    repeat=repeat)
+            # The full listing is the slow path, so it is not repeated at the largest scales
+            results[f"show_all.{scale}"] = measure(functools.partial(_show_all, calculator, output),
+                                                   repeat=repeat if SCALES[scale] <= 100_000 else 1)
+        calculator.close()
+    return results
+
+def bench_discovery(workdir: str, repeat: int) -> dict:
+    """Plugin discovery with no manifest (parsing every plugin) and with a cached one."""
+    from calculator.discovery import PluginCatalog  # pylint: disable=import-outside-toplevel
+    from calculator.registry import PLUGINS_DIRECTORY, PLUGINS_PACKAGE  # pylint: disable=import-outside-toplevel
+    manifest = os.path.join(workdir, "plugin_manifest.json")
+
+    def cold():
+        if os.path.exists(manifest):
+            os.remove(manifest)
+        PluginCatalog(PLUGINS_PACKAGE, PLUGINS_DIRECTORY, manifest)
+
+    results = {"discovery.cold": measure(cold, repeat=repeat, number=20)}
+    results["discovery.warm"] = measure(lambda: PluginCatalog(PLUGINS_PACKAGE, PLUGINS_DIRECTORY, manifest),
+                                        repeat=repeat, number=20)
+    return results
+
+BENCHMARKS = ("repl_dispatch", "add_to_history", "load", "discovery")
+
+def run(workdir: str = DEFAULT_WORKDIR, scales: list = ("small", "medium"), repeat: int = 5,
+        only: list = BENCHMARKS, repl_lines: int = 2000) -> dict:
+    """Run the selected benchmarks and return their results keyed by benchmark name."""
+    os.makedirs(os.path.join(workdir, "data"), exist_ok=True)
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)  # main.py is imported from the repository root
+
+    results = {}
+    with mock.patch.dict(os.environ, BENCHMARK_ENVIRONMENT), working_directory(workdir):
+        if "discovery" in only:
+            results.update(bench_discovery(workdir, repeat))
+        if "repl_dispatch" in only:
+            results.update(bench_repl_dispatch(workdir, repeat, repl_lines))
+        if "add_to_history" in only:
+            results.update(bench_add_to_history(workdir, scales, repeat))
+        if "load" in only:
+            results.update(bench_load_and_show(workdir, scales, repeat))
+    return results
+
+def main(argv: list = None) -> int:
+    """Run the suite from the command line; the exit status is 1 when a regression is found."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", default="small,medium", help=f"comma separated, from {', '.join(SCALES)}")
+    parser.add_argument("--only", default=",".join(BENCHMARKS), help=f"comma separated, from {', '.join(BENCHMARKS)}")
+    parser.add_argument("--repeat", type=int, default=5, help="rounds per benchmark, the median is reported")
+    parser.add_argument("--workdir", default=DEFAULT_WORKDIR, help="where datasets are generated and kept")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", metavar="BASELINE", help="compare against results saved with --output")
+    parser.add_argument("--threshold", type=float, default=0.10, help="slowdown flagged as a regression (0.10 = 10%%)")
+    args = parser.parse_args(argv)
+
+    scales = [scale for scale in args.scales.split(",") if scale]
+    # LBYL: Reject unknown names before spending minutes on the benchmarks that are valid
+    unknown = [scale for scale in scales if scale not in SCALES] + \
+        [name for name in args.only.split(",") if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown scale or benchmark: {', '.join(unknown)}")
+
+    results = run(os.path.abspath(args.workdir), scales, args.repeat, args.only.split(","))
+    baseline = load_results(args.compare) if args.compare else None
+    print(format_table(results, baseline))
+    if args.output:
+        save_results(args.output, results)
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold)
+        for name, before, after, change in regressions:
+            print(f"REGRESSION {name}: {before:.3g}s -> {after:.3g}s ({change:+.1%})", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,58 +1,213 @@
-import pandas as pd
+from __future__ import annotations
 from decimal import Decimal
 import logging
 import os
+import threading
+from typing import TYPE_CHECKING
+from calculator.metrics import timed
+from calculator.numeric import NumericBackend, backend_from_env, display_number, encode_number
+from calculator.operands import OPERAND_SEPARATOR, encode_operand_columns, encode_operands
+from calculator.stats import HistoryStats, stats_path
+from calculator.store import HISTORY_COLUMNS, HistoryStore
+from calculator.storage import (
+    FlushPolicy, compact_parts, compact_segments, file_lock, head_rows, iter_rows, open_history_file, open_store,
+    page_rows, query_rows, read_columns, read_history, remove_parts, remove_segments, repack_active, snapshot_path,
+    tail_rows, write_history,
+)
+
+if TYPE_CHECKING:
+    import pandas as pd  # Only imported once a DataFrame is actually asked for
 
 logger = logging.getLogger('calculator_app')
 
 class Calculator:
-    def __init__(self, history_file: str = None):
+    def __init__(self, history_file: str = None, flush_policy: FlushPolicy = None, backend: NumericBackend = None):
         self.history_file = history_file
-        self.active_history_file = self.history_file  # Track the currently active file
+        self.flush_policy = flush_policy or FlushPolicy.from_env()
+        self.backend = backend or backend_from_env()  # How input is parsed and which number type it becomes
+        self.history_writer = None
+        self._lock = threading.RLock()  # Keeps the store and the history file in step across threads
+        self.set_active_file(self.history_file)  # Track the currently active file
+        self.store = HistoryStore()  # Append-only columns, a DataFrame is only built on request
+        self._stats = HistoryStats()  # Running aggregates, None until they are needed again
         
         # LBYL: Check if the file exists and is not empty
         if os.path.isfile(self.history_file) and os.path.getsize(self.history_file) > 0:
-            self.history = self.load_history(self.history_file)  # Load history from the file COV-NA
-            logger.info(f"History loaded from {self.history_file}")
+            # Only the journal past the snapshot is parsed, pandas is not imported until a DataFrame is needed
+            self._read_store(self.history_file)  # COV-NA
+            logger.info("History loaded from %s", self.history_file)
         else:
             # EAFP: Assume the history file might not exist or be empty, handle with empty history
-            self.history = pd.DataFrame(columns=["operation", "operands", "result"])
-            logger.info(f"Starting with empty history, no valid file found at {self.history_file}")
-        
-        self.new_entries = []  # Keep track of new entries added during the session
+            logger.info("Starting with empty history, no valid file found at %s", self.history_file)
 
-    def add_to_history(self, operation: str, operands: list, result: Decimal) -> None:
-        """Add a calculation to the history and save it to the active history file."""
-        new_entry = {
-            "operation": operation,
-            "operands": str(operands),
-            "result": result
-        }
-        self.history = pd.concat([self.history, pd.DataFrame([new_entry])], ignore_index=True)
-        self.new_entries.append(new_entry)
-        logger.info(f"Added to history: {operation} with operands {operands} = {result}")
+    def set_active_file(self, path: str) -> None:
+        """Make path the active history file, flushing entries buffered for the previous one."""
+        if self.history_writer is not None:
+            if self.history_writer.path == path:
+                return
+            self.history_writer.close()
+        self.active_history_file = path
+        self.history_writer = open_history_file(path, self.flush_policy)
+
+    @property
+    def history(self) -> pd.DataFrame:
+        """The calculation history as a DataFrame, built lazily from the store."""
+        return self.store.to_frame()
+
+    @history.setter
+    def history(self, frame: pd.DataFrame) -> None:
+        self.store = HistoryStore.from_frame(frame)
+        self._stats = HistoryStats.load(self.active_history_file, len(self.store))
+
+    def open_history(self, path: str) -> None:
+        """Make path the active history file and read it into memory, starting empty if it does not exist."""
         self.save_history()
+        self.set_active_file(path)
+        # LBYL: A new file starts empty, an existing one is read into the store
+        if os.path.isfile(path) and os.path.getsize(path) > 0:
+            self._read_store(path)
+        else:
+            self.store = HistoryStore()
+            self._stats = HistoryStats()
+        logger.info("Switched to history file: %s", path)
 
-    def save_history(self) -> None:
-        """Save only new entries to the active history file."""
-        if self.new_entries:  # LBYL: Check if there are new entries to save
-            new_entries_df = pd.DataFrame(self.new_entries)
-            
-            # EAFP: Assume file creation will work, handle errors if it fails
+    def _read_store(self, path: str) -> None:
+        """Replace the in-memory history with the contents of path, older entries being read on first use."""
+        self.store = open_store(path, self.flush_policy)
+        self._stats = HistoryStats.load(path, len(self.store))
+
+    @property
+    def stats(self) -> HistoryStats:
+        """Running aggregates of the history, computed from the in-memory history only when missing."""
+        with self._lock:
+            # LBYL: The store may have been replaced without the aggregates following it
+            if self._stats is None or self._stats.rows != len(self.store):
+                self._stats = HistoryStats.from_columns(*(self.store.column(column) for column in HISTORY_COLUMNS))
+            return self._stats
+
+    @timed("history", "append")
+    def add_to_history(self, operation: str, operands: list, result: Decimal) -> None:
+        """Add a calculation to the history and queue it for the active history file."""
+        encoded = encode_operands(operands)
+        encoded_result = encode_number(result)
+        with self._lock:
+            self.store.append(operation, encoded, encoded_result)
+            if self._stats is not None:
+                self._stats.add(operation, operands, result)
+            # EAFP: The flush policy may write right away, handle errors if it fails
             try:
-                if not os.path.isfile(self.active_history_file):
-                    new_entries_df.to_csv(self.active_history_file, mode='w', index=False)
-                    logger.info(f"History saved to new file: {self.active_history_file}")
-                else:
-                    # Append only the new entries to the active history file
-                    new_entries_df.to_csv(self.active_history_file, mode='a', index=False, header=False)
-                    logger.info(f"New entries appended to {self.active_history_file}")
-                self.new_entries.clear()  # Clear the new entries after saving
+                self.history_writer.append((operation, encoded, encoded_result))
             except Exception as e: #COV-NA
-                logger.error(f"Error saving history: {e}")
+                logger.error("Error saving history: %s", e)
+        logger.info("Added to history: %s with operands %s = %s", operation, encoded, result)
+
+    @timed("history", "append_many")
+    def add_many_to_history(self, operation: str, operand_columns: list, results) -> None:
+        """Add a block of calculations of one operation, with operands given column-wise."""
+        results = results.tolist() if hasattr(results, 'tolist') else list(results)
+        operands = encode_operand_columns(operand_columns)
+        encoded_results = list(map(encode_number, results))
+        with self._lock:
+            self.store.extend([operation] * len(results), operands, encoded_results)
+            if self._stats is not None:
+                self._stats.add_block(operation, operand_columns, results)
+            # EAFP: The flush policy may write right away, handle errors if it fails
+            try:
+                self.history_writer.append_many(list(zip([operation] * len(results), operands, encoded_results)))
+            except Exception as e: #COV-NA
+                logger.error("Error saving history: %s", e)
+        logger.info("Added %s %s entries to history", len(results), operation)
+
+    @timed("history", "merge")
+    def merge_history(self, operations: list, operands: list, results: list, stats: HistoryStats) -> None:
+        """Add a block of entries whose operands are already encoded, with the aggregates computed alongside.
+
+        This is how the history a batch shard built in a worker process is merged.
+        """
+        encoded_results = list(map(encode_number, results))
+        with self._lock:
+            self.store.extend(operations, operands, encoded_results)
+            if self._stats is not None:
+                self._stats.merge(stats)
+            # EAFP: The flush policy may write right away, handle errors if it fails
+            try:
+                self.history_writer.append_many(list(zip(operations, operands, encoded_results)))
+            except Exception as e: #COV-NA
+                logger.error("Error saving history: %s", e)
+        logger.info("Merged %s entries into history", len(results))
+
+    @timed("history", "save")
+    def save_history(self) -> None:
+        """Write every buffered entry to the active history file."""
+        # EAFP: Assume the write will work, handle errors if it fails
+        try:
+            self.history_writer.flush()
+        except Exception as e: #COV-NA
+            logger.error("Error saving history: %s", e)
+        self._save_stats()
+
+    def close(self) -> None:
+        """Flush buffered entries and release the active history file."""
+        self.history_writer.close()
+        self._save_stats()
+
+    def _save_stats(self) -> None:
+        """Write the running aggregates next to the active file if they changed since the last save."""
+        # LBYL: A summary is only worth keeping for a history file that exists
+        if self._stats is None or not self._stats.dirty or not os.path.isfile(self.active_history_file):
+            return
+        # EAFP: The summary is only a cache, failing to write it costs a rebuild later
+        try:
+            self._stats.save(self.active_history_file)
+        except OSError as e: #COV-NA
+            logger.warning("Could not save history summary: %s", e)
+
+    def history_stats(self, rebuild: bool = False) -> dict:
+        """Per-operation counts and result and operand aggregates, without reading the history file.
+
+        rebuild=True recomputes them from scratch from the active file on disk.
+        """
+        if rebuild:
+            self.save_history()
+            with self._lock:
+                # LBYL: A missing file has no entries to aggregate
+                if os.path.isfile(self.active_history_file) and os.path.getsize(self.active_history_file) > 0:
+                    columns = read_columns(self.active_history_file)
+                    self._stats = HistoryStats.from_columns(*(columns[column] for column in HISTORY_COLUMNS))
+                else:
+                    self._stats = HistoryStats()
+                self._stats.dirty = True
+                logger.info("Rebuilt history summary from %s", self.active_history_file)
+            self._save_stats()
+        return self.stats.summary(self.store)
+
+    def show_stats(self, rebuild: bool = False) -> None:
+        """Print the per-operation aggregates as a table."""
+        summary = self.history_stats(rebuild)
+        if not summary:
+            print("No history recorded.")
+            return
+        print("\nHistory Statistics:")
+        print(f"{'Operation':<15} {'Count':<8} {'Sum':<14} {'Mean':<14} {'Min':<12} {'Max':<12}")
+        print("=" * 80)
+        for operation, values in summary.items():
+            for label, aggregate in ((operation, values["results"]), ("  operands", values["operands"])):
+                cells = [_format_number(aggregate[key]) for key in ("sum", "mean", "min", "max")]
+                print(f"{label:<15} {aggregate['count']:<8} {cells[0]:<14} {cells[1]:<14} {cells[2]:<12} {cells[3]:<12}")
+            per_entry = ", ".join(f"{size} operands: {count}" for size, count in values["arity"].items())
+            print(f"{'':<15} {per_entry}")
+        print("")
 
+    @staticmethod
+    def read_history_file(path: str, columns: list = None) -> pd.DataFrame:
+        """Read a history file in the format given by its extension (.csv, .npz, .parquet, .feather)."""
+        return read_history(path, columns)
+
+    @timed("history", "load")
     def load_history(self, new_filename: str = None) -> pd.DataFrame:
         """Load history from a new file or the active file."""
+        self.save_history()  # Buffered entries must be on disk before the file is read back
+
         if new_filename:
 
             if "data" in new_filename: #COV-NA
@@ -63,105 +218,176 @@ class Calculator:
             # LBYL: Check if the file exists before attempting to load
             if os.path.isfile(full_path):
                 try:
-                    self.active_history_file = full_path
-                    loaded_history = pd.read_csv(full_path)
-                    self.history = loaded_history
-                    logger.info(f"Switched to history file: {self.active_history_file}")
+                    self.set_active_file(full_path)
+                    self._read_store(full_path)
+                    loaded_history = self.history
+                    logger.info("Switched to history file: %s", self.active_history_file)
                     return loaded_history
                 except Exception as e: #COV-NA
-                    logger.error(f"Error loading history from {full_path}: {e}")
-                    return pd.DataFrame(columns=["operation", "operands", "result"])
+                    logger.error("Error loading history from %s: %s", full_path, e)
+                    return HistoryStore().to_frame()
             else:
-                logger.error(f"History file '{full_path}' does not exist.")
-                return pd.DataFrame(columns=["operation", "operands", "result"])
+                logger.error("History file '%s' does not exist.", full_path)
+                return HistoryStore().to_frame()
         
         # EAFP: Assume loading from the active file works, handle errors if it fails
         try: #COV-NA
             if os.path.isfile(self.active_history_file):
-                loaded_history = pd.read_csv(self.active_history_file)
-                self.history = loaded_history
-                logger.info(f"History loaded from {self.active_history_file}")
+                self._read_store(self.active_history_file)
+                loaded_history = self.history
+                logger.info("History loaded from %s", self.active_history_file)
                 return loaded_history
             else:
-                logger.warning(f"No history file found: {self.active_history_file}. Starting with empty history.")
-                return pd.DataFrame(columns=["operation", "operands", "result"])
+                logger.warning("No history file found: %s. Starting with empty history.", self.active_history_file)
+                return HistoryStore().to_frame()
         except Exception as e: #COV-NA
-            logger.error(f"Failed to load history: {e}")
-            return pd.DataFrame(columns=["operation", "operands", "result"])
+            logger.error("Failed to load history: %s", e)
+            return HistoryStore().to_frame()
 
+    @timed("history", "clear")
     def clear_history(self) -> None:
         """Clear the calculation history by deleting the active file."""
-        # LBYL: Check if the file exists before deleting
-        if os.path.isfile(self.active_history_file):
-            try:
-                os.remove(self.active_history_file)  # EAFP: Attempt to remove the file
-                logger.info(f"Cleared history by deleting file: {self.active_history_file}")
-                self.history = pd.DataFrame(columns=["operation", "operands", "result"])  # Reset history DataFrame
-            except Exception as e: #COV-NA
-                logger.error(f"Failed to clear history file: {e}")
-        else:
-            logger.warning(f"Attempted to clear non-existent history file: {self.active_history_file}")
+        with self._lock:
+            self.history_writer.discard()  # Entries not yet written are part of the history being cleared
 
-    def delete_last_calculation(self) -> None:
-        """Delete the last calculation from the active history file."""
-        if os.path.isfile(self.active_history_file) and os.path.getsize(self.active_history_file) > 0: #COV-NA  # LBYL: Check if the file exists and is not empty
-            try:
-                # Read the current history from the active file
-                with open(self.active_history_file, 'r') as file:
-                    lines = file.readlines()
-                
-                # Check if there are lines to delete
-                if lines:
-                    # Remove the last line
-                    lines = lines[:-1]  # Retain all but the last line
-                    
-                    # Write the updated lines back to the file
-                    with open(self.active_history_file, 'w') as file:
-                        file.writelines(lines)
-                    
-                    logger.info(f"Deleted the last calculation from {self.active_history_file}.")
-                else:
-                    logger.warning("Attempted to delete from an empty history file.")
-            except Exception as e:
-                logger.error(f"Error while deleting the last calculation: {e}")
-        else:
-            logger.warning(f"Active history file '{self.active_history_file}' does not exist or is empty.")
+            # LBYL: Check if the file exists before deleting
+            if os.path.isfile(self.active_history_file):
+                try:
+                    # EAFP: Attempt to remove the file, other processes writing to it wait for the lock
+                    with file_lock(self.active_history_file):
+                        os.remove(self.active_history_file)
+                        for sidecar in (stats_path(self.active_history_file), snapshot_path(self.active_history_file)):
+                            if os.path.isfile(sidecar):
+                                os.remove(sidecar)
+                        remove_segments(self.active_history_file)  # Sealed segments are part of the history
+                        remove_parts(self.active_history_file)  # And so are the parts of a binary history
+                    logger.info("Cleared history by deleting file: %s", self.active_history_file)
+                    self.store.clear()  # Reset in-memory history
+                    self._stats = HistoryStats()
+                except Exception as e: #COV-NA
+                    logger.error("Failed to clear history file: %s", e)
+            else:
+                logger.warning("Attempted to clear non-existent history file: %s", self.active_history_file)
 
-    def show_history(self) -> None:
-        """Print the current history in a user-friendly format."""
-        self.history = self.load_history(self.active_history_file)
-        
-        if self.history.empty:  # LBYL: Check if history is empty
+    @timed("history", "compact")
+    def compact_history(self) -> int:
+        """Merge the sealed segments of the active history and return how many were merged away.
+
+        A compressed history also has its active file repacked into one stream, and a binary history has
+        its parts merged back into the history file.
+        """
+        # With compact_rows at 0 (no automatic compaction) every sealed segment is merged into one
+        merged = compact_segments(self.active_history_file, self.flush_policy.segments.compact_rows)
+        with self._lock:
+            self.save_history()  # Buffered entries are repacked with the rest
+            with file_lock(self.active_history_file):
+                repack_active(self.active_history_file, self.flush_policy.fsync)
+                merged += compact_parts(self.active_history_file, self.flush_policy.fsync)
+        logger.info("Compacted %s segment(s) of %s", merged, self.active_history_file)
+        return merged
+
+    @timed("history", "delete")
+    def delete_last_calculation(self, count: int = 1) -> None:
+        """Delete the last count calculations from the active history file and the in-memory history."""
+        # LBYL: Check there is something to delete, buffered entries count as well
+        if self.history_writer.pending == 0 and not (
+                os.path.isfile(self.active_history_file) and os.path.getsize(self.active_history_file) > 0):
+            logger.warning("Active history file '%s' does not exist or is empty.", self.active_history_file)
+            return
+
+        try:
+            # EAFP: Entries are cut off the end of the file instead of rewriting it
+            with self._lock:
+                removed = self.history_writer.delete_last(count)
+                if removed:
+                    self.store.truncate(len(removed))
+                    if self._stats is not None:
+                        self._stats.remove(removed)
+            if removed:
+                logger.info("Deleted the last %s calculation(s) from %s.", len(removed), self.active_history_file)
+            else:
+                logger.warning("Attempted to delete from an empty history file.")
+        except Exception as e:
+            logger.error("Error while deleting the last calculation: %s", e)
+
+    @timed("history", "show")
+    def show_history(self, head: int = None, tail: int = None, page: int = None, page_size: int = None) -> None:
+        """Print the history in a user-friendly format, streaming it from the active file.
+
+        Only one of head, tail or page is used; without any of them every entry is printed.
+        A page_size without a page shows the first page of that size, pages hold 20 entries by default.
+        """
+        self.save_history()  # Buffered entries must be on disk before the file is read back
+
+        # LBYL: Check if there is a history file to read
+        if not os.path.isfile(self.active_history_file) or os.path.getsize(self.active_history_file) == 0:
             print("No history recorded.")
             return
 
         try:
-            # Split operands into operand1 and operand2 columns for display
-            display_history = self.history.copy()
-            display_history[['operand1', 'operand2']] = pd.DataFrame(
-                display_history['operands'].apply(lambda op: eval(op) if isinstance(op, str) else op).tolist(),
-                index=display_history.index
-            )
+            if tail is not None:
+                rows = tail_rows(self.active_history_file, tail)
+                # The in-memory store holds as many entries as the file, so its length numbers the tail
+                first_index = max(len(self.store) - len(rows), 0) + 1
+            elif head is not None:
+                rows, first_index = head_rows(self.active_history_file, head), 1
+            elif page is not None or page_size is not None:
+                page, page_size = page or 1, page_size or 20
+                rows, first_index = page_rows(self.active_history_file, page, page_size), (page - 1) * page_size + 1
+            else:
+                rows, first_index = iter_rows(self.active_history_file), 1
+            self._print_rows(rows, first_index)
         except Exception as e:  # EAFP: Handle any error in processing history
-            logger.error(f"Failed to process operands for display: {e}")
+            logger.error("Failed to process history for display: %s", e)
             print("Error processing history data.")
-            return
 
-        # Display formatted history
-        print("\nCurrent History:")
-        print(f"{'Index':<5} {'Operation':<15} {'Operand1':<10} {'Operand2':<10} {'Result':<10}")
-        print("=" * 60)
-        for index, row in display_history.iterrows():
-            print(f"{index + 1:<5} {row['operation']:<15} {row['operand1']:<10} {row['operand2']:<10} {row['result']:<10}")
-        print("")
+    @timed("history", "query")
+    def query_history(self, **filters) -> list:
+        """Return the entries of the active file matching the filters, see storage.query_rows.
+
+        SQLite history files run the filters as an indexed query, other formats are streamed.
+        """
+        self.save_history()  # Buffered entries must be on disk before the file is queried
+        # LBYL: Nothing matches in a file that does not exist yet
+        if not os.path.isfile(self.active_history_file) or os.path.getsize(self.active_history_file) == 0:
+            return []
+        return query_rows(self.active_history_file, **filters)
 
+    def show_query(self, **filters) -> None:
+        """Print the entries of the active file matching the filters."""
+        self._print_rows(self.query_history(**filters), 1)
+
+    @staticmethod
+    def _print_rows(rows, first_index: int) -> None:
+        """Print history rows as a table, splitting operands into the first operand and the rest."""
+        printed = False
+        for index, (operation, operands, result) in enumerate(rows, start=first_index):
+            if not printed:
+                print("\nCurrent History:")
+                print(f"{'Index':<5} {'Operation':<15} {'Operand1':<10} {'Operand2':<10} {'Result':<10}")
+                print("=" * 60)
+                printed = True
+            # Values are shown as typed, 0.25 rather than its encoding 0.25f and 3 rather than 3/1
+            first, *rest = [display_number(operand) for operand in str(operands).split(OPERAND_SEPARATOR)]
+            print(f"{index:<5} {operation:<15} {first:<10} {' '.join(rest):<10} {display_number(result):<10}")
+
+        if printed:
+            print("")
+        else:
+            print("No history recorded.")
+
+    @timed("history", "save_as")
     def save_as_new_file(self, new_filename: str) -> None:
         """Save a copy of the current history to a new file."""
+        self.save_history()  # Buffered entries must be on disk before the file is copied
 
-        self.history = self.load_history(self.active_history_file)
+        # The copy is read from the active file's snapshot and journal, the in-memory history is left as it is
+        if os.path.isfile(self.active_history_file) and os.path.getsize(self.active_history_file) > 0:
+            history = open_store(self.active_history_file).encoded_frame()
+        else:
+            history = HistoryStore().encoded_frame()
 
-        
-        if self.history.empty: #COV-NA
+        if history.empty: #COV-NA
             print("No history to save.")
             return 
         else:
@@ -173,11 +399,14 @@ class Calculator:
                 else:
                     full_path = os.path.join('data', new_filename)
         
-            # Ensure only the necessary columns are saved
-            history_to_save = self.history[['operation', 'operands', 'result']]
-            history_to_save.to_csv(full_path, mode='w', index=False)
-            logger.info(f"History saved as a copy to {full_path}")
+            # The extension of the new file picks its format, converting from the active one
+            write_history(full_path, history)
+            logger.info("History saved as a copy to %s", full_path)
 
     def get_history(self):
         """Retrieve the calculation history as a list of dictionaries."""
-        return self.history.to_dict(orient='records') if isinstance(self.history, pd.DataFrame) else self.history
+        return self.store.records()
+
+def _format_number(value) -> str:
+    """Show an aggregate compactly, or '-' when there is none."""
+    return "-" if value is None else f"{value:.10g}"
@@ -0,0 +1,209 @@
+"""Non-interactive batch evaluation of operation files, in this process or sharded across worker processes."""
+import collections
+import concurrent.futures
+import itertools
+import logging
+import os
+import sys
+import time
+from decimal import Decimal, InvalidOperation
+from calculator import Calculator
+from calculator.expression import EVAL_OPERATION, NARY_OPERATIONS, ExpressionEngine
+from calculator.numeric import NumericBackend
+from calculator.operands import encode_operands
+from calculator.registry import CommandRegistry
+from calculator.stats import HistoryStats
+
+logger = logging.getLogger('calculator_app')
+
+class BatchReport:
+    """Counts and timing for one batch run, printing each result to output unless quiet."""
+    def __init__(self, output=sys.stdout, quiet: bool = False):
+        self.output = output
+        self.quiet = quiet
+        self.succeeded = 0
+        self.failed = 0
+        self.elapsed = 0.0
+
+    @property
+    def total(self) -> int:
+        """Number of operations attempted."""
+        return self.succeeded + self.failed
+
+    @property
+    def throughput(self) -> float:
+        """Operations per second."""
+        return self.total / self.elapsed if self.elapsed > 0 else 0.0
+
+    def record(self, number: int, result, error: str) -> None:
+        """Count one executed line and print its result or error."""
+        if error is None:
+            self.succeeded += 1
+            if not self.quiet:
+                print(result, file=self.output)
+        else:
+            self.failed += 1
+            logger.error("Batch line %s failed: %s", number, error)
+            print(f"Line {number}: error: {error}", file=sys.stderr)
+
+    def summary(self) -> str:
+        """One line describing the run."""
+        return (f"Processed {self.total} operations ({self.succeeded} ok, {self.failed} failed) "
+                f"in {self.elapsed:.3f}s: {self.throughput:,.0f} ops/s")
+
+class Sharding:
+    """How a batch is split across worker processes: chunks of chunk_size lines, run by workers processes.
+
+    One worker (the default) runs the batch in this process; 0 uses one worker per core.
+    """
+    def __init__(self, workers: int = 1, chunk_size: int = 5000):
+        # LBYL: Reject settings that cannot split a batch
+        if workers < 0:
+            raise ValueError("workers cannot be negative.")
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be at least 1.")
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+
+    @classmethod
+    def from_env(cls) -> "Sharding":
+        """Build the settings from the CALC_BATCH_WORKERS and CALC_BATCH_CHUNK variables."""
+        return cls(workers=int(os.getenv('CALC_BATCH_WORKERS', '1')),
+                   chunk_size=int(os.getenv('CALC_BATCH_CHUNK', '5000')))
+
+    @property
+    def parallel(self) -> bool:
+        """Tell whether batches go to a process pool."""
+        return self.workers > 1
+
+class ShardHistory:
+    """Stand-in calculator that collects one shard's history in a worker process.
+
+    Operands are encoded and the aggregates computed here, so merging a shard costs the parent process
+    a few list extensions instead of the work of add_to_history for every entry.
+    """
+    def __init__(self, backend: NumericBackend):
+        self.backend = backend  # Read by the expression engine for eval lines and chained operations
+        self.operations = []
+        self.operands = []
+        self.results = []
+        self.stats = HistoryStats()
+
+    def add_to_history(self, operation: str, operands: list, result) -> None:
+        """Record an entry for the parent process to merge."""
+        self.operations.append(operation)
+        self.operands.append(encode_operands(operands))
+        self.results.append(result)
+        self.stats.add(operation, operands, result)
+
+def parse_line(line: str, parse=Decimal):
+    """Split an 'operation value1 value2' line, returning None for blank lines and comments."""
+    line = line.strip()
+    if not line or line.startswith('#'):
+        return None
+    parts = line.lower().split()
+    return parts[0], [parse(value) for value in parts[1:]]
+
+def run_batch(calculator: Calculator, lines, output=sys.stdout, quiet: bool = False,
+              sharding: Sharding = None) -> BatchReport:
+    """Execute every operation in lines, then write the history once.
+
+    With more than one worker the lines are executed in chunks on a process pool. Results, errors and
+    history entries are still reported and recorded in the order of the lines, whatever the settings.
+    """
+    sharding = sharding or Sharding.from_env()
+    report = BatchReport(output, quiet)
+    start = time.perf_counter()
+
+    if sharding.parallel:
+        _run_sharded(calculator, lines, sharding, report)
+    else:
+        registry = CommandRegistry(calculator)  # One command instance per operation, reused for every line
+        engine = ExpressionEngine(calculator)
+        with calculator.backend.active():
+            for outcome in _execute_lines(registry, engine, enumerate(lines, start=1), calculator.backend.parse):
+                report.record(*outcome)
+
+    calculator.save_history()
+    report.elapsed = time.perf_counter() - start
+    logger.info(report.summary())
+    return report
+
+def _execute_lines(registry: CommandRegistry, engine: ExpressionEngine, numbered_lines, parse):
+    """Execute each (number, line), yielding (number, result, error) for every line that is not blank or a comment."""
+    for number, line in numbered_lines:
+        try:
+            words = line.split(maxsplit=1)
+            # Expressions are compiled from the rest of the line, every other line is a command and its numbers
+            if words and words[0].lower() in (EVAL_OPERATION, "let"):
+                result = _evaluate(engine, words[0].lower(), words[1:])
+            else:
+                parsed = parse_line(line, parse)
+                if parsed is None:
+                    continue
+                result = _execute(registry, engine, *parsed)
+        except (ValueError, TypeError, ArithmeticError, InvalidOperation) as e:
+            # EAFP: A bad line is reported and skipped, the rest of the batch still runs
+            yield number, None, str(e)
+            continue
+        yield number, result, None
+
+def _evaluate(engine: ExpressionEngine, keyword: str, source: list):
+    """Evaluate the expression of an eval line and record it as one entry, like the REPL."""
+    # LBYL: A variable bound by let would only exist in the worker process whose chunk it happened to be in
+    if keyword == "let":
+        raise ValueError("let is not supported in batch mode, write the values into an eval expression instead")
+    if not source:
+        raise ValueError("Usage: eval <expression>")
+    return engine.evaluate(source[0].lower())
+
+def _execute(registry: CommandRegistry, engine: ExpressionEngine, operation: str, values: list):
+    """Run one command line, folding chained operations such as add 1 2 3 into one entry like the REPL."""
+    # LBYL: History management is interactive only
+    if operation == "history":
+        raise ValueError("history commands are not supported in batch mode")
+    # The engine also reports an arithmetic command given fewer than two operands
+    if len(values) != 2 and operation in NARY_OPERATIONS:
+        return engine.apply(operation, values)
+    return registry.get(operation).execute(*values)
+
+def _start_worker() -> None:
+    """Prepare a worker process of the batch pool."""
+    # Records logged here would queue up for a listener thread that only runs in the parent process,
+    # which logs every failed line itself as the shards are merged
+    logging.getLogger('calculator_app').disabled = True
+
+def run_shard(first: int, lines: list, backend: NumericBackend, quiet: bool = False) -> tuple:
+    """Execute a chunk of lines numbered from first in a worker process.
+
+    Returns the (number, printed result, error) of each executed line in order, and the ShardHistory.
+    """
+    history = ShardHistory(backend)
+    engine = ExpressionEngine(history)
+    with backend.active():
+        outcomes = [(number, None if quiet or error else str(result), error) for number, result, error in
+                    _execute_lines(CommandRegistry(history), engine, enumerate(lines, start=first), backend.parse)]
+    return outcomes, history
+
+def _run_sharded(calculator: Calculator, lines, sharding: Sharding, report: BatchReport) -> None:
+    """Execute lines in chunks on a process pool, merging each chunk's outcomes and history in input order."""
+    lines = iter(lines)
+    first = 1
+    pending = collections.deque()  # Futures of submitted chunks, oldest first
+    with concurrent.futures.ProcessPoolExecutor(max_workers=sharding.workers, initializer=_start_worker) as pool:
+        while True:
+            chunk = list(itertools.islice(lines, sharding.chunk_size))
+            if chunk:
+                pending.append(pool.submit(run_shard, first, chunk, calculator.backend, report.quiet))
+                first += len(chunk)
+            # Chunks are merged strictly in the order they were submitted, which is what makes the history
+            # deterministic; two chunks per worker in flight keep the pool busy with bounded memory
+            while pending and (not chunk or len(pending) >= 2 * sharding.workers):
+                outcomes, history = pending.popleft().result()
+                for outcome in outcomes:
+                    report.record(*outcome)
+                calculator.merge_history(history.operations, history.operands, history.results, history.stats)
+            if not chunk:
+                break
+    logger.info("Ran a batch of %s lines on %s workers in chunks of %s", first - 1, sharding.workers,
+                sharding.chunk_size)
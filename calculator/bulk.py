@@ -0,0 +1,42 @@
+"""Element-wise bulk execution shared by the arithmetic plugins."""
+import logging
+from calculator.numeric import same_kind
+
+logger = logging.getLogger('calculator_app')
+
+def execute_many(calculator, operation: str, operands1, operands2, float_op: str, decimal_op,
+                 exact: bool = False, check_zero: bool = False):
+    """Apply an operation element-wise over two operand arrays and record them as one history block.
+
+    The default path runs the NumPy ufunc named float_op over float64 arrays in one pass and returns an
+    ndarray. With exact=True every pair goes through decimal_op on the numbers as given (Decimal, float
+    or Fraction, one type throughout) and a list of results is returned.
+    """
+    # LBYL: Both sides need the same number of operands
+    if len(operands1) != len(operands2):
+        raise ValueError(f"Operand arrays differ in length: {len(operands1)} and {len(operands2)}.")
+
+    if exact:
+        if len(operands1) > 0 and not same_kind(*operands1, *operands2):
+            logger.error("Operands must be numbers of one type (Decimal, float or Fraction).")
+            raise TypeError("Operands must be numbers of one type (Decimal, float or Fraction).")
+        divisors = operands2
+        zero_positions = [index for index, value in enumerate(divisors) if value == 0] if check_zero else []
+    else:
+        import numpy as np  # pylint: disable=import-outside-toplevel
+        operands1 = np.asarray(operands1, dtype=np.float64)
+        operands2 = np.asarray(operands2, dtype=np.float64)
+        zero_positions = np.flatnonzero(operands2 == 0) if check_zero else []
+
+    if len(zero_positions) > 0:
+        logger.error("Division by zero attempted.")
+        raise ZeroDivisionError(f"Cannot divide by zero (operand pair {zero_positions[0]}).")
+
+    if exact:
+        results = [decimal_op(first, second) for first, second in zip(operands1, operands2)]
+    else:
+        results = getattr(np, float_op)(operands1, operands2)
+
+    calculator.add_many_to_history(operation, [operands1, operands2], results)
+    logger.info("Executed %s over %s operand pairs", operation, len(results))
+    return results
@@ -0,0 +1,147 @@
+"""Bounded result cache for the pure arithmetic commands."""
+import logging
+import threading
+from collections import OrderedDict, defaultdict
+from decimal import getcontext
+from calculator.metrics import METRICS
+
+logger = logging.getLogger('calculator_app')
+
+CACHE_POLICIES = ("lru", "lfu")
+
+def cache_key(operation: str, operands) -> tuple:
+    """Key a calculation on its operation, exact operands and the active decimal context."""
+    context = getcontext()
+    # str() keeps Decimal('1.0') and Decimal('1') apart, they compare equal but add up differently
+    exact_operands = tuple((type(operand).__name__, str(operand)) for operand in operands)
+    return operation, exact_operands, (context.prec, context.rounding, context.Emin, context.Emax, context.clamp)
+
+class ResultCache:
+    """Map calculation keys to results, evicting the least recently or least frequently used entry."""
+    def __init__(self, maxsize: int = 1024, policy: str = "lru"):
+        # LBYL: Reject settings that cannot work before anything is cached
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1.")
+        if policy not in CACHE_POLICIES:
+            raise ValueError(f"Unknown cache policy: {policy}. Use one of {', '.join(CACHE_POLICIES)}.")
+        self.maxsize = maxsize
+        self.policy = policy
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> result, oldest use first
+        self._frequency = {}  # key -> use count, LFU only
+        self._by_frequency = defaultdict(OrderedDict)  # use count -> keys with that count, LFU only
+        self._min_frequency = 0
+        self._lock = threading.Lock()  # Shared by every registry, including server sessions on worker threads
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: tuple) -> tuple:
+        """Return (True, result) on a hit and (False, None) on a miss."""
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return False, None
+            self.hits += 1
+            if self.policy == "lru":
+                self._entries.move_to_end(key)
+            else:
+                self._touch(key)
+            return True, self._entries[key]
+
+    def put(self, key: tuple, result) -> None:
+        """Store a result, evicting one entry if the cache is full."""
+        with self._lock:
+            if key in self._entries:
+                self._entries[key] = result
+                return
+            if len(self._entries) >= self.maxsize:
+                self._evict()
+            self._entries[key] = result
+            if self.policy == "lfu":
+                self._frequency[key] = 1
+                self._by_frequency[1][key] = None
+                self._min_frequency = 1
+
+    def _touch(self, key: tuple) -> None:
+        """Move an LFU key to the next frequency bucket."""
+        frequency = self._frequency[key]
+        del self._by_frequency[frequency][key]
+        if not self._by_frequency[frequency]:
+            del self._by_frequency[frequency]
+            if self._min_frequency == frequency:
+                self._min_frequency = frequency + 1
+        self._frequency[key] = frequency + 1
+        self._by_frequency[frequency + 1][key] = None
+
+    def _evict(self) -> None:
+        """Drop the least recently used, or least frequently used, entry."""
+        if self.policy == "lru":
+            self._entries.popitem(last=False)
+        else:
+            bucket = self._by_frequency[self._min_frequency]
+            key, _ = bucket.popitem(last=False)
+            if not bucket:
+                del self._by_frequency[self._min_frequency]
+            del self._frequency[key]
+            del self._entries[key]
+        self.evictions += 1
+
+    def clear(self) -> None:
+        """Remove every entry, keeping the counters."""
+        with self._lock:
+            self._entries.clear()
+            self._frequency.clear()
+            self._by_frequency.clear()
+            self._min_frequency = 0
+
+    def stats(self) -> dict:
+        """Return size, hit, miss and eviction counters."""
+        with self._lock:
+            return {"size": len(self._entries), "maxsize": self.maxsize, "policy": self.policy,
+                    "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+class CachedCommand:
+    """Put a result cache in front of a pure arithmetic command.
+
+    A hit skips validation and arithmetic but still records the calculation in history,
+    so the history looks the same with or without the cache. Errors are never cached.
+    """
+    def __init__(self, command, operation: str, cache: ResultCache):
+        self.command = command
+        self.operation = operation
+        self.cache = cache
+
+    @property
+    def calculator(self):
+        """The calculator of the wrapped command."""
+        return self.command.calculator
+
+    def cached(self, *operands) -> tuple:
+        """Look up a result, recording it in history on a hit."""
+        hit, result = self.cache.get(cache_key(self.operation, operands))
+        if METRICS.enabled:
+            METRICS.count("cache", self.operation, "hits" if hit else "misses")
+        if hit:
+            self.command.calculator.add_to_history(self.operation, list(operands), result)
+            logger.debug("Cache hit for %s %s", self.operation, operands)
+        return hit, result
+
+    def remember(self, operands, result) -> None:
+        """Store the result of a calculation that missed the cache."""
+        self.cache.put(cache_key(self.operation, operands), result)
+
+    def execute(self, *operands):
+        """Return a cached result or run the command and cache what it returns."""
+        hit, result = self.cached(*operands)
+        if hit:
+            return result
+        result = self.command.execute(*operands)
+        self.remember(operands, result)
+        return result
+
+    def __getattr__(self, name):
+        # Everything else (show_help, execute_many, ...) goes to the wrapped command
+        return getattr(self.command, name)
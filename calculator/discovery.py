@@ -0,0 +1,143 @@
+"""Plugin discovery backed by a cached manifest, importing plugin modules only on first use."""
+import ast
+import importlib
+import json
+import logging
+import os
+import sys
+import time
+from collections.abc import Mapping
+from calculator.metrics import METRICS
+
+logger = logging.getLogger('calculator_app')
+
+MANIFEST_VERSION = 1
+
+def find_command_class(source: str, module_name: str):
+    """Return the name of the command class defined in a module's source, without importing it."""
+    candidates = []
+    for node in ast.parse(source).body:
+        if isinstance(node, ast.ClassDef):
+            methods = {item.name for item in node.body if isinstance(item, ast.FunctionDef)}
+            if {"execute", "show_help"} <= methods:
+                candidates.append(node.name)
+    # LBYL: Prefer the conventional <Module>Command name when a module defines several commands
+    preferred = f"{module_name.capitalize()}Command"
+    if preferred in candidates:
+        return preferred
+    return candidates[-1] if candidates else None
+
+class PluginCatalog(Mapping):
+    """Map command names to command classes, importing each plugin module the first time it is used.
+
+    The name -> class mapping is found by parsing the plugin sources and cached in a manifest file
+    that is rebuilt whenever a plugin file is added, removed or modified.
+    """
+    def __init__(self, package: str, directory: str, manifest_path: str = None):
+        self.package = package
+        self.directory = directory
+        self.manifest_path = manifest_path or os.path.join(directory, '__pycache__', 'plugin_manifest.json')
+        self._entries = {}  # command name -> {"class": ..., "mtime": ...}
+        self._mtimes = {}  # module name -> mtime seen by the last refresh
+        self._classes = {}  # command name -> imported class
+        self.load_times = {}  # command name -> seconds spent importing the plugin module
+        self.refresh()
+
+    def _module_files(self) -> dict:
+        """Map module names to the modification time of their source file."""
+        files = {}
+        for filename in os.listdir(self.directory):
+            module_name, extension = os.path.splitext(filename)
+            if extension == ".py" and module_name != "__init__":
+                files[module_name] = os.path.getmtime(os.path.join(self.directory, filename))
+        return files
+
+    def _read_manifest(self) -> dict:
+        """Return the cached manifest, or an empty one if it is missing or unreadable."""
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as file:
+                manifest = json.load(file)
+            if manifest.get("version") == MANIFEST_VERSION:
+                return manifest.get("modules", {})
+        except (OSError, ValueError):
+            pass
+        return {}
+
+    def _write_manifest(self, modules: dict) -> None:
+        """Cache the manifest, skipping it silently if the package directory is read-only."""
+        try:
+            os.makedirs(os.path.dirname(self.manifest_path), exist_ok=True)
+            temp_path = f"{self.manifest_path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as file:
+                json.dump({"version": MANIFEST_VERSION, "modules": modules}, file)
+            os.replace(temp_path, self.manifest_path)
+        except OSError as e: #COV-NA
+            logger.warning("Could not cache plugin manifest at %s: %s", self.manifest_path, e)
+
+    def refresh(self) -> None:
+        """Bring the manifest up to date with the plugin files, parsing only the ones that changed."""
+        cached = self._read_manifest()
+        modules = {}
+        changed = False
+        for module_name, mtime in self._module_files().items():
+            entry = cached.get(module_name)
+            # LBYL: Reuse the cached entry while the file is unchanged
+            if entry is None or entry["mtime"] != mtime:
+                path = os.path.join(self.directory, f"{module_name}.py")
+                with open(path, 'r', encoding='utf-8') as file:
+                    entry = {"class": find_command_class(file.read(), module_name), "mtime": mtime}
+                changed = True
+            modules[module_name] = entry
+        if changed or set(modules) != set(cached):
+            self._write_manifest(modules)
+
+        self._mtimes = {name: entry["mtime"] for name, entry in modules.items()}
+        self._entries = {name: entry for name, entry in modules.items() if entry["class"]}
+        self._classes = {name: cls for name, cls in self._classes.items() if name in self._entries}
+        logger.debug("Discovered plugins: %s", sorted(self._entries))
+
+    def changed(self) -> list:
+        """Return the plugins whose files were added, removed or modified since the last refresh."""
+        files = self._module_files()
+        return sorted(name for name in set(files) | set(self._mtimes) if files.get(name) != self._mtimes.get(name))
+
+    def resolve(self, command_name: str):
+        """Import a plugin module (if needed) and look its command class up again, bypassing the cache."""
+        entry = self._entries[command_name]  # Raises KeyError for unknown commands, as a dict would
+        start = time.perf_counter()
+        module = importlib.import_module(f"{self.package}.{command_name}")
+        command_class = getattr(module, entry["class"])
+        elapsed = time.perf_counter() - start
+        self.load_times.setdefault(command_name, elapsed)
+        if METRICS.enabled:
+            METRICS.observe("plugin_load", command_name, elapsed)
+        logger.debug("Imported plugin %s", command_name)
+        return command_class
+
+    def reload(self, command_name: str) -> None:
+        """Re-execute an already imported plugin module so its changes take effect."""
+        module_name = f"{self.package}.{command_name}"
+        self._classes.pop(command_name, None)
+        # LBYL: A module that was never imported will simply be imported fresh on first use
+        if module_name in sys.modules and command_name in self._entries:
+            start = time.perf_counter()
+            module = importlib.reload(sys.modules[module_name])
+            self._classes[command_name] = getattr(module, self._entries[command_name]["class"])
+            self.load_times[command_name] = time.perf_counter() - start
+            if METRICS.enabled:
+                METRICS.observe("plugin_load", command_name, self.load_times[command_name])
+            logger.info("Reloaded plugin %s", command_name)
+
+    def __getitem__(self, command_name: str):
+        if command_name not in self._classes:
+            self._classes[command_name] = self.resolve(command_name)
+        return self._classes[command_name]
+
+    def __iter__(self):
+        return iter(sorted(self._entries))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, command_name) -> bool:
+        return command_name in self._entries
@@ -0,0 +1,129 @@
+"""Long-lived execution backend that runs calculator commands for a session."""
+import concurrent.futures
+import decimal
+import logging
+import os
+from decimal import Decimal
+from calculator.metrics import TimedCommand
+
+logger = logging.getLogger('calculator_app')
+
+EXECUTION_MODES = ("inline", "thread", "process")
+
+class HistoryRecorder:
+    """Stand-in calculator that captures history entries made inside a worker process."""
+    def __init__(self):
+        self.entries = []
+
+    def add_to_history(self, operation: str, operands: list, result) -> None:
+        """Record the entry so the parent process can replay it."""
+        self.entries.append((operation, operands, result))
+
+def run_detached(command_class, operands: tuple, context: decimal.Context = None):
+    """Execute a command in a worker process and return its result with the history it produced."""
+    recorder = HistoryRecorder()
+    with decimal.localcontext(context):
+        result = command_class(recorder).execute(*operands)
+    return result, recorder.entries
+
+def run_in_context(context: decimal.Context, func, *args):
+    """Call func on a worker thread under the submitting thread's decimal context."""
+    with decimal.localcontext(context):
+        return func(*args)
+
+def operand_cost(operands) -> int:
+    """Estimate the cost of an operation by the number of digits in its operands."""
+    cost = 0
+    for operand in operands:
+        if isinstance(operand, Decimal):
+            cost += len(operand.as_tuple().digits)
+        else:
+            cost += len(str(operand))
+    return cost
+
+class CommandExecutor:
+    """Run commands inline, on a thread pool or on a process pool that lives for the whole session."""
+    def __init__(self, mode: str = "inline", max_workers: int = None, inline_cutoff: int = 0):
+        # LBYL: Reject unknown modes up front instead of failing on the first command
+        if mode not in EXECUTION_MODES:
+            raise ValueError(f"Unknown execution mode: {mode}. Use one of {', '.join(EXECUTION_MODES)}.")
+        self.mode = mode
+        self.max_workers = max_workers
+        self.inline_cutoff = inline_cutoff
+        self._pool = None
+
+    @classmethod
+    def from_env(cls) -> "CommandExecutor":
+        """Build an executor from the CALC_EXECUTOR, CALC_WORKERS and CALC_INLINE_CUTOFF variables."""
+        mode = os.getenv('CALC_EXECUTOR', 'inline').lower()
+        workers = os.getenv('CALC_WORKERS')
+        cutoff = os.getenv('CALC_INLINE_CUTOFF', '0')
+        return cls(mode=mode, max_workers=int(workers) if workers else None, inline_cutoff=int(cutoff))
+
+    def _get_pool(self) -> concurrent.futures.Executor:
+        """Create the worker pool on first use and reuse it afterwards."""
+        if self._pool is None:
+            if self.mode == "thread":
+                self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._pool = concurrent.futures.ProcessPoolExecutor(max_workers=self.max_workers)
+            logger.info("Started %s pool for command execution", self.mode)
+        return self._pool
+
+    def execute(self, command, *operands):
+        """Run a command with the given operands and return its result."""
+        # LBYL: Cheap operations are not worth the round trip to a worker
+        if self.mode == "inline" or operand_cost(operands) <= self.inline_cutoff:
+            return command.execute(*operands)
+
+        # LBYL: An instrumented command times the whole trip to the worker and back
+        if isinstance(command, TimedCommand):
+            return command.time(self._dispatch, command.command, operands)
+        return self._dispatch(command, operands)
+
+    def _dispatch(self, command, operands: tuple):
+        """Run a command on the worker pool."""
+
+        if self.mode == "thread":
+            # Decimal contexts are per thread, the worker uses the caller's precision and rounding
+            return self._get_pool().submit(run_in_context, decimal.getcontext(), command.execute, *operands).result()
+
+        # LBYL: A result cache lives in this process, so it is checked before going to a worker
+        if hasattr(command, 'cached'):
+            hit, result = command.cached(*operands)
+            if hit:
+                return result
+            result = self._execute_in_process(command.command, operands)
+            command.remember(operands, result)
+            return result
+        return self._execute_in_process(command, operands)
+
+    def _execute_in_process(self, command, operands: tuple):
+        """Run a command in a worker process and replay its history here."""
+        future = self._get_pool().submit(run_detached, type(command), operands, decimal.getcontext())
+        result, entries = future.result()
+        for operation, entry_operands, entry_result in entries:
+            command.calculator.add_to_history(operation, entry_operands, entry_result)
+        return result
+
+    def reset(self) -> None:
+        """Drop the worker processes after a plugin reload, so the next command runs the new plugin code.
+
+        Workers receive the command class by reference and hold the module they imported first, threads
+        share this process's modules and need nothing.
+        """
+        if self.mode == "process":
+            self.shutdown()
+
+    def shutdown(self) -> None:
+        """Stop the worker pool if one was started."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+            logger.info("Stopped %s pool", self.mode)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
@@ -0,0 +1,144 @@
+"""Arithmetic expressions compiled once into closures that run on the plugin commands."""
+import ast
+import functools
+import logging
+from calculator.numeric import Number, get_backend
+from calculator.operands import encode_source
+from calculator.registry import CommandRegistry
+
+logger = logging.getLogger('calculator_app')
+
+# Expression operators and the plugin command that implements each of them
+BINARY_OPERATORS = {ast.Add: "add", ast.Sub: "subtract", ast.Mult: "multiply", ast.Div: "divide"}
+NARY_OPERATIONS = frozenset(BINARY_OPERATORS.values())
+EVAL_OPERATION = "eval"  # History operation of an evaluated expression, whose source is its first operand
+
+class DiscardedHistory:
+    """Stand-in calculator for sub-operations, the whole expression is recorded once instead."""
+    def add_to_history(self, operation: str, operands: list, result) -> None:
+        """Ignore the entry."""
+
+# Commands used to evaluate expression nodes; reloads and cache toggles reach it like any other registry
+_kernels = CommandRegistry(DiscardedHistory())
+
+def normalize(source: str) -> str:
+    """Collapse whitespace so equivalent spellings share one compiled expression."""
+    return " ".join(source.split())
+
+class Expression:
+    """A compiled expression that can be evaluated again with new variable bindings."""
+    def __init__(self, source: str, variables: tuple, evaluate, convert, literal: bool = False):
+        self.source = source
+        self.literal = literal  # Just a number, e.g. 1.5 or -2, which computes nothing
+        self.variables = variables  # Names in order of first appearance
+        self._evaluate = evaluate
+        self.convert = convert  # Turns bound values into the number type the literals were compiled to
+
+    def evaluate(self, bindings: dict = None) -> Number:
+        """Evaluate with the given variable values, without recording history."""
+        bindings = bindings or {}
+        # LBYL: Report every missing variable at once instead of failing on the first one
+        missing = [name for name in self.variables if name not in bindings]
+        if missing:
+            raise ValueError(f"Unbound variable(s): {', '.join(missing)}")
+        return self._evaluate({name: self.convert(bindings[name]) for name in self.variables})
+
+    def __repr__(self) -> str:
+        return f"Expression({self.source!r})"
+
+def _compile_node(node, source: str, variables: list, parse):
+    """Turn one AST node into a closure taking the variable bindings, with literals read by parse."""
+    if isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPERATORS:
+        operation = BINARY_OPERATORS[type(node.op)]
+        left = _compile_node(node.left, source, variables, parse)
+        right = _compile_node(node.right, source, variables, parse)
+        get = _kernels.get
+        return lambda env: get(operation).execute(left(env), right(env))
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+        operand = _compile_node(node.operand, source, variables, parse)
+        if isinstance(node.op, ast.UAdd):
+            return operand
+        get = _kernels.get
+        zero = parse("0")
+        return lambda env: get("subtract").execute(zero, operand(env))
+    if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+        # Take the literal from the source text so 0.1 stays exactly 0.1
+        value = parse(ast.get_source_segment(source, node))
+        return lambda env: value
+    if isinstance(node, ast.Name):
+        name = node.id
+        if name not in variables:
+            variables.append(name)
+        return lambda env: env[name]
+    raise ValueError(f"Unsupported expression syntax: {ast.get_source_segment(source, node) or source}")
+
+def compile_expression(source: str, numeric: str = "decimal") -> Expression:
+    """Parse and compile an expression for a numeric backend, reusing the compiled form for repeated sources."""
+    return _compile(normalize(source), numeric)
+
+@functools.lru_cache(maxsize=256)
+def _compile(source: str, numeric: str) -> Expression:
+    """Compile a normalized expression source, with literals of the named backend's number type."""
+    # EAFP: Let the Python parser do the tokenizing and report bad syntax as invalid input
+    try:
+        tree = ast.parse(source, mode='eval')
+    except SyntaxError as e:
+        raise ValueError(f"Invalid expression: {source}") from e
+    variables = []
+    backend = get_backend(numeric)
+    evaluate = _compile_node(tree.body, source, variables, backend.parse)
+    logger.debug("Compiled expression %s with variables %s", source, variables)
+    node = tree.body.operand if isinstance(tree.body, ast.UnaryOp) else tree.body
+    return Expression(source, tuple(variables), evaluate, backend.convert, literal=isinstance(node, ast.Constant))
+
+class ExpressionEngine:
+    """Evaluate expressions and n-ary operations for a calculator, one history entry per top-level call."""
+    def __init__(self, calculator):
+        self.calculator = calculator
+        self.variables = {}  # Session bindings, used when a call does not bind a name itself
+
+    def evaluate(self, source: str, **bindings) -> Number:
+        """Evaluate an expression and record it in history as an eval entry."""
+        expression, values, result = self._evaluate(source, bindings)
+        self._record(expression, values, result)
+        return result
+
+    def assign(self, name: str, source: str) -> Number:
+        """Evaluate an expression and bind its result to a session variable."""
+        # LBYL: Only plain identifiers can be referenced from an expression later
+        if not name.isidentifier():
+            raise ValueError(f"Invalid variable name: {name}")
+        expression, values, result = self._evaluate(source, {})
+        # LBYL: Binding a plain number (let a = 1.5) calculates nothing, so it leaves no history entry
+        if not expression.literal:
+            self._record(expression, values, result)
+        self.variables[name] = result
+        return result
+
+    def _evaluate(self, source: str, bindings: dict) -> tuple:
+        """Compile and evaluate an expression, returning it with the bindings used and the result."""
+        expression = compile_expression(source, self.calculator.backend.name)
+        values = {**self.variables, **bindings}
+        return expression, values, expression.evaluate(values)
+
+    def _record(self, expression: Expression, values: dict, result: Number) -> None:
+        """Record an evaluation as one eval entry: the source first, then the variable values."""
+        operands = [expression.convert(values[name]) for name in expression.variables]
+        self.calculator.add_to_history(EVAL_OPERATION, [encode_source(expression.source), *operands], result)
+        logger.info("Evaluated %s = %s", expression.source, result)
+
+    def apply(self, operation: str, operands: list) -> Number:
+        """Fold an arithmetic operation over any number of operands, left to right."""
+        # LBYL: Only the arithmetic commands can be chained
+        if operation not in NARY_OPERATIONS:
+            raise ValueError(f"{operation} does not take multiple operands")
+        if len(operands) < 2:
+            raise ValueError(f"{operation} needs at least two operands")
+        operands = [self.calculator.backend.convert(value) for value in operands]
+        command = _kernels.get(operation)
+        result = operands[0]
+        for operand in operands[1:]:
+            result = command.execute(result, operand)
+        self.calculator.add_to_history(operation, operands, result)
+        logger.info("Executed %s over %s operands = %s", operation, len(operands), result)
+        return result
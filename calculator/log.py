@@ -0,0 +1,90 @@
+"""Logging setup: records are queued on the calling thread and written to a rotating file by a listener thread."""
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+LEVELS = {"dev": logging.DEBUG, "uat": logging.INFO, "prod": logging.WARNING}
+ROTATIONS = ("size", "time", "none")
+
+class LogQueue:
+    """The running QueueListener and the root logger handler feeding it, replaced when logging is configured again."""
+
+    def __init__(self):
+        self.listener = None
+        self.handler = None
+
+    def start(self, handler: logging.Handler) -> logging.handlers.QueueListener:
+        """Start a listener writing to handler and attach its queue to the root logger."""
+        records = queue.SimpleQueue()
+        self.listener = logging.handlers.QueueListener(records, handler, respect_handler_level=True)
+        self.listener.start()
+        self.handler = logging.handlers.QueueHandler(records)
+        logging.getLogger().addHandler(self.handler)
+        return self.listener
+
+    def stop(self) -> None:
+        """Remove the handler from the root logger and stop the listener once the queue is written out."""
+        if self.handler is not None:
+            logging.getLogger().removeHandler(self.handler)
+            self.handler = None
+        if self.listener is not None:
+            self.listener.stop()  # Drains the queue before returning
+            for handler in self.listener.handlers:
+                handler.close()
+            self.listener = None
+
+LOG_QUEUE = LogQueue()
+
+def file_handler(log_file: str, rotation: str = "size", max_bytes: int = 10 * 1024 * 1024, backups: int = 5,
+                 when: str = "midnight") -> logging.Handler:
+    """Create the handler that writes log_file, rotated by size, by time or not at all."""
+    # LBYL: Reject unknown rotation modes up front instead of silently logging without rotation
+    if rotation not in ROTATIONS:
+        raise ValueError(f"Unknown log rotation: {rotation}. Use one of {', '.join(ROTATIONS)}.")
+    directory = os.path.dirname(log_file)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    if rotation == "size":
+        handler = logging.handlers.RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backups,
+                                                       encoding='utf-8')
+    elif rotation == "time":
+        handler = logging.handlers.TimedRotatingFileHandler(log_file, when=when, backupCount=backups,
+                                                            encoding='utf-8')
+    else:
+        handler = logging.FileHandler(log_file, encoding='utf-8')
+    handler.setFormatter(logging.Formatter(LOG_FORMAT, DATE_FORMAT))
+    return handler
+
+def configure_logging(environment: str = "prod", log_file: str = os.path.join('logs', 'calc.log'),
+                      **rotation) -> logging.handlers.QueueListener:
+    """Route the root and calculator_app loggers through a queue to a rotating log file.
+
+    The calling thread only puts the record on the queue; the file is written by a listener thread.
+    The level follows the environment (dev DEBUG, uat INFO, prod WARNING). rotation is passed to file_handler.
+    """
+    stop_logging()
+
+    level = LEVELS.get(environment, logging.WARNING)
+    listener = LOG_QUEUE.start(file_handler(log_file, **rotation))
+    logging.getLogger().setLevel(level)
+    # The modules log through calculator_app, which propagates to the root handler
+    logging.getLogger('calculator_app').setLevel(level)
+    return listener
+
+def configure_from_env(environment: str, log_file: str = os.path.join('logs', 'calc.log')):
+    """Configure logging from CALC_LOG_ROTATION, CALC_LOG_MAX_BYTES, CALC_LOG_BACKUPS and CALC_LOG_WHEN."""
+    return configure_logging(environment, log_file,
+                             rotation=os.getenv('CALC_LOG_ROTATION', 'size').lower(),
+                             max_bytes=int(os.getenv('CALC_LOG_MAX_BYTES', str(10 * 1024 * 1024))),
+                             backups=int(os.getenv('CALC_LOG_BACKUPS', '5')),
+                             when=os.getenv('CALC_LOG_WHEN', 'midnight'))
+
+@atexit.register
+def stop_logging() -> None:
+    """Detach the queue from the root logger, write out queued records and stop the listener thread."""
+    LOG_QUEUE.stop()
@@ -0,0 +1,241 @@
+"""Latency histograms and counters for commands, history I/O and plugin loading."""
+import bisect
+import functools
+import json
+import logging
+import math
+import threading
+import time
+
+logger = logging.getLogger('calculator_app')
+
+# Upper bounds in seconds, 1-2.5-5 steps from a microsecond to ten seconds, plus +Inf
+BUCKETS = tuple(float(f"{step}e{exponent}") for exponent in range(-6, 1) for step in (1, 2.5, 5)) + (10.0, math.inf)
+
+# Label each family of metrics is keyed by
+LABELS = {"command": "command", "history": "operation", "plugin_load": "plugin", "cache": "command"}
+
+EXPORT_FORMATS = ("json", "prometheus")
+
+class Histogram:
+    """Counts of observed durations per bucket, with their sum and extremes."""
+    def __init__(self):
+        self.buckets = [0] * len(BUCKETS)
+        self.count = 0
+        self.total = 0.0
+        self.minimum = math.inf
+        self.maximum = 0.0
+
+    def observe(self, seconds: float) -> None:
+        """Add one duration."""
+        self.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.minimum = min(self.minimum, seconds)
+        self.maximum = max(self.maximum, seconds)
+
+    def quantile(self, quantile: float) -> float:
+        """Estimate a quantile as the upper bound of the bucket it falls in, capped by the largest duration."""
+        if self.count == 0:
+            return 0.0
+        rank = quantile * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.buckets):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.maximum)
+        return self.maximum #COV-NA
+
+    def summary(self) -> dict:
+        """Count, sum, mean, extremes and estimated percentiles in seconds."""
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "mean": self.total / self.count if self.count else 0.0,
+            "min": self.minimum if self.count else 0.0,
+            "max": self.maximum,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+            "buckets": {_bound(bound): count for bound, count in zip(BUCKETS, self.buckets) if count},
+        }
+
+def _bound(bound: float) -> str:
+    """Prometheus spelling of a bucket bound."""
+    return "+Inf" if bound == math.inf else repr(bound)
+
+class Metrics:
+    """Process-wide histograms and counters, recorded only while enabled.
+
+    Instrumented code checks enabled before reading the clock, so a disabled instance costs one
+    attribute lookup per call. Families are "command", "history", "plugin_load" and "cache".
+    """
+    def __init__(self):
+        self.enabled = False
+        self.started = time.time()
+        self.histograms = {}  # (family, label) -> Histogram of seconds
+        self.counters = {}  # (family, label, counter) -> count, e.g. ("command", "add", "errors")
+        self._lock = threading.Lock()  # Server sessions record from several worker threads
+
+    def enable(self) -> None:
+        """Start recording."""
+        self.enabled = True
+        logger.info("Instrumentation enabled")
+
+    def disable(self) -> None:
+        """Stop recording, keeping what was recorded so far."""
+        self.enabled = False
+        logger.info("Instrumentation disabled")
+
+    def reset(self) -> None:
+        """Forget everything recorded so far."""
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+            self.started = time.time()
+
+    def count(self, family: str, label: str, counter: str, amount: int = 1) -> None:
+        """Add to a counter."""
+        key = (family, label, counter)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, family: str, label: str, seconds: float) -> None:
+        """Record one duration in a histogram."""
+        with self._lock:
+            histogram = self.histograms.get((family, label))
+            if histogram is None:
+                histogram = self.histograms[(family, label)] = Histogram()
+            histogram.observe(seconds)
+
+    def time_call(self, family: str, label: str, func, *args, **kwargs):
+        """Call func, counting the call (and the error if it raises) and recording how long it took."""
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            self.count(family, label, "errors")
+            raise
+        finally:
+            self.observe(family, label, time.perf_counter() - start)
+            self.count(family, label, "calls")
+
+    def snapshot(self) -> dict:
+        """Everything recorded, as {family: {label: {"counters": {...}, "latency": {...}}}}."""
+        with self._lock:
+            histograms = {key: histogram.summary() for key, histogram in self.histograms.items()}
+            counters = dict(self.counters)
+        families = {}
+        for (family, label), summary in histograms.items():
+            families.setdefault(family, {}).setdefault(label, {"counters": {}})["latency"] = summary
+        for (family, label, counter), count in counters.items():
+            families.setdefault(family, {}).setdefault(label, {"counters": {}})["counters"][counter] = count
+        return {family: dict(sorted(labels.items())) for family, labels in sorted(families.items())}
+
+    def to_json(self) -> str:
+        """Export as a JSON document."""
+        return json.dumps({"enabled": self.enabled, "started": self.started, "metrics": self.snapshot()},
+                          indent=2, sort_keys=True)
+
+    def to_prometheus(self) -> str:
+        """Export in the Prometheus text exposition format."""
+        with self._lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+        lines = []
+        for family in sorted({key[0] for key, _ in histograms} | {key[0] for key, _ in counters}):
+            name = f"calculator_{family}_seconds"
+            family_histograms = [(label, histogram) for (owner, label), histogram in histograms if owner == family]
+            if family_histograms:
+                lines += [f"# HELP {name} Latency of {family.replace('_', ' ')} operations.",
+                          f"# TYPE {name} histogram"]
+            for label, histogram in family_histograms:
+                selector = f'{LABELS[family]}="{_escape(label)}"'
+                cumulative = 0
+                for bound, count in zip(BUCKETS, histogram.buckets):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{{selector},le="{_bound(bound)}"}} {cumulative}')
+                lines.append(f"{name}_sum{{{selector}}} {histogram.total!r}")
+                lines.append(f"{name}_count{{{selector}}} {histogram.count}")
+            for counter in sorted({key[2] for key, _ in counters if key[0] == family}):
+                name = f"calculator_{family}_{counter}_total"
+                lines += [f"# HELP {name} Number of {family.replace('_', ' ')} {counter}.", f"# TYPE {name} counter"]
+                lines += [f'{name}{{{LABELS[family]}="{_escape(label)}"}} {count}'
+                          for (owner, label, name_of_counter), count in counters
+                          if owner == family and name_of_counter == counter]
+        return "\n".join(lines) + "\n"
+
+    def export(self, export_format: str = "json") -> str:
+        """Export in one of EXPORT_FORMATS."""
+        # LBYL: Reject unknown formats with the list of valid ones
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown export format: {export_format}. Use one of {', '.join(EXPORT_FORMATS)}.")
+        return self.to_json() if export_format == "json" else self.to_prometheus()
+
+    def report(self) -> list:
+        """Lines summarizing every family for display, slowest total time first."""
+        lines = []
+        for family, labels in self.snapshot().items():
+            lines.append(f"{family}:")
+            ordered = sorted(labels.items(), key=lambda item: -item[1].get("latency", {}).get("sum", 0.0))
+            for label, values in ordered:
+                counters = ", ".join(f"{counter} {count}" for counter, count in sorted(values["counters"].items()))
+                latency = values.get("latency")
+                if latency is None:
+                    lines.append(f"  {label:<12} {counters}")
+                    continue
+                lines.append(f"  {label:<12} {counters}  mean {_duration(latency['mean'])}  "
+                             f"p50 {_duration(latency['p50'])}  p99 {_duration(latency['p99'])}  "
+                             f"max {_duration(latency['max'])}")
+        return lines
+
+def _escape(label: str) -> str:
+    """Escape a Prometheus label value."""
+    return str(label).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _duration(seconds: float) -> str:
+    """Show a duration in the most readable unit."""
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.1f}us"
+    if seconds < 1:
+        return f"{seconds * 1e3:.2f}ms"
+    return f"{seconds:.3f}s"
+
+# Shared by the whole process, like the logging configuration
+METRICS = Metrics()
+
+def timed(family: str, label: str):
+    """Decorate a function so its calls are timed and counted while instrumentation is enabled."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            # LBYL: The disabled path is a flag check, the clock is only read when recording
+            if not METRICS.enabled:
+                return func(*args, **kwargs)
+            return METRICS.time_call(family, label, func, *args, **kwargs)
+        return wrapper
+    return decorate
+
+class TimedCommand:
+    """Time and count every execution of a command, including result cache hits when wrapping a cached one."""
+    def __init__(self, command, operation: str, metrics: Metrics = METRICS):
+        self.command = command
+        self.operation = operation
+        self.metrics = metrics
+
+    @property
+    def calculator(self):
+        """The calculator of the wrapped command."""
+        return self.command.calculator
+
+    def time(self, func, *args, **kwargs):
+        """Run func on behalf of this command, recording it as one call."""
+        return self.metrics.time_call("command", self.operation, func, *args, **kwargs)
+
+    def execute(self, *operands, **kwargs):
+        """Run the wrapped command and record how long it took; keyword options (history subcommands) pass through."""
+        return self.time(self.command.execute, *operands, **kwargs)
+
+    def __getattr__(self, name):
+        # Everything else (show_help, execute_many, ...) goes to the wrapped command
+        return getattr(self.command, name)
@@ -0,0 +1,176 @@
+"""Numeric backends: exact Decimal with a context, native float and exact Fraction.
+
+A session parses its input with one backend, and the plugins work on whatever numbers they are given
+as long as all operands have the same type. History records the type in how each value is written:
+Decimal values as plain decimal strings (as before), fractions as "n/d" and floats with an "f" suffix.
+"""
+import contextlib
+import decimal
+import math
+import os
+from decimal import Decimal, InvalidOperation
+from fractions import Fraction
+from typing import Union
+
+
+NUMBER_TYPES = (Decimal, float, Fraction)
+Number = Union[Decimal, float, Fraction]
+ROUNDING_MODES = {name.lower()[len("ROUND_"):]: getattr(decimal, name) for name in dir(decimal)
+                  if name.startswith("ROUND_")}  # e.g. "half_even" -> ROUND_HALF_EVEN
+
+def same_kind(*operands) -> bool:
+    """Tell whether every operand is a Decimal, float or Fraction, all of the same type."""
+    kind = next((kind for kind in NUMBER_TYPES if isinstance(operands[0], kind)), None)
+    return kind is not None and all(isinstance(operand, kind) for operand in operands)
+
+def encode_number(value) -> str:
+    """Write a number so its type survives a round trip through a history file."""
+    if isinstance(value, float):
+        return f"{value!r}f"
+    if isinstance(value, Fraction):
+        return f"{value.numerator}/{value.denominator}"
+    return str(value)
+
+def decode_number(text: str):
+    """Read a number written by encode_number back as a Decimal, float or Fraction."""
+    # LBYL: The suffix and the slash mark the two non-Decimal types, Decimal never writes either
+    if text.endswith("f") and text.lstrip("+-") != "inf":
+        return float(text[:-1])
+    if "/" in text:
+        return Fraction(text)
+    return Decimal(text)
+
+def decode_result(value):
+    """Decode a stored result, keeping text that is not an encoded number (e.g. from an old file) as it is."""
+    if not isinstance(value, str):
+        return value
+    # EAFP: Almost every stored result decodes, checking the text first would cost more
+    try:
+        return decode_number(value)
+    except (InvalidOperation, ValueError, ZeroDivisionError):
+        return value
+
+def display_number(value) -> str:
+    """Show a stored number the way it reads in the REPL, e.g. 0.25 for 0.25f and 3 for 3/1."""
+    return str(decode_result(value))
+
+def to_decimal(value):
+    """Convert a number or an encoded value to Decimal, or None if it is not a finite number."""
+    if not isinstance(value, Decimal):
+        try:
+            if isinstance(value, str):
+                value = decode_number(value)
+            if isinstance(value, Fraction):
+                value = Decimal(value.numerator) / Decimal(value.denominator)
+            else:
+                value = Decimal(str(value))
+        except (InvalidOperation, ValueError, ZeroDivisionError):
+            return None
+    return value if value.is_finite() else None
+
+class NumericBackend:
+    """Parse input into one number type and set up the arithmetic context for it."""
+    name = None
+    number_type = None
+
+    def parse(self, text: str):
+        """Turn one input token into a number."""
+        raise NotImplementedError
+
+    def convert(self, value):
+        """Turn a number of any supported type (or an int) into this backend's type."""
+        raise NotImplementedError
+
+    def active(self):
+        """Context manager applying this backend's context while a command runs, leaving the thread's own alone."""
+        return contextlib.nullcontext()
+
+    def describe(self) -> str:
+        """Name and settings for display."""
+        return self.name
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.describe()!r})"
+
+class DecimalBackend(NumericBackend):
+    """Exact decimal arithmetic, rounded to a configurable precision."""
+    name = "decimal"
+    number_type = Decimal
+
+    def __init__(self, precision: int = 28, rounding: str = "half_even"):
+        # LBYL: Reject settings Decimal cannot use before any arithmetic runs
+        if precision < 1:
+            raise ValueError("Precision must be at least 1.")
+        if rounding not in ROUNDING_MODES:
+            raise ValueError(f"Unknown rounding: {rounding}. Use one of {', '.join(sorted(ROUNDING_MODES))}.")
+        self.context = decimal.Context(prec=precision, rounding=ROUNDING_MODES[rounding])
+        self.rounding = rounding
+
+    def parse(self, text: str) -> Decimal:
+        # EAFP: Decimal reports bad input as InvalidOperation, callers expect a ValueError
+        try:
+            return Decimal(text)
+        except InvalidOperation as e:
+            raise ValueError(f"Invalid number: {text}") from e
+
+    def convert(self, value) -> Decimal:
+        if isinstance(value, Decimal):
+            return value
+        if isinstance(value, Fraction):
+            return Decimal(value.numerator) / Decimal(value.denominator)
+        return self.parse(str(value))  # Through str so floats keep their shortest form
+
+    def active(self):
+        return decimal.localcontext(self.context)
+
+    def describe(self) -> str:
+        return f"decimal (precision {self.context.prec}, rounding {self.rounding})"
+
+class FloatBackend(NumericBackend):
+    """Native binary floating point, the fastest and least exact."""
+    name = "float"
+    number_type = float
+
+    def parse(self, text: str) -> float:
+        value = float(text)
+        # LBYL: Overflowing input is an error, not a silent infinity
+        if math.isinf(value) and "inf" not in text.lower():
+            raise ValueError(f"Number out of range: {text}")
+        return value
+
+    def convert(self, value) -> float:
+        return float(value)
+
+class FractionBackend(NumericBackend):
+    """Exact rational arithmetic, 1/3 stays 1/3."""
+    name = "fraction"
+    number_type = Fraction
+
+    def parse(self, text: str) -> Fraction:
+        # EAFP: Fraction accepts "1/3", "0.25" and "1e-3", anything else is invalid input
+        try:
+            return Fraction(text)
+        except ZeroDivisionError as e:
+            raise ValueError(f"Invalid number: {text}") from e
+
+    def convert(self, value) -> Fraction:
+        if isinstance(value, Fraction):
+            return value
+        return Fraction(str(value)) if isinstance(value, float) else Fraction(value)
+
+BACKENDS = {backend.name: backend for backend in (DecimalBackend, FloatBackend, FractionBackend)}
+
+def get_backend(name: str = "decimal", precision: int = 28, rounding: str = "half_even") -> NumericBackend:
+    """Create a backend by name; precision and rounding apply to the decimal backend."""
+    # LBYL: Check the name before building anything
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown numeric backend: {name}. Use one of {', '.join(BACKENDS)}.")
+    if name == "decimal":
+        return DecimalBackend(precision, rounding)
+    return BACKENDS[name]()
+
+def backend_from_env() -> NumericBackend:
+    """Build the backend given by the CALC_NUMERIC, CALC_PRECISION and CALC_ROUNDING variables."""
+    return get_backend(os.getenv('CALC_NUMERIC', 'decimal').lower(),
+                       int(os.getenv('CALC_PRECISION', '28')),
+                       os.getenv('CALC_ROUNDING', 'half_even').lower())
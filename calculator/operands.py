@@ -0,0 +1,43 @@
+"""Encoding of operand lists as exact decimal strings for the history files."""
+from calculator.numeric import decode_number, encode_number
+
+OPERAND_SEPARATOR = " "
+SOURCE_PREFIX = "="  # Marks an operand that is an expression's source text, e.g. "=(a+b)*c", not a number
+
+def encode_operands(operands) -> str:
+    """Encode any number of operands as space separated exact strings, see numeric.encode_number."""
+    return OPERAND_SEPARATOR.join(map(encode_number, operands))
+
+def encode_operand_columns(columns) -> list:
+    """Encode operands given column-wise (one sequence or array per operand) into one string per row."""
+    columns = [column.tolist() if hasattr(column, 'tolist') else column for column in columns]
+    return [OPERAND_SEPARATOR.join(row) for row in zip(*(map(encode_number, column) for column in columns))]
+
+def encode_source(source: str) -> str:
+    """Encode an expression's source as one operand, without the spaces that separate operands."""
+    return SOURCE_PREFIX + "".join(source.split())
+
+def decode_operands(encoded: str) -> list:
+    """Turn an encoded operand string back into numbers of the types they were recorded with.
+
+    An expression source recorded with encode_source is returned as its text.
+    """
+    return [value if value.startswith(SOURCE_PREFIX) else decode_number(value)
+            for value in encoded.split(OPERAND_SEPARATOR) if value]
+
+def is_legacy_operands(value: str) -> bool:
+    """Tell whether a value uses the old str(list) format, e.g. "[Decimal('5'), Decimal('7')]"."""
+    return value.strip().strip("'\"").startswith("[")
+
+def parse_legacy_operands(value: str) -> str:
+    """Convert an old str(list) operand value to the encoded format without evaluating it."""
+    items = value.strip().strip("'\"").strip("[]").split(",")
+    values = []
+    for item in items:
+        item = item.strip()
+        # LBYL: Unwrap Decimal('...') literals, plain numbers are kept as they are
+        if item.startswith("Decimal("):
+            item = item[len("Decimal("):-1].strip("'\"")
+        if item:
+            values.append(item)
+    return OPERAND_SEPARATOR.join(values)
@@ -1,32 +1,42 @@
-from calculator import Calculator
-from decimal import Decimal, InvalidOperation
+from decimal import InvalidOperation
 import logging
+import operator
+from calculator import Calculator
+from calculator.bulk import execute_many
+from calculator.numeric import Number, same_kind
 
 logger = logging.getLogger('calculator_app')
 
 class AddCommand:
+    cacheable = True  # Pure arithmetic, results can be reused for identical operands
+
     def __init__(self, calculator: Calculator):
         self.calculator = calculator
 
-    def execute(self, operand1: Decimal, operand2: Decimal) -> Decimal:
+    def execute(self, operand1: Number, operand2: Number) -> Number:
         """Execute the addition operation and record it in history."""
         # LBYL: Check if operands are valid before performing addition
-        if not isinstance(operand1, Decimal) or not isinstance(operand2, Decimal):
-            logger.error("Operands must be of type Decimal.")
-            raise TypeError("Operands must be of type Decimal.") #COV-NA
+        if not same_kind(operand1, operand2):
+            logger.error("Operands must be numbers of one type (Decimal, float or Fraction).")
+            raise TypeError("Operands must be numbers of one type (Decimal, float or Fraction).") #COV-NA
         
         try:
             # EAFP: Perform the addition and handle any arithmetic-related errors (e.g., Overflow)
             result = operand1 + operand2
             self.calculator.add_to_history("add", [operand1, operand2], result)
-            logger.info(f"Executed Add: {operand1} + {operand2} = {result}")
+            logger.info("Executed Add: %s + %s = %s", operand1, operand2, result)
             return result
         except (InvalidOperation, OverflowError) as e: #COV-NA
             # Handle specific cases where Decimal arithmetic may fail
-            logger.error(f"Failed to add {operand1} and {operand2}: {e}")
+            logger.error("Failed to add %s and %s: %s", operand1, operand2, e)
             raise ArithmeticError(f"Error during addition: {e}") #COV-NA
 
+    def execute_many(self, operands1, operands2, exact: bool = False):
+        """Add two operand arrays element-wise and record them in history as one block."""
+        return execute_many(self.calculator, "add", operands1, operands2, "add", operator.add,
+                            exact=exact)
+
     def show_help(self) -> None:
         """Provide help for the Add command."""
-        print("\nUsage: add <value1> <value2>")
-        print("Description: Adds two numbers.")
+        print("\nUsage: add <value1> <value2> [<value3> ...]")
+        print("Description: Adds two or more numbers.")
@@ -1,19 +1,24 @@
-from calculator import Calculator
-from decimal import Decimal, InvalidOperation
+from decimal import InvalidOperation
 import logging
+import operator
+from calculator import Calculator
+from calculator.bulk import execute_many
+from calculator.numeric import Number, same_kind
 
 logger = logging.getLogger('calculator_app')
 
 class DivideCommand:
+    cacheable = True  # Pure arithmetic, results can be reused for identical operands
+
     def __init__(self, calculator: Calculator):
         self.calculator = calculator
 
-    def execute(self, operand1: Decimal, operand2: Decimal) -> Decimal:
+    def execute(self, operand1: Number, operand2: Number) -> Number:
         """Execute the division operation and record it in history."""
-        # LBYL: Check if operands are valid Decimal types and check for division by zero.
-        if not isinstance(operand1, Decimal) or not isinstance(operand2, Decimal):
-            logger.error("Operands must be of type Decimal.") 
-            raise TypeError("Operands must be of type Decimal.") #COV-NA
+        # LBYL: Check if operands are numbers of the same type and check for division by zero.
+        if not same_kind(operand1, operand2):
+            logger.error("Operands must be numbers of one type (Decimal, float or Fraction).") 
+            raise TypeError("Operands must be numbers of one type (Decimal, float or Fraction).") #COV-NA
         
         if operand2 == 0:
             logger.error("Division by zero attempted.") 
@@ -23,14 +28,19 @@ class DivideCommand:
             # EAFP: Perform the division and catch any Decimal-related exceptions.
             result = operand1 / operand2
             self.calculator.add_to_history("divide", [operand1, operand2], result)
-            logger.info(f"Executed Divide: {operand1} / {operand2} = {result}")
+            logger.info("Executed Divide: %s / %s = %s", operand1, operand2, result)
             return result
         except (InvalidOperation, ZeroDivisionError, OverflowError) as e: #COV-NA
             # Handle specific errors that could occur during division.
-            logger.error(f"Error during division of {operand1} by {operand2}: {e}")
+            logger.error("Error during division of %s by %s: %s", operand1, operand2, e)
             raise ArithmeticError(f"Error during division: {e}") #COV-NA
 
+    def execute_many(self, operands1, operands2, exact: bool = False):
+        """Divide two operand arrays element-wise and record them in history as one block."""
+        return execute_many(self.calculator, "divide", operands1, operands2, "divide", operator.truediv,
+                            exact=exact, check_zero=True)
+
     def show_help(self) -> None:
         """Provide help for the Divide command."""
-        print("\nUsage: divide <value1> <value2>")
-        print("Description: Divides the first number by the second. Raises an error if the second number is zero.")
+        print("\nUsage: divide <value1> <value2> [<value3> ...]")
+        print("Description: Divides the first number by the following ones, left to right. Raises an error if a divisor is zero.")
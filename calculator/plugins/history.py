@@ -1,6 +1,8 @@
+import logging
 import os
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
 from calculator.command import Command
-import logging
 
 logger = logging.getLogger('calculator_app')
 
@@ -8,8 +10,63 @@ class HistoryCommand(Command):
     def __init__(self, calculator):
         self.calculator = calculator #TODO
 
-    def execute(self, subcommand: str, filename: str = None) -> None:
-        """Execute a history command based on the subcommand."""
+    SHOW_OPTIONS = {"--head": "head", "--tail": "tail", "--page": "page", "--page-size": "page_size"}
+    QUERY_OPTIONS = {"--op": "operation", "--min": "min_result", "--max": "max_result",
+                     "--since": "since", "--until": "until", "--last": "last"}
+
+    @classmethod
+    def parse_show_options(cls, args: list) -> tuple:
+        """Split 'show' arguments into an optional filename and its paging options."""
+        filename = None
+        options = {}
+        args = iter(args)
+        for arg in args:
+            if arg in cls.SHOW_OPTIONS:
+                # EAFP: A missing or non-numeric value surfaces as a ValueError for the caller
+                value = next(args, None)
+                if value is None or int(value) < 1:
+                    raise ValueError(f"{arg} needs a positive number.")
+                options[cls.SHOW_OPTIONS[arg]] = int(value)
+            else:
+                filename = arg
+        return filename, options
+
+    @classmethod
+    def parse_query_options(cls, args: list) -> dict:
+        """Turn 'query' arguments into filters, e.g. --op divide --min 10 --last 100."""
+        filters = {}
+        args = iter(args)
+        for arg in args:
+            # LBYL: Every filter takes exactly one value
+            value = next(args, None)
+            if arg not in cls.QUERY_OPTIONS or value is None:
+                raise ValueError(f"Unknown or incomplete filter: {arg}")
+            name = cls.QUERY_OPTIONS[arg]
+            # EAFP: Bad numbers and dates surface as a ValueError for the caller
+            if name in ("min_result", "max_result"):
+                try:
+                    filters[name] = Decimal(value)
+                except InvalidOperation as e:
+                    raise ValueError(f"invalid number for {arg}: {value}") from e
+            elif name in ("since", "until"):
+                filters[name] = datetime.fromisoformat(value).timestamp()
+            elif name == "last":
+                filters[name] = int(value)
+                if filters[name] < 1:
+                    raise ValueError("--last needs a positive number.")
+            else:
+                filters[name] = value
+        return filters
+
+    # Each subcommand is run by the method of the same name, the file ones are also given the filename
+    SUBCOMMANDS = ("load", "save", "clear", "delete", "show", "stats", "query", "compact")
+    FILE_SUBCOMMANDS = ("load", "save", "show")
+
+    def execute(self, subcommand: str, filename: str = None, **options) -> None:
+        """Execute a history command based on the subcommand.
+
+        Keyword options are passed to show_history for the 'show' subcommand (head, tail, page, page_size).
+        """
 
         if filename:
 
@@ -22,79 +79,120 @@ class HistoryCommand(Command):
             self.show_help()
             return
 
-        if subcommand == "load":
-            # LBYL: Check if filename is provided and if the file exists.
-            if filename is None:
-                filename = input("Enter the filename to load history: ")
+        # LBYL: Check the subcommand exists before running it
+        if subcommand not in self.SUBCOMMANDS:
+            print("Invalid subcommand. Use load, save, clear, delete, show, query, stats, or compact.")
+            logger.warning("Invalid subcommand: %s", subcommand)
+            return
+        if subcommand in self.FILE_SUBCOMMANDS:
+            getattr(self, subcommand)(filename, **options)
+        else:
+            getattr(self, subcommand)(**options)
+
+    def load(self, filename: str) -> None:
+        """Load history from a file and make it the active file."""
+        # LBYL: Check if filename is provided and if the file exists.
+        if filename is None:
+            filename = input("Enter the filename to load history: ")
+
+        if os.path.exists(filename):
+            try:
+                self.calculator.load_history(filename)
+                logger.info("Successfully loaded history from %s", filename)
+            except Exception as e: #COV-NA
+                logger.error("Error loading history from %s: %s", filename, e)
+                print(f"Failed to load history: {e}")
+        else:
+            logger.warning("File not found: %s", filename)
+            print(f"History file '{filename}' does not exist.")
+
+    def save(self, filename: str) -> None:
+        """Save a copy of the history to a new file."""
+        # LBYL: Check if filename is provided.
+        if filename is None:
+            filename = input("Enter the filename to save history: ")
+
+        # EAFP: Attempt to save history and handle any potential errors.
+        try:
+            self.calculator.save_as_new_file(filename)
+            logger.info("Successfully saved history to %s", filename)
+        except Exception as e: #COV-NA
+            logger.error("Error saving history to %s: %s", filename, e)
+            print(f"Failed to save history: {e}")
+
+    def clear(self) -> None:
+        """Clear the active history."""
+        try:
+            # EAFP: Clear history and handle any errors that occur.
+            self.calculator.clear_history()
+            logger.info("History cleared successfully.")
+        except Exception as e: #COV-NA
+            logger.error("Error clearing history: %s", e)
+            print(f"Failed to clear history: {e}")
 
+    def delete(self, **options) -> None:
+        """Delete the last entry, or the last count entries."""
+        try:
+            # EAFP: Delete the last entry in history.
+            self.calculator.delete_last_calculation(**options)
+            logger.info("Last calculation deleted successfully.")
+        except Exception as e: #COV-NA
+            logger.error("Error deleting last calculation: %s", e)
+            print(f"Failed to delete last calculation: {e}")
+
+    def show(self, filename: str, **options) -> None:
+        """Show the active history, or load a file first and show that."""
+        if filename is not None:
+            # LBYL: Check if the file exists before showing history.
             if os.path.exists(filename):
                 try:
                     self.calculator.load_history(filename)
-                    logger.info(f"Successfully loaded history from {filename}")
+                    logger.info("History loaded from %s for display.", filename)
+                    self.calculator.show_history(**options)
                 except Exception as e: #COV-NA
-                    logger.error(f"Error loading history from {filename}: {e}")
-                    print(f"Failed to load history: {e}")
+                    logger.error("Error loading and showing history from %s: %s", filename, e)
+                    print(f"Failed to show history from {filename}: {e}")
             else:
-                logger.warning(f"File not found: {filename}")
+                logger.warning("File not found: %s", filename)
                 print(f"History file '{filename}' does not exist.")
-        
-        elif subcommand == "save":
-            # LBYL: Check if filename is provided.
-            if filename is None:
-                filename = input("Enter the filename to save history: ")
-
-            # EAFP: Attempt to save history and handle any potential errors.
-            try:
-                self.calculator.save_as_new_file(filename)
-                logger.info(f"Successfully saved history to {filename}")
-            except Exception as e: #COV-NA
-                logger.error(f"Error saving history to {filename}: {e}")
-                print(f"Failed to save history: {e}")
-        
-        elif subcommand == "clear":
-            try:
-                # EAFP: Clear history and handle any errors that occur.
-                self.calculator.clear_history()
-                logger.info("History cleared successfully.")
-            except Exception as e: #COV-NA
-                logger.error(f"Error clearing history: {e}")
-                print(f"Failed to clear history: {e}")
-        
-        elif subcommand == "delete":
+        else:
             try:
-                # EAFP: Delete the last entry in history.
-                self.calculator.delete_last_calculation()
-                logger.info("Last calculation deleted successfully.")
+                # EAFP: Display the current history and handle any errors.
+                self.calculator.show_history(**options)
+                logger.info("Displayed current history.")
             except Exception as e: #COV-NA
-                logger.error(f"Error deleting last calculation: {e}")
-                print(f"Failed to delete last calculation: {e}")
-        
-        elif subcommand == "show":
-            if filename is not None:
-                # LBYL: Check if the file exists before showing history.
-                if os.path.exists(filename):
-                    try:
-                        self.calculator.load_history(filename)
-                        logger.info(f"History loaded from {filename} for display.")
-                        self.calculator.show_history()
-                    except Exception as e: #COV-NA
-                        logger.error(f"Error loading and showing history from {filename}: {e}")
-                        print(f"Failed to show history from {filename}: {e}")
-                else:
-                    logger.warning(f"File not found: {filename}")
-                    print(f"History file '{filename}' does not exist.")
-            else:
-                try:
-                    # EAFP: Display the current history and handle any errors.
-                    self.calculator.show_history()
-                    logger.info("Displayed current history.")
-                except Exception as e: #COV-NA
-                    logger.error(f"Error showing history: {e}")
-                    print(f"Failed to show history: {e}")
-        
-        else:
-            print("Invalid subcommand. Use load, save, clear, delete, or show.")
-            logger.warning(f"Invalid subcommand: {subcommand}")
+                logger.error("Error showing history: %s", e)
+                print(f"Failed to show history: {e}")
+
+    def stats(self, **options) -> None:
+        """Show the running statistics of the active history."""
+        try:
+            # EAFP: Show the running aggregates, rebuilding them from the file if asked to.
+            self.calculator.show_stats(**options)
+            logger.info("Displayed history statistics.")
+        except Exception as e: #COV-NA
+            logger.error("Error showing history statistics: %s", e)
+            print(f"Failed to show history statistics: {e}")
+
+    def query(self, **options) -> None:
+        """Show the entries of the active history that match every filter."""
+        try:
+            # EAFP: Run the filters on the active file and display the matches.
+            self.calculator.show_query(**options)
+            logger.info("Queried history with %s", options)
+        except Exception as e: #COV-NA
+            logger.error("Error querying history: %s", e)
+            print(f"Failed to query history: {e}")
+
+    def compact(self) -> None:
+        """Merge the sealed segments of the active history."""
+        try:
+            # EAFP: Merge the sealed segments and report how many were merged away.
+            merged = self.calculator.compact_history()
+            print(f"Merged {merged} segment(s)." if merged else "Nothing to compact.")
+        except Exception as e: #COV-NA
+            logger.error("Error compacting history: %s", e)
+            print(f"Failed to compact history: {e}")
 
     def show_help(self) -> None:
         """Provide help information for history commands."""
@@ -103,7 +201,17 @@ class HistoryCommand(Command):
             "Usage: history <subcommand> [<filename>]\n"
             " - load <filename>: Load history from a specified file and set it as the active file.\n"
             " - save <filename>: Save a copy of the current history to a new file.\n"
+            "   The extension picks the format: .csv, .npz, .db/.sqlite, or .parquet/.feather (needs pyarrow).\n"
+            "   .csv.gz, .csv.xz and .csv.zst (needs zstandard) are compressed CSV, streamed on read and append.\n"
             " - clear: Clear the current history in the active file.\n"
-            " - delete: Delete the last entry from the active history.\n"
-            " - show [filename]: Show the current history or load history from the specified file first."
+            " - delete [N]: Delete the last entry, or the last N entries, from the active history.\n"
+            " - show [filename] [--head N | --tail N | --page K [--page-size N]]: Show the current history\n"
+            "   or load history from the specified file first, optionally only the first/last N entries or one page.\n"
+            " - query [--op NAME] [--min X] [--max X] [--since DATE] [--until DATE] [--last N]: Show the entries\n"
+            "   matching every filter. SQLite files (.db/.sqlite) run it as an indexed query and record timestamps.\n"
+            " - stats [--rebuild]: Show counts, sum, mean, min and max of results and operands per operation.\n"
+            "   They are kept up to date as entries change; --rebuild recomputes them from the file.\n"
+            " - compact: Merge the sealed segments of a segmented CSV history (see CALC_SEGMENT_ROWS).\n"
+            "   A compressed history is also repacked into one stream instead of one block per append,\n"
+            "   and a binary history has its part files merged back into one file."
         )
@@ -1,31 +1,40 @@
-from calculator import Calculator
-from decimal import Decimal
 import logging
+import operator
+from calculator import Calculator
+from calculator.bulk import execute_many
+from calculator.numeric import Number, same_kind
 
 logger = logging.getLogger('calculator_app')
 
 class SubtractCommand:
+    cacheable = True  # Pure arithmetic, results can be reused for identical operands
+
     def __init__(self, calculator: Calculator):
         self.calculator = calculator
 
-    def execute(self, operand1: Decimal, operand2: Decimal) -> Decimal:
+    def execute(self, operand1: Number, operand2: Number) -> Number:
         """Execute the subtraction operation and record it in history."""
-        # LBYL: Check if both operands are valid Decimal numbers before proceeding
-        if isinstance(operand1, Decimal) and isinstance(operand2, Decimal):
+        # LBYL: Check if both operands are numbers of the same type before proceeding
+        if same_kind(operand1, operand2):
             try:
                 # EAFP: Perform the subtraction and handle any unexpected issues
                 result = operand1 - operand2
                 self.calculator.add_to_history("subtract", [operand1, operand2], result)
-                logger.info(f"Executed Subtract: {operand1} - {operand2} = {result}")
+                logger.info("Executed Subtract: %s - %s = %s", operand1, operand2, result)
                 return result
             except Exception as e: #COV-NA
-                logger.error(f"Error during subtraction: {e}")
+                logger.error("Error during subtraction: %s", e)
                 raise e  # Reraise the exception after logging #COV-NA
         else:
-            logger.warning(f"Invalid operands for subtraction: {operand1}, {operand2}")
-            raise ValueError("Operands must be Decimal numbers") #COV-NA
+            logger.warning("Invalid operands for subtraction: %s, %s", operand1, operand2)
+            raise ValueError("Operands must be numbers of one type (Decimal, float or Fraction)") #COV-NA
+
+    def execute_many(self, operands1, operands2, exact: bool = False):
+        """Subtract two operand arrays element-wise and record them in history as one block."""
+        return execute_many(self.calculator, "subtract", operands1, operands2, "subtract", operator.sub,
+                            exact=exact)
 
     def show_help(self) -> None:
         """Provide help for the Subtract command."""
-        print("\nUsage: subtract <value1> <value2>")
-        print("Description: Subtracts the second number from the first.")
+        print("\nUsage: subtract <value1> <value2> [<value3> ...]")
+        print("Description: Subtracts the following numbers from the first, left to right.")
@@ -0,0 +1,137 @@
+"""Single registry resolving command names to reusable command instances."""
+import logging
+import os
+import weakref
+from typing import Optional
+from calculator.cache import CachedCommand, ResultCache
+from calculator.discovery import PluginCatalog
+from calculator.metrics import METRICS, TimedCommand
+
+logger = logging.getLogger('calculator_app')
+
+PLUGINS_PACKAGE = "calculator.plugins"
+PLUGINS_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'plugins')
+
+class CommandRegistry:
+    """Hold one command instance per plugin for a calculator, created on first use.
+
+    Discovery, the result cache and hot reload are shared by every registry in the process,
+    so CommandFactory and PluginManager are thin views over this class.
+    """
+    _catalog: Optional[PluginCatalog] = None  # Shared by every registry, built on first use
+    result_cache = None  # Shared by every cacheable command while enabled
+    _registries = weakref.WeakSet()  # Live registries, so a reload can drop their stale instances
+
+    def __init__(self, calculator):
+        self.calculator = calculator
+        self.commands = {}  # command name -> instance, the hot path is a single lookup here
+        CommandRegistry._registries.add(self)
+
+    @classmethod
+    def catalog(cls) -> PluginCatalog:
+        """Return the shared plugin catalog, discovering plugins the first time."""
+        catalog = cls._catalog
+        if catalog is None:
+            catalog = cls._catalog = PluginCatalog(PLUGINS_PACKAGE, PLUGINS_DIRECTORY)
+        return catalog
+
+    @classmethod
+    def names(cls) -> list:
+        """Names of every available command, without importing any plugin."""
+        return list(cls.catalog())
+
+    @classmethod
+    def load_times(cls) -> dict:
+        """Seconds spent importing each plugin that has been loaded."""
+        return dict(cls.catalog().load_times)
+
+    @classmethod
+    def enable_result_cache(cls, maxsize: int = 1024, policy: str = "lru") -> ResultCache:
+        """Put a bounded result cache in front of the cacheable commands created from now on."""
+        cls.result_cache = ResultCache(maxsize, policy)
+        cls._drop_instances(cls.names())
+        return cls.result_cache
+
+    @classmethod
+    def disable_result_cache(cls) -> None:
+        """Stop caching results for commands created from now on."""
+        cls.result_cache = None
+        cls._drop_instances(cls.names())
+
+    @classmethod
+    def enable_metrics(cls) -> None:
+        """Time and count every command created from now on, and history I/O and plugin loads."""
+        METRICS.enable()
+        cls._drop_instances(cls.names())
+
+    @classmethod
+    def disable_metrics(cls) -> None:
+        """Stop instrumenting, so commands created from now on run unwrapped."""
+        METRICS.disable()
+        cls._drop_instances(cls.names())
+
+    @classmethod
+    def _drop_instances(cls, names) -> None:
+        """Forget instances in every registry so they are created again on next use."""
+        for registry in list(cls._registries):
+            for name in names:
+                registry.commands.pop(name, None)
+
+    @classmethod
+    def instantiate(cls, command_class, command_name: str, calculator):
+        """Create a command bound to a calculator, behind the result cache and instrumentation when enabled."""
+        command = command_class(calculator)
+        if cls.result_cache is not None and getattr(command, 'cacheable', False):
+            command = CachedCommand(command, command_name, cls.result_cache)
+        # Instrumentation wraps the command rather than checking a flag on every call, so it costs nothing when off
+        if METRICS.enabled:
+            command = TimedCommand(command, command_name)
+        return command
+
+    @classmethod
+    def create(cls, command_name: str, calculator):
+        """Create a new, unshared instance of a command."""
+        catalog = cls.catalog()
+        # LBYL: Check if the command exists before creating it
+        if command_name not in catalog:
+            raise ValueError(f"Unknown command: {command_name}")
+        # EAFP: The plugin module is imported here on first use, report it if that fails
+        try:
+            command_class = catalog[command_name]
+        except ImportError as e: #COV-NA
+            logger.error("Failed to import %s: %s", command_name, e)
+            raise ValueError(f"Unknown command: {command_name}") from e
+        return cls.instantiate(command_class, command_name, calculator)
+
+    def get(self, command_name: str):
+        """Return the shared instance of a command, creating it on first use."""
+        try:
+            return self.commands[command_name]
+        except KeyError:
+            command = self.commands[command_name] = self.create(command_name, self.calculator)
+            return command
+
+    def load(self, command_name: str):
+        """(Re)create the instance of a command, looking its class up in the plugin module again."""
+        command_class = self.catalog().resolve(command_name)
+        command = self.commands[command_name] = self.instantiate(command_class, command_name, self.calculator)
+        logger.info("Successfully loaded plugin: %s", command_name)
+        return command
+
+    @classmethod
+    def reload_changed(cls, executor=None) -> list:
+        """Reload plugin modules whose files changed on disk and return their names.
+
+        An executor running commands in worker processes is reset, its workers still hold the old modules.
+        """
+        catalog = cls.catalog()
+        changed = catalog.changed()
+        if changed:
+            catalog.refresh()
+            for name in changed:
+                catalog.reload(name)
+            cls._drop_instances(changed)
+            if executor is not None:
+                executor.reset()
+            logger.info("Reloaded plugins: %s", changed)
+        return changed
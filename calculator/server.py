@@ -0,0 +1,268 @@
+"""Line-protocol TCP server giving every client its own calculator session."""
+import asyncio
+import concurrent.futures
+import itertools
+import logging
+import os
+import re
+from decimal import InvalidOperation
+from calculator import Calculator
+from calculator.expression import NARY_OPERATIONS, ExpressionEngine
+from calculator.numeric import get_backend
+from calculator.registry import CommandRegistry
+from calculator.storage import FlushPolicy, tail_rows
+
+logger = logging.getLogger('calculator_app')
+
+MAX_LINE = 64 * 1024  # Longest request line accepted
+MAX_BATCH = 256  # Pipelined requests handed to a worker thread in one go
+SESSION_FILE = re.compile(r"session-(\d+)\.csv")
+SESSION_PREFIX = re.compile(r"session-(\d+)\.")  # Any file of a session: its history, e.g. session-3.db
+
+class Session:
+    """One client's calculator, commands and variables; only ever used by one thread at a time."""
+    def __init__(self, session_id: int, history_dir: str, flush_policy: FlushPolicy = None):
+        self.session_id = session_id
+        self.history_dir = history_dir
+        self.calculator = Calculator(history_file=os.path.join(history_dir, f"session-{session_id}.csv"),
+                                     flush_policy=flush_policy)
+        self.registry = CommandRegistry(self.calculator)
+        self.engine = ExpressionEngine(self.calculator)
+
+    def handle_many(self, lines: list) -> list:
+        """Answer a block of pipelined requests in order."""
+        return [self.handle(line) for line in lines]
+
+    def handle(self, line) -> str:
+        """Answer one request with an 'OK <value>' or 'ERR <message>' line."""
+        # LBYL: The reader passes on errors it hit, such as an over-long line, in request order
+        if isinstance(line, Exception):
+            return f"ERR {line}"
+        parts = line.strip().lower().split()
+        # LBYL: An empty line gets an answer too, so responses stay matched to requests
+        if not parts:
+            return "ERR empty request"
+        try:
+            # Worker threads are shared by sessions, so the session's decimal context is applied per request
+            with self.calculator.backend.active():
+                return f"OK {self._dispatch(parts[0], parts[1:], line.strip())}"
+        except ZeroDivisionError:
+            return "ERR division by zero"
+        except (ValueError, TypeError, ArithmeticError, InvalidOperation, OSError) as e:
+            # EAFP: A bad request is reported to its client, the session carries on
+            logger.error("Session %s request failed: %s", self.session_id, e)
+            return f"ERR {e}"
+        except Exception as e:  # pylint: disable=broad-except
+            # EAFP: Anything else (e.g. a RecursionError from a deeply nested expression) fails only this request
+            logger.exception("Session %s request %r raised", self.session_id, line.strip())
+            return f"ERR internal error: {type(e).__name__}"
+
+    def _dispatch(self, operation: str, args: list, line: str):
+        """Run one parsed request and return the value to send back."""
+        if operation == "ping":
+            return "pong"
+        if operation == "quit":
+            return "bye"
+        if operation == "history":
+            return self._history(args)
+        if operation == "backend":
+            if args:
+                self.calculator.backend = get_backend(args[0], *(int(arg) for arg in args[1:2]), *args[2:3])
+            return self.calculator.backend.name
+        if operation == "eval":
+            return self.engine.evaluate(line[len("eval"):].lower())
+        if operation == "let":
+            name, equals, source = line[len("let"):].lower().partition("=")
+            if not equals:
+                raise ValueError("usage: let <name> = <expression>")
+            return self.engine.assign(name.strip(), source)
+
+        values = [self.calculator.backend.parse(value) for value in args]
+        if len(values) > 2 and operation in NARY_OPERATIONS:
+            return self.engine.apply(operation, values)
+        return self.registry.get(operation).execute(*values)
+
+    def _history(self, args: list):
+        """History subcommands: file, use <name>, count, tail [N], delete [N] and clear."""
+        subcommand = args[0] if args else "count"
+        calculator = self.calculator
+        if subcommand == "file":
+            return os.path.basename(calculator.active_history_file)
+        if subcommand == "use" and len(args) == 2:
+            self.use_file(args[1])
+            return os.path.basename(calculator.active_history_file)
+        if subcommand == "count":
+            return len(calculator.store)
+        if subcommand == "tail":
+            calculator.save_history()
+            rows = tail_rows(calculator.active_history_file, int(args[1]) if len(args) > 1 else 10) \
+                if os.path.isfile(calculator.active_history_file) else []
+            return " | ".join(f"{f'{operation} {operands}'.strip()} = {result}" for operation, operands, result in rows)
+        if subcommand == "delete":
+            calculator.delete_last_calculation(int(args[1]) if len(args) > 1 else 1)
+            return len(calculator.store)
+        if subcommand == "clear":
+            calculator.clear_history()
+            return 0
+        raise ValueError("history subcommands: file, use <name>, count, tail [N], delete [N], clear")
+
+    def use_file(self, name: str) -> None:
+        """Switch this session to another history file inside the server's history directory."""
+        # Only the file name is kept, so a client can never reach outside the history directory
+        name = os.path.basename(name)
+        # LBYL: Names that resolve to a directory or a sidecar file, and other sessions' histories, are off limits
+        if not name or name.startswith("."):
+            raise ValueError(f"invalid history file name: {name or '(empty)'}")
+        owner = SESSION_PREFIX.match(name)
+        if owner and int(owner.group(1)) != self.session_id:
+            raise ValueError(f"{name} belongs to another session")
+        path = os.path.join(self.history_dir, name)
+        self.calculator.open_history(path)
+        logger.info("Session %s switched to %s", self.session_id, path)
+
+    def close(self) -> None:
+        """Write out anything still buffered for the session."""
+        self.calculator.close()
+
+class CalculatorServer:
+    """Serve calculator sessions over TCP, one request per line and one response line per request.
+
+    Requests from a client are answered in the order they were sent, so a client can pipeline them.
+    Each session runs its requests, including history writes, on a worker thread so a slow disk never
+    stalls the event loop, and at most max_pending requests are queued per client: beyond that the
+    server stops reading from the socket and TCP pushes back on the client.
+    """
+    def __init__(self, history_dir: str, host: str = "127.0.0.1", port: int = 0, max_pending: int = 64,
+                 workers: int = None, flush_policy: FlushPolicy = None):
+        self.history_dir = history_dir
+        self.host = host
+        self.port = port
+        self.max_pending = max_pending
+        self.flush_policy = flush_policy
+        self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="calc-session")
+        self._session_ids = None  # Numbered on from the session files already in history_dir by start()
+        self._server = None
+        self._clients = {}  # Handler task -> writer of every connected client
+
+    async def start(self) -> tuple:
+        """Start listening and return the (host, port) actually bound."""
+        os.makedirs(self.history_dir, exist_ok=True)
+        self._session_ids = itertools.count(next_session_id(self.history_dir))
+        self._server = await asyncio.start_server(self._handle_client, self.host, self.port, limit=MAX_LINE)
+        self.host, self.port = self._server.sockets[0].getsockname()[:2]
+        logger.info("Calculator server listening on %s:%s", self.host, self.port)
+        return self.host, self.port
+
+    async def serve_forever(self) -> None:
+        """Serve until cancelled."""
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    @property
+    def active_sessions(self) -> int:
+        """Number of clients currently connected."""
+        return len(self._clients)
+
+    async def close(self) -> None:
+        """Stop accepting clients, disconnect the connected ones and release the worker threads."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        # Each handler still flushes its session's history once its connection is dropped
+        for writer in self._clients.values():
+            writer.transport.abort()
+        await asyncio.gather(*self._clients, return_exceptions=True)
+        self._pool.shutdown(wait=True)
+        logger.info("Calculator server stopped")
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Track one client for the lifetime of its connection."""
+        self._clients[asyncio.current_task()] = writer
+        try:
+            await self._serve_client(reader, writer)
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+            self._clients.pop(asyncio.current_task(), None)
+
+    async def _serve_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Read requests from one client and queue them for its session."""
+        loop = asyncio.get_running_loop()
+        session = await loop.run_in_executor(
+            self._pool, Session, next(self._session_ids), self.history_dir, self.flush_policy)
+        logger.info("Session %s opened for %s", session.session_id, writer.get_extra_info('peername'))
+
+        # A full queue blocks the reader, which is what applies backpressure to a fast client
+        queue = asyncio.Queue(maxsize=self.max_pending)
+        responder = asyncio.create_task(self._respond(session, queue, writer))
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    logger.warning("Session %s sent a line over %s bytes", session.session_id, MAX_LINE)
+                    await queue.put(ValueError(f"request longer than {MAX_LINE} bytes"))
+                    break
+                except ConnectionError:
+                    break
+                if not line:
+                    break
+                request = line.decode('utf-8', errors='replace')
+                await queue.put(request)
+                if request.strip().lower() == "quit":
+                    break
+        finally:
+            await queue.put(None)
+            await responder
+            await loop.run_in_executor(self._pool, session.close)
+            logger.info("Session %s closed", session.session_id)
+
+    async def _respond(self, session: Session, queue: asyncio.Queue, writer: asyncio.StreamWriter) -> None:
+        """Run queued requests on a worker thread in batches and write the responses back in order."""
+        loop = asyncio.get_running_loop()
+        connected = True
+        while True:
+            # Everything already pipelined goes to the worker thread in one hop
+            requests = [await queue.get()]
+            while len(requests) < MAX_BATCH and not queue.empty():
+                requests.append(queue.get_nowait())
+            finished = requests[-1] is None
+            requests = [request for request in requests if request is not None]
+
+            # LBYL: Once the client is gone its remaining requests are dropped instead of executed
+            if connected and requests:
+                try:
+                    responses = await loop.run_in_executor(self._pool, session.handle_many, requests)
+                except Exception as e:  # pylint: disable=broad-except
+                    # EAFP: A failed batch is answered with one error per request, the connection carries on
+                    logger.exception("Session %s failed a batch of %s requests", session.session_id, len(requests))
+                    responses = [f"ERR internal error: {type(e).__name__}"] * len(requests)
+                try:
+                    writer.write("".join(f"{response}\n" for response in responses).encode('utf-8'))
+                    await writer.drain()  # Waits while the client is not reading its responses
+                except ConnectionError:
+                    logger.warning("Session %s lost its connection", session.session_id)
+                    connected = False
+            if finished:
+                return
+
+def next_session_id(history_dir: str) -> int:
+    """First session number not used by a session-<n>.csv file in history_dir, so a restart never reuses one."""
+    numbers = [int(match.group(1)) for match in map(SESSION_FILE.fullmatch, os.listdir(history_dir)) if match]
+    return max(numbers, default=0) + 1
+
+async def serve(history_dir: str, host: str = "127.0.0.1", port: int = 8765, max_pending: int = 64,
+                workers: int = None) -> None:
+    """Run a calculator server until interrupted."""
+    server = CalculatorServer(history_dir, host, port, max_pending=max_pending, workers=workers)
+    host, port = await server.start()
+    print(f"Calculator server listening on {host}:{port}")
+    try:
+        await server.serve_forever()
+    finally:
+        await server.close()
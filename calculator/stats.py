@@ -0,0 +1,341 @@
+"""Running aggregates over the calculation history, kept up to date entry by entry."""
+import decimal
+import functools
+import json
+import logging
+import math
+import os
+from collections import Counter
+from decimal import Decimal
+from calculator.numeric import to_decimal
+from calculator.operands import decode_operands
+from calculator.storage import atomic_write, part_paths, sidecar_path
+
+logger = logging.getLogger('calculator_app')
+
+STATS_VERSION = 1
+# Aggregates never use the session's decimal context: sums accumulate at a fixed high precision, so they stay
+# exact whatever precision a session computes at, and are reported at decimal's default precision
+STATS_CONTEXT = decimal.Context(prec=60, rounding=decimal.ROUND_HALF_EVEN)
+SUMMARY_CONTEXT = decimal.Context(prec=28, rounding=decimal.ROUND_HALF_EVEN)
+
+def in_context(context: decimal.Context):
+    """Decorator running a method's Decimal arithmetic in the given context instead of the caller's."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with decimal.localcontext(context):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def stats_path(history_path: str) -> str:
+    """Return the sidecar summary file for a history file, e.g. data/.calculator/history.csv.stats.json."""
+    return sidecar_path(history_path, "stats.json")
+
+def file_signature(path: str) -> list:
+    """Size and modification time of a file and its parts, used to tell whether a saved summary still matches it."""
+    signature = []
+    for file in [path] + part_paths(path):
+        try:
+            status = os.stat(file)
+            signature += [status.st_size, status.st_mtime_ns]
+        except FileNotFoundError:
+            signature += [0, 0]
+    return signature
+
+def finite(value):
+    """Return a finite float as it is and anything else as a finite Decimal, or None if it is not finite.
+
+    Floats are summed as floats, converting each one to Decimal would cost more than the float arithmetic.
+    """
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    return to_decimal(value)
+
+class Aggregate:
+    """Count, sum, minimum and maximum of a stream of numbers.
+
+    Removing the current minimum or maximum cannot be undone from the totals alone, so the extremes are
+    then marked stale and recomputed from the history the next time they are read.
+    """
+    def __init__(self):
+        self.count = 0
+        self.total = Decimal(0)
+        self.float_total = 0.0  # Float values are summed apart and only converted when the sum is read
+        self.minimum = None
+        self.maximum = None
+        self.stale = False
+
+    @property
+    def sum(self) -> Decimal:
+        """Sum of every value included."""
+        return self.total + to_decimal(self.float_total) if self.float_total else self.total
+
+    def add(self, value) -> None:
+        """Include one Decimal or float value."""
+        self.count += 1
+        if isinstance(value, float):
+            self.float_total += value
+        else:
+            self.total += value
+        if self.minimum is None or value < self.minimum:
+            self.minimum = value
+        if self.maximum is None or value > self.maximum:
+            self.maximum = value
+
+    def add_block(self, count: int, total: Decimal, minimum: Decimal, maximum: Decimal) -> None:
+        """Include a block of values given by its own aggregates."""
+        if count == 0:
+            return
+        self.count += count
+        self.total += total
+        self.minimum = minimum if self.minimum is None else min(self.minimum, minimum)
+        self.maximum = maximum if self.maximum is None else max(self.maximum, maximum)
+
+    def merge(self, other: "Aggregate") -> None:
+        """Include every value another aggregate was built from."""
+        self.add_block(other.count, other.total, other.minimum, other.maximum)
+        self.float_total += other.float_total
+        self.stale = self.stale or other.stale
+
+    def remove(self, value) -> None:
+        """Exclude one value that was previously added."""
+        self.count -= 1
+        if isinstance(value, float):
+            self.float_total -= value
+        else:
+            self.total -= value
+        if self.count == 0:
+            self.minimum = self.maximum = None
+            self.stale = False
+        elif value in (self.minimum, self.maximum):
+            self.stale = True
+
+    def reset_extremes(self, values) -> None:
+        """Recompute the minimum and maximum from the values still in the history."""
+        values = list(values)
+        self.minimum = min(values) if values else None
+        self.maximum = max(values) if values else None
+        self.stale = False
+
+    def summary(self) -> dict:
+        """Count, sum, mean, min and max rounded to the current context, None where there are no values."""
+        total = +self.sum
+        return {
+            "count": self.count,
+            "sum": total,
+            "mean": total / self.count if self.count else None,
+            "min": None if self.minimum is None else +self.minimum,
+            "max": None if self.maximum is None else +self.maximum,
+        }
+
+    def to_json(self) -> dict:
+        """Serialize with exact decimal strings."""
+        return {"count": self.count, "total": str(self.sum), "stale": self.stale,
+                "minimum": None if self.minimum is None else str(self.minimum),
+                "maximum": None if self.maximum is None else str(self.maximum)}
+
+    @classmethod
+    def from_json(cls, data: dict) -> "Aggregate":
+        """Rebuild an aggregate saved with to_json."""
+        aggregate = cls()
+        aggregate.count = data["count"]
+        aggregate.total = Decimal(data["total"])
+        aggregate.minimum = None if data["minimum"] is None else Decimal(data["minimum"])
+        aggregate.maximum = None if data["maximum"] is None else Decimal(data["maximum"])
+        aggregate.stale = data["stale"]
+        return aggregate
+
+class OperationStats:
+    """Aggregates of one operation's results and operands, and how many operands its entries had."""
+    def __init__(self):
+        self.results = Aggregate()
+        self.operands = Aggregate()
+        self.arity = Counter()
+
+    @property
+    def count(self) -> int:
+        """Number of entries of this operation."""
+        return sum(self.arity.values())
+
+    def to_json(self) -> dict:
+        """Serialize for the summary file."""
+        return {"results": self.results.to_json(), "operands": self.operands.to_json(),
+                "arity": {str(size): count for size, count in self.arity.items()}}
+
+    @classmethod
+    def from_json(cls, data: dict) -> "OperationStats":
+        """Rebuild operation stats saved with to_json."""
+        stats = cls()
+        stats.results = Aggregate.from_json(data["results"])
+        stats.operands = Aggregate.from_json(data["operands"])
+        stats.arity = Counter({int(size): count for size, count in data["arity"].items()})
+        return stats
+
+class HistoryStats:
+    """Per-operation aggregates of a history, updated as entries are added and removed."""
+    def __init__(self):
+        self.operations = {}
+        self.rows = 0
+        self.dirty = False  # Changed since it was last saved
+
+    def _operation(self, operation: str) -> OperationStats:
+        stats = self.operations.get(operation)
+        if stats is None:
+            stats = self.operations[operation] = OperationStats()
+        return stats
+
+    @in_context(STATS_CONTEXT)
+    def add(self, operation: str, operands: list, result) -> None:
+        """Include one entry, with its operands as a list of numbers."""
+        stats = self._operation(operation)
+        stats.arity[len(operands)] += 1
+        for operand in operands:
+            value = finite(operand)
+            if value is not None:
+                stats.operands.add(value)
+        value = finite(result)
+        if value is not None:
+            stats.results.add(value)
+        self.rows += 1
+        self.dirty = True
+
+    @in_context(STATS_CONTEXT)
+    def add_block(self, operation: str, operand_columns: list, results: list) -> None:
+        """Include a block of entries of one operation, with operands given column-wise.
+
+        Float blocks from the vectorized commands are summarized with fsum, min and max before converting,
+        instead of turning every element into a Decimal.
+        """
+        if len(results) == 0:
+            return
+        stats = self._operation(operation)
+        stats.arity[len(operand_columns)] += len(results)
+        columns = [(column, stats.operands) for column in operand_columns] + [(results, stats.results)]
+        for values, aggregate in columns:
+            values = values.tolist() if hasattr(values, 'tolist') else list(values)
+            if all(isinstance(value, float) for value in values):
+                finite_values = [value for value in values if math.isfinite(value)]
+                if finite_values:
+                    aggregate.add_block(len(finite_values), to_decimal(math.fsum(finite_values)),
+                                        to_decimal(min(finite_values)), to_decimal(max(finite_values)))
+            else:
+                for value in values:
+                    value = to_decimal(value)
+                    if value is not None:
+                        aggregate.add(value)
+        self.rows += len(results)
+        self.dirty = True
+
+    @in_context(STATS_CONTEXT)
+    def merge(self, other: "HistoryStats") -> None:
+        """Include every entry another set of aggregates was built from, e.g. one computed in a worker process."""
+        for operation, theirs in other.operations.items():
+            stats = self._operation(operation)
+            stats.results.merge(theirs.results)
+            stats.operands.merge(theirs.operands)
+            stats.arity.update(theirs.arity)
+        self.rows += other.rows
+        self.dirty = True
+
+    @in_context(STATS_CONTEXT)
+    def remove(self, rows: list) -> None:
+        """Exclude entries given as (operation, encoded operands, result) rows."""
+        for operation, operands, result in rows:
+            stats = self.operations.get(operation)
+            if stats is None:
+                continue
+            operands = decode_operands(str(operands))
+            stats.arity[len(operands)] -= 1
+            if stats.arity[len(operands)] <= 0:
+                del stats.arity[len(operands)]
+            for operand in map(finite, operands):
+                if operand is not None:
+                    stats.operands.remove(operand)
+            value = finite(result)
+            if value is not None:
+                stats.results.remove(value)
+            if stats.count == 0:
+                del self.operations[operation]
+            self.rows -= 1
+        self.dirty = True
+
+    def clear(self) -> None:
+        """Forget every entry."""
+        self.operations.clear()
+        self.rows = 0
+        self.dirty = True
+
+    @classmethod
+    @in_context(STATS_CONTEXT)
+    def from_columns(cls, operations: list, operands: list, results: list) -> "HistoryStats":
+        """Compute the aggregates from scratch in one pass over the history columns."""
+        stats = cls()
+        for operation, encoded, result in zip(operations, operands, results):
+            stats.add(operation, decode_operands(str(encoded)), result)
+        return stats
+
+    @in_context(SUMMARY_CONTEXT)
+    def summary(self, store=None) -> dict:
+        """Per-operation count, sum, mean, min and max of results and operands, and operand counts.
+
+        Extremes made stale by a deletion are recomputed from store, the in-memory history, on the way.
+        """
+        summary = {}
+        for operation, stats in sorted(self.operations.items()):
+            if store is not None and (stats.results.stale or stats.operands.stale):
+                self._refresh_extremes(operation, stats, store)
+            summary[operation] = {
+                "count": stats.count,
+                "results": stats.results.summary(),
+                "operands": stats.operands.summary(),
+                "arity": dict(sorted(stats.arity.items())),
+            }
+        return summary
+
+    @staticmethod
+    @in_context(STATS_CONTEXT)
+    def _refresh_extremes(operation: str, stats: OperationStats, store) -> None:
+        """Recompute one operation's extremes from the entries still in the history."""
+        results, operands = [], []
+        for name, encoded, result in zip(store.column("operation"), store.column("operands"),
+                                         store.column("result")):
+            if name == operation:
+                results.append(to_decimal(result))
+                operands.extend(decode_operands(str(encoded)))
+        stats.results.reset_extremes(value for value in results if value is not None)
+        stats.operands.reset_extremes(value for value in map(to_decimal, operands) if value is not None)
+
+    @in_context(STATS_CONTEXT)
+    def save(self, history_path: str) -> None:
+        """Write the aggregates to the sidecar file, tagged with the history file they describe."""
+        data = {
+            "version": STATS_VERSION,
+            "rows": self.rows,
+            "signature": file_signature(history_path),
+            "operations": {operation: stats.to_json() for operation, stats in self.operations.items()},
+        }
+        with atomic_write(stats_path(history_path)) as temp_path:
+            with open(temp_path, 'w', encoding='utf-8') as file:
+                json.dump(data, file)
+        self.dirty = False
+
+    @classmethod
+    def load(cls, history_path: str, rows: int):
+        """Read the sidecar file, or return None if it is missing or no longer matches the history file."""
+        try:
+            with open(stats_path(history_path), 'r', encoding='utf-8') as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return None
+        # LBYL: Any write the summary has not seen changes the size or the modification time
+        if data.get("version") != STATS_VERSION or data.get("rows") != rows or \
+                data.get("signature") != file_signature(history_path):
+            logger.info("Summary for %s is out of date", history_path)
+            return None
+        stats = cls()
+        stats.rows = rows
+        stats.operations = {operation: OperationStats.from_json(values)
+                            for operation, values in data["operations"].items()}
+        return stats
@@ -0,0 +1,31 @@
+"""Persistence layer that writes calculation history to disk."""
+from calculator.storage.policy import FlushPolicy, SegmentPolicy
+from calculator.storage.locking import atomic_write, file_lock, sidecar_path
+from calculator.storage.base import BufferedHistoryFile
+from calculator.storage.csv_file import CsvHistoryFile
+from calculator.storage.binary_file import BinaryHistoryFile, compact_parts
+from calculator.storage.sqlite_file import SqliteHistoryFile
+from calculator.storage.migration import migrate_legacy_csv, migrate_sidecars
+from calculator.storage.parts import part_paths, remove_parts
+from calculator.storage.formats import file_format, is_binary, is_sqlite, read_columns, read_history, write_history
+from calculator.storage.segments import compact_segments, remove_segments, repack_active, segment_paths
+from calculator.storage.snapshot import open_store, schedule_snapshot, snapshot_path, write_snapshot
+from calculator.storage.reader import head_rows, iter_rows, page_rows, query_rows, tail_rows
+
+def open_history_file(path: str, policy: FlushPolicy = None) -> BufferedHistoryFile:
+    """Open the write-behind history file matching the path's format."""
+    migrate_sidecars(path)
+    if is_sqlite(path):
+        return SqliteHistoryFile(path, policy)
+    if is_binary(path):
+        return BinaryHistoryFile(path, policy)
+    return CsvHistoryFile(path, policy)
+
+__all__ = [
+    "FlushPolicy", "SegmentPolicy", "atomic_write", "file_lock", "sidecar_path", "BufferedHistoryFile", "CsvHistoryFile",
+    "BinaryHistoryFile", "SqliteHistoryFile", "open_history_file", "migrate_legacy_csv", "migrate_sidecars",
+    "file_format", "is_binary", "is_sqlite",
+    "read_columns", "read_history", "write_history", "iter_rows", "head_rows", "page_rows", "query_rows",
+    "tail_rows", "open_store", "schedule_snapshot", "snapshot_path", "write_snapshot", "compact_segments",
+    "remove_segments", "repack_active", "segment_paths", "compact_parts", "part_paths", "remove_parts",
+]
@@ -0,0 +1,39 @@
+"""Maintenance of history files (snapshots, compaction) on background threads."""
+import atexit
+import logging
+import os
+import threading
+
+logger = logging.getLogger('calculator_app')
+
+_running = {}  # (task, absolute history path) -> thread running it
+_running_guard = threading.Lock()
+
+def _run_quietly(task: str, path: str, func, args: tuple) -> None:
+    """Run one maintenance task, logging instead of raising."""
+    # EAFP: Maintenance only makes later reads cheaper, a failed run leaves the history itself intact
+    try:
+        func(*args)
+    except (OSError, ValueError) as e:
+        logger.warning("Could not run %s for %s: %s", task, path, e)
+
+def run_in_background(task: str, path: str, func, *args) -> threading.Thread:
+    """Run func(*args) on a background thread unless the same task is already running for path; return the thread."""
+    key = (task, os.path.abspath(path))
+    with _running_guard:
+        thread = _running.get(key)
+        if thread is None or not thread.is_alive():
+            thread = threading.Thread(target=_run_quietly, args=(task, path, func, args),
+                                      name=f"calc-{task}", daemon=True)
+            _running[key] = thread
+            thread.start()
+        return thread
+
+@atexit.register
+def wait_for_background() -> None:
+    """Let running tasks finish, so no temporary file is left behind at exit."""
+    with _running_guard:
+        threads = list(_running.values())
+        _running.clear()
+    for thread in threads:
+        thread.join()
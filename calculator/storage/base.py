@@ -0,0 +1,98 @@
+"""Write-behind buffering shared by every history file format."""
+import atexit
+import threading
+import time
+import weakref
+from calculator.metrics import timed
+from calculator.storage.policy import FlushPolicy
+
+_open_files = weakref.WeakSet()  # Files still holding buffered entries at interpreter exit
+
+@atexit.register
+def _flush_open_files() -> None:
+    """Write out every buffered entry when the interpreter exits."""
+    for history_file in list(_open_files):
+        history_file.close()
+
+class BufferedHistoryFile:
+    """Buffer history rows and hand them to write_rows according to a flush policy."""
+    def __init__(self, path: str, policy: FlushPolicy = None):
+        self.path = path
+        self.policy = policy or FlushPolicy()
+        self._buffer = []
+        self._timer = None
+        self._lock = threading.RLock()
+        self._last_flush = time.monotonic()
+        _open_files.add(self)
+
+    @property
+    def pending(self) -> int:
+        """Number of rows buffered but not yet written."""
+        return len(self._buffer)
+
+    def append(self, row: tuple) -> None:
+        """Buffer one row and flush if the policy says so."""
+        with self._lock:
+            self._buffer.append(row)
+            elapsed_ms = (time.monotonic() - self._last_flush) * 1000
+            if self.policy.should_flush(len(self._buffer), elapsed_ms):
+                self.flush()
+            elif self.policy.max_delay_ms > 0 and self._timer is None:
+                # Make sure a quiet session still gets its entries written after the delay
+                self._timer = threading.Timer(self.policy.max_delay_ms / 1000, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def append_many(self, rows: list) -> None:
+        """Buffer a block of rows and flush if the policy says so."""
+        with self._lock:
+            self._buffer.extend(rows)
+            elapsed_ms = (time.monotonic() - self._last_flush) * 1000
+            if self.policy.should_flush(len(self._buffer), elapsed_ms):
+                self.flush()
+
+    def write_rows(self, rows: list) -> None:
+        """Persist rows to the file, implemented by each format."""
+        raise NotImplementedError
+
+    def truncate_rows(self, count: int) -> list:
+        """Remove the last count rows from the file and return them, implemented by each format."""
+        raise NotImplementedError
+
+    def release(self) -> None:
+        """Let go of any open handle, implemented by formats that keep one."""
+
+    def delete_last(self, count: int = 1) -> list:
+        """Remove the last count rows, buffered ones first, and return the removed rows oldest first."""
+        with self._lock:
+            from_buffer = min(count, len(self._buffer))
+            removed = self._buffer[len(self._buffer) - from_buffer:]
+            del self._buffer[len(self._buffer) - from_buffer:]
+            if count > from_buffer:
+                removed = self.truncate_rows(count - from_buffer) + removed
+            return removed
+
+    @timed("history", "flush")
+    def flush(self) -> None:
+        """Write every buffered row."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._last_flush = time.monotonic()
+            if not self._buffer:
+                return
+            self.write_rows(self._buffer)
+            self._buffer.clear()
+
+    def discard(self) -> None:
+        """Drop buffered rows without writing them and release the file."""
+        with self._lock:
+            self._buffer.clear()
+            self.close()
+
+    def close(self) -> None:
+        """Flush buffered rows and release the file."""
+        with self._lock:
+            self.flush()
+            self.release()
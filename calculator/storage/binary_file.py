@@ -0,0 +1,86 @@
+"""Write-behind history file for the binary columnar formats."""
+import copy
+import logging
+import os
+from calculator.storage.base import BufferedHistoryFile
+from calculator.storage.formats import read_binary_file, read_history, replace_file, write_history
+from calculator.storage.locking import file_lock
+from calculator.storage.parts import next_part_path, part_paths
+from calculator.storage.policy import FlushPolicy
+from calculator.store import HISTORY_COLUMNS
+
+logger = logging.getLogger('calculator_app')
+
+BINARY_MIN_BATCH = 100  # Fewest entries a binary history buffers before it writes a part
+
+def history_files(path: str) -> list:
+    """Return the history file and its parts that exist, oldest first."""
+    return [file for file in [path] + part_paths(path) if os.path.isfile(file)]
+
+def merge_parts(path: str, fsync: bool = False) -> int:
+    """Merge the newest two files of a binary history while the older is no larger than the newer.
+
+    The caller holds the file lock. Returns how many parts were merged away.
+    """
+    import pandas as pd  # pylint: disable=import-outside-toplevel
+    files = history_files(path)
+    merged = 0
+    while len(files) > 1 and os.path.getsize(files[-2]) <= os.path.getsize(files[-1]):
+        newer = files.pop()
+        replace_file(files[-1], pd.concat([read_binary_file(files[-1]), read_binary_file(newer)], ignore_index=True),
+                     fsync)
+        os.remove(newer)
+        merged += 1
+    return merged
+
+def compact_parts(path: str, fsync: bool = False) -> int:
+    """Merge every part of a binary history back into the history file and return how many there were."""
+    with file_lock(path):
+        parts = part_paths(path)
+        if parts:
+            write_history(path, read_history(path), fsync=fsync)  # Deletes the parts it replaces
+    return len(parts)
+
+class BinaryHistoryFile(BufferedHistoryFile):
+    """Binary formats cannot be appended to, so each flush writes its rows as a new part file (see calculator.storage.parts).
+
+    Every part is a whole file with its own header, so at least BINARY_MIN_BATCH entries are buffered
+    per flush whatever the policy asks for.
+    """
+    def __init__(self, path: str, policy: FlushPolicy = None):
+        super().__init__(path, policy)
+        # LBYL: Raise the batch on a copy, the policy may be shared with other history files
+        if self.policy.max_entries < BINARY_MIN_BATCH:
+            logger.info("Buffering %s entries per part of %s instead of %s",
+                        BINARY_MIN_BATCH, path, self.policy.max_entries)
+            self.policy = copy.copy(self.policy)
+            self.policy.max_entries = BINARY_MIN_BATCH
+
+    def write_rows(self, rows: list) -> None:
+        """Write the buffered rows as the next part, or as the history file itself if there is none yet."""
+        import pandas as pd  # pylint: disable=import-outside-toplevel
+        new_rows = pd.DataFrame(rows, columns=list(HISTORY_COLUMNS))
+        # Numbering the part and merging happen under one lock, so no other writer's part is overwritten
+        with file_lock(self.path):
+            target = next_part_path(self.path) if history_files(self.path) else self.path
+            replace_file(target, new_rows, fsync=self.policy.fsync)
+            merged = merge_parts(self.path, self.policy.fsync)
+        logger.info("%s entries written to %s, %s part(s) merged", len(rows), target, merged)
+
+    def truncate_rows(self, count: int) -> list:
+        """Remove the last count rows, rewriting only the newest files that hold them."""
+        removed = []
+        with file_lock(self.path):
+            files = history_files(self.path)
+            while count > 0 and files:
+                path = files.pop()
+                frame = read_binary_file(path)
+                cut = max(len(frame) - count, 0)
+                removed = list(frame.iloc[cut:].itertuples(index=False, name=None)) + removed
+                count -= len(frame) - cut
+                # LBYL: An emptied part is deleted, the history file itself is kept even when empty
+                if cut == 0 and path != self.path:
+                    os.remove(path)
+                else:
+                    replace_file(path, frame.iloc[:cut], fsync=self.policy.fsync)
+        return removed
@@ -0,0 +1,118 @@
+"""Streaming compression of CSV history files, chosen by a second extension: .csv.gz, .csv.xz or .csv.zst.
+
+Every flush appends its rows as one complete gzip member, xz stream or zstd frame, so an append never
+touches what is already on disk and the file is a valid compressed file after every write. Readers
+decompress every member in turn, a chunk at a time, so a history is never inflated whole in memory.
+zstd needs the optional zstandard package.
+"""
+import gzip
+import io
+import logging
+import lzma
+import os
+
+logger = logging.getLogger('calculator_app')
+
+CODECS = {".gz": "gzip", ".xz": "xz", ".zst": "zstd"}
+# Appends compress a flush's few rows at a time, so they use fast levels; whole rewrites use each codec's default
+APPEND_LEVELS = {"gzip": 6, "xz": 1, "zstd": 3}
+
+def compression(path: str):
+    """Return the codec a history path is compressed with ('gzip', 'xz' or 'zstd'), or None for plain files."""
+    return CODECS.get(os.path.splitext(path)[1].lower())
+
+def split_extension(path: str) -> tuple:
+    """Split a path into its base and its extension including any compression suffix, e.g. ('h', '.csv.gz')."""
+    base, extension = os.path.splitext(path)
+    if extension.lower() in CODECS:
+        base, inner = os.path.splitext(base)
+        extension = inner + extension
+    return base, extension
+
+def _zstandard():
+    """Import the optional zstandard module."""
+    # EAFP: zstd is the one codec the standard library lacks
+    try:
+        import zstandard  # pylint: disable=import-outside-toplevel
+    except ImportError as e:
+        raise ImportError("Reading or writing .zst history files needs the zstandard package.") from e
+    return zstandard
+
+def compress(data: bytes, codec: str) -> bytes:
+    """Compress data as one self-contained gzip member, xz stream or zstd frame, ready to append to a file."""
+    if codec == "gzip":
+        return gzip.compress(data, compresslevel=APPEND_LEVELS["gzip"], mtime=0)
+    if codec == "xz":
+        return lzma.compress(data, preset=APPEND_LEVELS["xz"])
+    return _zstandard().ZstdCompressor(level=APPEND_LEVELS["zstd"]).compress(data)
+
+class _Decompressed(io.RawIOBase):
+    """The decompressed bytes of every member from a binary file's position on; closing it closes the file.
+
+    A last member cut short, e.g. by a crash in the middle of an append, ends the data at its last complete
+    line instead of failing the read, so no half-written row is ever returned.
+    """
+    def __init__(self, file, codec: str):
+        super().__init__()
+        self._file = file
+        if codec == "gzip":
+            self._stream = gzip.GzipFile(fileobj=file, mode='rb')
+        elif codec == "xz":
+            self._stream = lzma.LZMAFile(file)
+        else:
+            self._stream = _zstandard().ZstdDecompressor().stream_reader(file, read_across_frames=True)
+        self._ready = b""  # Complete lines not yet handed out
+        self._partial = b""  # Text after the last line break, held back until the line is complete
+        self._done = False
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._ready and not self._done:
+            # EAFP: Only the end of the data shows whether its last member was complete
+            try:
+                # read1 returns what one step decompressed, so data before a cut-short member is never lost
+                data = self._stream.read1(len(buffer))
+            except EOFError:
+                logger.warning("Ignoring a cut-short block at the end of %s", getattr(self._file, "name", "data"))
+                self._done = True
+                break
+            if not data:
+                self._ready, self._partial, self._done = self._partial, b"", True
+                break
+            cut = data.rfind(b"\n") + 1
+            if cut:
+                self._ready, self._partial = self._partial + data[:cut], data[cut:]
+            else:
+                self._partial += data
+        size = min(len(buffer), len(self._ready))
+        buffer[:size] = self._ready[:size]
+        self._ready = self._ready[size:]
+        return size
+
+    def close(self) -> None:
+        if not self.closed:
+            self._stream.close()
+            self._file.close()
+        super().close()
+
+def decompressed_text(file, codec: str) -> io.TextIOWrapper:
+    """Wrap a binary file positioned at a member boundary as the text of its decompressed members."""
+    return io.TextIOWrapper(io.BufferedReader(_Decompressed(file, codec)), encoding='utf-8', newline='')
+
+def open_text(path: str, mode: str = 'r'):
+    """Open a plain or compressed CSV history file as text for reading ('r') or writing a new file ('w').
+
+    A compressed file is written as one stream at its codec's default level, and read a chunk at a time.
+    """
+    codec = compression(path)
+    if codec is None:
+        return open(path, mode, newline='', encoding='utf-8')  # pylint: disable=consider-using-with
+    if mode == 'r':
+        return decompressed_text(open(path, 'rb'), codec)  # pylint: disable=consider-using-with
+    if codec == "gzip":
+        return gzip.open(path, 'wt', newline='', encoding='utf-8')
+    if codec == "xz":
+        return lzma.open(path, 'wt', newline='', encoding='utf-8')
+    return _zstandard().open(path, 'wt', newline='', encoding='utf-8')
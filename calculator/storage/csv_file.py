@@ -0,0 +1,162 @@
+"""Write-behind CSV history file, plain or compressed, with a single reused file handle."""
+import csv
+import io
+import logging
+import os
+from calculator.storage.background import run_in_background
+from calculator.storage.base import BufferedHistoryFile
+from calculator.storage.compression import compress, compression
+from calculator.storage.locking import file_lock
+from calculator.storage.policy import FlushPolicy
+from calculator.storage.segments import (compact_segments, count_rows, read_journal, rewrite_rows, seal_active,
+                                         truncate_sealed)
+from calculator.storage.snapshot import schedule_snapshot, snapshot_path
+from calculator.store import HISTORY_COLUMNS
+
+logger = logging.getLogger('calculator_app')
+
+BLOCK_SIZE = 64 * 1024  # Bytes read per step when seeking backwards from the end of the file
+
+class CsvHistoryFile(BufferedHistoryFile):
+    """Append buffered history rows to a CSV file through one open handle.
+
+    A .csv.gz, .csv.xz or .csv.zst file gets each flush appended as one compressed member.
+    """
+    def __init__(self, path: str, policy: FlushPolicy = None):
+        super().__init__(path, policy)
+        self.codec = compression(path)
+        self._handle = None
+        self.journal_rows = 0  # Rows appended since this writer last asked for a snapshot
+        self._active = (-1, 0)  # Size and row count of the active file as of this writer's last write
+
+    def _open(self) -> None:
+        """Open the file for appending, reusing the handle while it still points at the file on disk."""
+        if self._handle is not None:
+            # LBYL: Another process may have deleted or renamed over the file since it was opened
+            try:
+                if os.stat(self.path).st_ino == os.fstat(self._handle.fileno()).st_ino:
+                    return
+            except FileNotFoundError:
+                pass
+            self.release()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if self.codec is not None:
+            self._handle = open(self.path, 'ab')  # pylint: disable=consider-using-with
+        else:
+            self._handle = open(self.path, 'a', newline='', encoding='utf-8')  # pylint: disable=consider-using-with
+
+    def write_rows(self, rows: list) -> None:
+        """Append rows through the open handle in one write, holding the file lock."""
+        # Rows are formatted up front so the locked section is a single append
+        text = io.StringIO()
+        csv.writer(text, lineterminator='\n').writerows(rows)
+        payload = text.getvalue()
+        if self.codec is not None:
+            # Compressed outside the lock as one complete member, so the file is valid after every append
+            payload = compress(payload.encode('utf-8'), self.codec)
+        with file_lock(self.path):
+            self._open()
+            # The header goes in whenever the file is empty, whichever writer gets there first
+            before = os.fstat(self._handle.fileno()).st_size
+            if before == 0:
+                header = ",".join(HISTORY_COLUMNS) + "\n"
+                self._handle.write(header if self.codec is None else compress(header.encode('utf-8'), self.codec))
+                logger.info("History saved to new file: %s", self.path)
+            self._handle.write(payload)
+            self._handle.flush()
+            if self.policy.fsync:
+                os.fsync(self._handle.fileno())
+            if self.policy.segments.enabled:
+                self._rotate_if_full(before, len(rows))
+        logger.info("%s entries appended to %s", len(rows), self.path)
+
+        self.journal_rows += len(rows)
+        if self.policy.should_snapshot(self.journal_rows):
+            schedule_snapshot(self.path)
+            self.journal_rows = 0
+
+    def _rotate_if_full(self, before: int, appended: int) -> None:
+        """Seal the active file once the segment policy says it is full; the caller holds the file lock."""
+        size = os.fstat(self._handle.fileno()).st_size
+        known_size, rows = self._active
+        # LBYL: Rows are only counted again when someone else changed the file since this writer's last write
+        rows = rows + appended if known_size == before else count_rows(self.path)
+        self._active = (size, rows)
+        if not self.policy.segments.should_rotate(rows, size):
+            return
+
+        self.release()
+        seal_active(self.path, self.policy.segments, rows)
+        self._active = (-1, 0)
+        self.journal_rows = 0
+        # The snapshot described the file that was just sealed
+        if os.path.isfile(snapshot_path(self.path)):
+            os.remove(snapshot_path(self.path))
+        if self.policy.segments.compact_rows:
+            run_in_background("compaction", self.path, compact_segments, self.path, self.policy.segments.compact_rows)
+
+    def truncate_rows(self, count: int) -> list:
+        """Cut the last count rows off the end of the file, never touching the header.
+
+        Rows beyond the active file come off its newest sealed segments.
+        """
+        with file_lock(self.path):
+            removed = self._truncate_rows(count)
+            if len(removed) < count:
+                removed = truncate_sealed(self.path, count - len(removed), self.policy.fsync) + removed
+            return removed
+
+    def _truncate_rows(self, count: int) -> list:
+        """Cut the rows off while the caller holds the file lock."""
+        if not os.path.isfile(self.path):
+            return []
+        self.release()  # The append handle is reopened at the new end on the next write
+        if self.codec is not None:
+            return self._truncate_compressed(count)
+
+        with open(self.path, 'r+b') as file:
+            position = file.seek(0, os.SEEK_END)
+            data = b""
+            # Read backwards until count line breaks precede the last line, or the whole file is read
+            while position > 0 and data.count(b"\n", 0, max(len(data) - 1, 0)) < count:
+                step = min(BLOCK_SIZE, position)
+                position -= step
+                file.seek(position)
+                data = file.read(step) + data
+
+            # The last line's own break does not start a row, so the search stops before it
+            cut = len(data) - 1 if data.endswith(b"\n") else len(data)
+            found = 0
+            while found < count:
+                index = data.rfind(b"\n", 0, cut)
+                if index == -1:
+                    break  # Only the header's break is left, which is where cut already is
+                cut, found = index, found + 1
+            if found == 0:
+                return []
+
+            removed = data[cut + 1:].decode('utf-8').splitlines()
+            file.truncate(position + cut + 1)
+            if self.policy.fsync:
+                os.fsync(file.fileno())
+
+        logger.info("Truncated %s entries from %s", len(removed), self.path)
+        return [tuple(row) for row in csv.reader(line for line in removed if line)]
+
+    def _truncate_compressed(self, count: int) -> list:
+        """Rewrite a compressed file without its last count rows; compressed members cannot be cut in place."""
+        rows = list(zip(*read_journal(self.path)[0].values()))
+        cut = max(len(rows) - count, 0)
+        if cut == len(rows):
+            return []
+        rewrite_rows(self.path, rows[:cut], self.policy.fsync)
+        logger.info("Truncated %s entries from %s", len(rows) - cut, self.path)
+        return rows[cut:]
+
+    def release(self) -> None:
+        """Close the append handle, it is reopened on the next write."""
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
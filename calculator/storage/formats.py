@@ -0,0 +1,140 @@
+"""History file formats, chosen by file extension."""
+from __future__ import annotations
+import csv
+import os
+from typing import TYPE_CHECKING
+from calculator.storage.compression import open_text
+from calculator.storage.locking import atomic_write, file_lock
+from calculator.storage.migration import migrate_legacy_csv
+from calculator.storage.parts import part_paths, remove_parts
+from calculator.storage.segments import segment_paths
+from calculator.storage.sqlite_file import SQLITE_EXTENSIONS, read_sqlite_columns, write_sqlite
+from calculator.store import HISTORY_COLUMNS
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Binary formats hold every column as exact strings, so values round-trip without float inference
+NPZ_EXTENSIONS = (".npz",)
+PANDAS_BINARY_EXTENSIONS = (".parquet", ".feather")  # Need pyarrow installed
+BINARY_EXTENSIONS = NPZ_EXTENSIONS + PANDAS_BINARY_EXTENSIONS
+
+def file_format(path: str) -> str:
+    """Return the format name for a history file path, e.g. 'csv', 'npz' or 'sqlite'; .csv.gz and the like are 'csv'."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension in BINARY_EXTENSIONS:
+        return extension[1:]
+    if extension in SQLITE_EXTENSIONS:
+        return "sqlite"
+    return "csv"
+
+def is_binary(path: str) -> bool:
+    """Tell whether a path uses one of the binary columnar formats, which are written whole, one part at a time."""
+    return os.path.splitext(path)[1].lower() in BINARY_EXTENSIONS
+
+def is_sqlite(path: str) -> bool:
+    """Tell whether a path is a SQLite history database."""
+    return file_format(path) == "sqlite"
+
+def read_history(path: str, columns: list = None) -> pd.DataFrame:
+    """Read a history file in any supported format, optionally loading only some columns."""
+    import pandas as pd  # pylint: disable=import-outside-toplevel
+    fmt = file_format(path)
+    columns = list(columns or HISTORY_COLUMNS)
+
+    if is_binary(path):
+        # The history file first, then the parts written by later flushes
+        with file_lock(path, shared=True):
+            frames = [read_binary_file(file, columns) for file in [path] + part_paths(path) if os.path.isfile(file)]
+        if not frames:
+            raise FileNotFoundError(path)
+        return frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+    if fmt == "sqlite":
+        return pd.DataFrame(read_sqlite_columns(path, columns), columns=columns, dtype=object)
+
+    migrate_legacy_csv(path)
+    # A shared lock keeps a writer's append from showing up half written
+    frames = []
+    with file_lock(path, shared=True):
+        for segment in segment_paths(path) + [path]:
+            # Compressed files go through the same chunked decompression as every other reader
+            with open_text(segment) as file:
+                # Operands and results stay exact decimal strings instead of being inferred as floats
+                frames.append(pd.read_csv(file, dtype=str, keep_default_na=False, usecols=columns)[columns])
+    return frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+
+def read_binary_file(path: str, columns: list = None) -> pd.DataFrame:
+    """Read one .npz, .parquet or .feather file, without the parts of the history it belongs to."""
+    import numpy as np  # pylint: disable=import-outside-toplevel
+    import pandas as pd  # pylint: disable=import-outside-toplevel
+    fmt = file_format(path)
+    columns = list(columns or HISTORY_COLUMNS)
+    if fmt == "npz":
+        # NpzFile loads each array on access, so unused columns are never read
+        with np.load(path, allow_pickle=False) as archive:
+            return pd.DataFrame({column: np.asarray(archive[column]).astype(object) for column in columns})
+    if fmt == "parquet":
+        return pd.read_parquet(path, columns=columns)
+    return pd.read_feather(path, columns=columns)
+
+def read_columns(path: str) -> dict:
+    """Read a history file into one list per column; CSV and SQLite files are read without pandas."""
+    if is_sqlite(path):
+        return read_sqlite_columns(path)
+    if is_binary(path):
+        frame = read_history(path)
+        return {column: frame[column].tolist() for column in HISTORY_COLUMNS}
+
+    migrate_legacy_csv(path)
+    columns = {column: [] for column in HISTORY_COLUMNS}
+    appenders = [columns[column].append for column in HISTORY_COLUMNS]
+    with file_lock(path, shared=True):
+        # Sealed segments first, oldest to newest, then the active file
+        for segment in segment_paths(path) + [path]:
+            with open_text(segment) as file:
+                reader = csv.reader(file)
+                next(reader, None)  # Header
+                for row in reader:
+                    if len(row) == len(appenders):
+                        for append, value in zip(appenders, row):
+                            append(value)
+    return columns
+
+def write_history(path: str, frame: pd.DataFrame, fsync: bool = False) -> None:
+    """Replace a history file with a DataFrame, in the format given by the path's extension.
+
+    The frame is written to a temporary file that is renamed over path while the file lock is held.
+    The parts of a binary history are part of what is replaced, so they are deleted.
+    """
+    with file_lock(path):
+        replace_file(path, frame, fsync)
+        if is_binary(path):
+            remove_parts(path)
+
+def replace_file(path: str, frame: pd.DataFrame, fsync: bool = False) -> None:
+    """Write a DataFrame over one file through a temporary file; the caller holds the history file's lock."""
+    with atomic_write(path, fsync=fsync) as temp_path:
+        _write_frame(temp_path, file_format(path), frame[list(HISTORY_COLUMNS)])
+
+def _write_frame(path: str, fmt: str, frame: pd.DataFrame) -> None:
+    """Write a history DataFrame to path in the given format."""
+    import numpy as np  # pylint: disable=import-outside-toplevel
+    import pandas as pd  # pylint: disable=import-outside-toplevel
+    if fmt == "csv":
+        # The temporary path keeps any compression suffix, so a .csv.gz history is written as one gzip stream
+        with open_text(path, 'w') as file:
+            frame.to_csv(file, index=False)
+        return
+    if fmt == "sqlite":
+        write_sqlite(path, list(frame.itertuples(index=False, name=None)))
+        return
+
+    as_strings = pd.DataFrame({column: frame[column].astype(str) for column in HISTORY_COLUMNS})
+    if fmt == "npz":
+        # Write through a handle so numpy does not append its own .npz suffix to the name
+        with open(path, 'wb') as file:
+            np.savez(file, **{column: as_strings[column].to_numpy(dtype=str) for column in HISTORY_COLUMNS})
+    elif fmt == "parquet":
+        as_strings.to_parquet(path, index=False)
+    else:
+        as_strings.to_feather(path)
@@ -0,0 +1,103 @@
+"""Locks and atomic rewrites that keep a history file consistent across threads and processes."""
+import contextlib
+import logging
+import os
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows has no fcntl, only the in-process lock applies there
+    fcntl = None
+
+logger = logging.getLogger('calculator_app')
+
+SIDECAR_DIRECTORY = ".calculator"  # Hidden folder next to the history files holding their locks and sidecar files
+
+_path_locks = {}  # Absolute path -> _PathLock shared by every thread of this process
+_path_locks_guard = threading.Lock()
+
+class _PathLock:
+    """Thread lock for one path, counting how deeply its owner holds it so the fcntl lock is taken once."""
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.depth = 0  # Only changed while lock is held
+
+def sidecar_path(path: str, suffix: str) -> str:
+    """Return a sidecar file of path in the sidecar folder, e.g. data/.calculator/history.csv.lock for 'lock'."""
+    directory, name = os.path.split(os.path.abspath(path))
+    return os.path.join(directory, SIDECAR_DIRECTORY, f"{name}.{suffix}")
+
+def lock_path(path: str) -> str:
+    """Return the sidecar file locked for path, e.g. data/.calculator/history.csv.lock."""
+    return sidecar_path(path, "lock")
+
+def _open_lock_file(path: str):
+    """Open the lock file of path, creating the sidecar folder the first time."""
+    lock_file_path = lock_path(path)
+    # EAFP: The sidecar folder exists after the first lock, it is only created when the open fails
+    try:
+        return open(lock_file_path, 'a', encoding='utf-8')  # pylint: disable=consider-using-with
+    except FileNotFoundError:
+        os.makedirs(os.path.dirname(lock_file_path), exist_ok=True)
+        return open(lock_file_path, 'a', encoding='utf-8')  # pylint: disable=consider-using-with
+
+def _thread_lock(path: str) -> _PathLock:
+    """Return the in-process lock for a path, creating it on first use."""
+    key = os.path.abspath(path)
+    with _path_locks_guard:
+        lock = _path_locks.get(key)
+        if lock is None:
+            lock = _path_locks[key] = _PathLock()
+        return lock
+
+@contextlib.contextmanager
+def file_lock(path: str, shared: bool = False):
+    """Hold the lock for a history file: a thread lock within the process and an fcntl lock across processes.
+
+    The fcntl lock is taken on a sidecar file rather than the history file itself, so it stays valid
+    while the history file is replaced by a rename or deleted. shared=True allows concurrent readers.
+    """
+    path_lock = _thread_lock(path)
+    with path_lock.lock:
+        path_lock.depth += 1
+        try:
+            # LBYL: A nested call already holds the fcntl lock, and without fcntl (or a directory to put
+            # the lock file in) only the thread lock applies
+            if path_lock.depth > 1 or fcntl is None or not os.path.isdir(os.path.dirname(os.path.abspath(path))):
+                yield
+                return
+            with _open_lock_file(path) as lock_file:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+        finally:
+            path_lock.depth -= 1
+
+@contextlib.contextmanager
+def atomic_write(path: str, fsync: bool = False):
+    """Yield a temporary path next to path and rename it over path once the block succeeds.
+
+    Readers see either the old file or the complete new one, never a partially written file.
+    """
+    directory, name = os.path.split(os.path.abspath(path))
+    base, extension = os.path.splitext(name)
+    os.makedirs(directory, exist_ok=True)  # e.g. the sidecar folder, on a history's first summary or snapshot
+    # The temporary file keeps the extension, since the format of a history file follows its extension
+    handle, temp_path = tempfile.mkstemp(prefix=f".{base}.", suffix=f".tmp{extension}", dir=directory)
+    os.close(handle)
+    try:
+        # mkstemp creates the file private to the owner, keep the permissions of the file being replaced
+        os.chmod(temp_path, os.stat(path).st_mode & 0o777 if os.path.exists(path) else 0o644)
+        yield temp_path
+        if fsync:
+            with open(temp_path, 'rb') as file:
+                os.fsync(file.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        # EAFP: Whatever went wrong, the original file is untouched and the partial copy is removed
+        with contextlib.suppress(OSError):
+            os.remove(temp_path)
+        raise
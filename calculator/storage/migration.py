@@ -0,0 +1,78 @@
+"""One-shot migrations of history files written with the old operand format and of their old sidecar files."""
+import contextlib
+import csv
+import logging
+import os
+from calculator.operands import is_legacy_operands, parse_legacy_operands
+from calculator.storage.compression import open_text
+from calculator.storage.locking import atomic_write, file_lock, sidecar_path
+from calculator.store import HISTORY_COLUMNS
+
+logger = logging.getLogger('calculator_app')
+
+# Sidecar files once kept as dotfiles beside the history file, e.g. data/.history.csv.stats.json
+LEGACY_SIDECARS = ("lock", "stats.json", "snapshot.json", "segments.json")
+
+def _normalize_row(row: list) -> list:
+    """Rebuild operation, operands, result from a row, rejoining operands split on their commas."""
+    if len(row) > len(HISTORY_COLUMNS):
+        row = [row[0], ",".join(row[1:-1]), row[-1]]
+    return row
+
+def needs_migration(path: str) -> bool:
+    """Check the first record of a CSV history file for the old operand format."""
+    try:
+        with open_text(path) as file:
+            reader = csv.reader(file)
+            next(reader, None)  # Header
+            first = next(reader, None)
+    except OSError: #COV-NA
+        return False
+    return first is not None and len(first) >= 3 and is_legacy_operands(_normalize_row(first)[1])
+
+def migrate_legacy_csv(path: str) -> bool:
+    """Rewrite a legacy CSV history file in the encoded operand format, streaming row by row."""
+    # LBYL: Only files that still use the old format are rewritten
+    if not needs_migration(path):
+        return False
+
+    with file_lock(path):
+        # Another process may have migrated the file while this one waited for the lock
+        if not needs_migration(path):
+            return False
+        # The old file stays intact until the new one is complete
+        with atomic_write(path) as temp_path, \
+                open_text(path) as source, open_text(temp_path, 'w') as target:
+            reader = csv.reader(source)
+            writer = csv.writer(target, lineterminator='\n')
+            next(reader, None)
+            writer.writerow(HISTORY_COLUMNS)
+            for row in reader:
+                if not row:
+                    continue
+                operation, operands, result = _normalize_row(row)
+                if is_legacy_operands(operands):
+                    operands = parse_legacy_operands(operands)
+                writer.writerow((operation, operands, result))
+    logger.info("Migrated %s to the encoded operand format", path)
+    return True
+
+def migrate_sidecars(path: str) -> bool:
+    """Move sidecar dotfiles left beside a history file into its sidecar folder; old lock files are removed."""
+    directory, name = os.path.split(os.path.abspath(path))
+    legacy = [(os.path.join(directory, f".{name}.{suffix}"), suffix) for suffix in LEGACY_SIDECARS]
+    # LBYL: Almost every history has none, so the lock is only taken when there is something to move
+    legacy = [(old_path, suffix) for old_path, suffix in legacy if os.path.isfile(old_path)]
+    if not legacy:
+        return False
+
+    with file_lock(path):
+        for old_path, suffix in legacy:
+            # EAFP: Another process may have moved the file while this one waited for the lock
+            with contextlib.suppress(FileNotFoundError):
+                if suffix == "lock":
+                    os.remove(old_path)
+                else:
+                    os.replace(old_path, sidecar_path(path, suffix))
+    logger.info("Moved the sidecar files of %s into %s", path, os.path.dirname(sidecar_path(path, "lock")))
+    return True
@@ -0,0 +1,43 @@
+"""Part files of a binary history: each flush adds its entries as a new file instead of rewriting the history.
+
+data/history.npz holds the oldest entries, history.part000001.npz, history.part000002.npz, ... the newer ones
+in order. After a flush the newest two files are merged while the older one is no larger than the newer, so
+a history of n entries is spread over about log2(n) files and each entry is rewritten about log2(n) times in
+all, instead of the whole file being rewritten on every flush. Parts are only changed holding the history
+file's lock, and 'history compact' merges them all back into the history file.
+"""
+import os
+import re
+from calculator.storage.compression import split_extension
+
+def part_path(history_path: str, number: int) -> str:
+    """Return the path of a part file, e.g. data/history.part000003.npz."""
+    base, extension = split_extension(history_path)
+    return f"{base}.part{number:06d}{extension}"
+
+def _numbered_parts(history_path: str) -> list:
+    """Return (number, path) for every part file of a history file, oldest first."""
+    directory, name = os.path.split(os.path.abspath(history_path))
+    base, extension = split_extension(name)
+    pattern = re.compile(re.escape(base) + r"\.part(\d{6})" + re.escape(extension))
+    # EAFP: A history in a directory that does not exist yet has no parts
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    return sorted((int(match.group(1)), os.path.join(directory, match.group(0)))
+                  for match in map(pattern.fullmatch, names) if match)
+
+def part_paths(history_path: str) -> list:
+    """Return the part files of a history file, oldest first; the history file itself is not included."""
+    return [path for _, path in _numbered_parts(history_path)]
+
+def next_part_path(history_path: str) -> str:
+    """Return the path for a new part, numbered after the newest one."""
+    parts = _numbered_parts(history_path)
+    return part_path(history_path, parts[-1][0] + 1 if parts else 1)
+
+def remove_parts(history_path: str) -> None:
+    """Delete every part file of a history file; the caller holds the file lock."""
+    for path in part_paths(history_path):
+        os.remove(path)
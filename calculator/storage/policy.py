@@ -0,0 +1,87 @@
+"""Policies deciding when buffered history entries are written to disk and how CSV histories are segmented."""
+import os
+
+class SegmentPolicy:
+    """When the active CSV segment is sealed, how long sealed segments are kept and how far they are merged.
+
+    The active file is sealed once it holds max_rows entries or max_bytes bytes (0 leaves that limit off,
+    both 0 never seals it). Only the newest keep sealed segments are kept, and none sealed more than
+    max_age_days ago (0 keeps them all). After each seal, adjacent sealed segments are merged into
+    segments of up to compact_rows entries in the background (0 only merges on request).
+    """
+    def __init__(self, max_rows: int = 0, max_bytes: int = 0, keep: int = 0, max_age_days: float = 0,
+                 compact_rows: int = 0):
+        # LBYL: Negative limits have no sensible meaning
+        if min(max_rows, max_bytes, keep, max_age_days, compact_rows) < 0:
+            raise ValueError("Segment limits cannot be negative.")
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.keep = keep
+        self.max_age_days = max_age_days
+        self.compact_rows = compact_rows
+
+    @classmethod
+    def from_env(cls) -> "SegmentPolicy":
+        """Build a policy from CALC_SEGMENT_ROWS, _BYTES, _KEEP, _MAX_AGE_DAYS and _COMPACT_ROWS."""
+        return cls(
+            max_rows=int(os.getenv('CALC_SEGMENT_ROWS', '0')),
+            max_bytes=int(os.getenv('CALC_SEGMENT_BYTES', '0')),
+            keep=int(os.getenv('CALC_SEGMENT_KEEP', '0')),
+            max_age_days=float(os.getenv('CALC_SEGMENT_MAX_AGE_DAYS', '0')),
+            compact_rows=int(os.getenv('CALC_SEGMENT_COMPACT_ROWS', '0')),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        """Tell whether the active file is ever sealed."""
+        return self.max_rows > 0 or self.max_bytes > 0
+
+    def should_rotate(self, rows: int, size: int) -> bool:
+        """Tell whether an active file with rows entries and size bytes is due to be sealed."""
+        return 0 < self.max_rows <= rows or 0 < self.max_bytes <= size
+
+    def expired(self, sealed_at: float, now: float) -> bool:
+        """Tell whether a segment sealed at sealed_at is past the retention age."""
+        return self.max_age_days > 0 and now - sealed_at > self.max_age_days * 86400
+
+class FlushPolicy:
+    """Flush after a number of entries, after a delay, or both, optionally forcing an fsync.
+
+    snapshot_every is how many entries a CSV history's journal may grow past its snapshot before
+    the snapshot is rewritten in the background (0 never writes one). segments says when a CSV
+    history is split into segments, by default it never is. Binary histories (.npz, .parquet, .feather)
+    write a whole part file on every flush, so they buffer at least 100 entries whatever max_entries says.
+    """
+    def __init__(self, max_entries: int = 1, max_delay_ms: int = 0, fsync: bool = False,
+                 snapshot_every: int = 10000, segments: SegmentPolicy = None):
+        # LBYL: A policy that never flushes would lose every entry on a crash
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1.")
+        if snapshot_every < 0:
+            raise ValueError("snapshot_every cannot be negative.")
+        self.max_entries = max_entries
+        self.max_delay_ms = max_delay_ms
+        self.fsync = fsync
+        self.snapshot_every = snapshot_every
+        self.segments = segments or SegmentPolicy()
+
+    @classmethod
+    def from_env(cls) -> "FlushPolicy":
+        """Build a policy from the CALC_FLUSH_*, CALC_FSYNC, CALC_SNAPSHOT_EVERY and CALC_SEGMENT_* variables."""
+        return cls(
+            max_entries=int(os.getenv('CALC_FLUSH_EVERY', '1')),
+            max_delay_ms=int(os.getenv('CALC_FLUSH_INTERVAL_MS', '0')),
+            fsync=os.getenv('CALC_FSYNC', '0').lower() in ('1', 'true', 'yes'),
+            snapshot_every=int(os.getenv('CALC_SNAPSHOT_EVERY', '10000')),
+            segments=SegmentPolicy.from_env(),
+        )
+
+    def should_flush(self, pending: int, elapsed_ms: float) -> bool:
+        """Tell whether the buffer has to be written now."""
+        if pending >= self.max_entries:
+            return True
+        return self.max_delay_ms > 0 and elapsed_ms >= self.max_delay_ms
+
+    def should_snapshot(self, journal_rows: int) -> bool:
+        """Tell whether a journal this long is due for a new snapshot."""
+        return 0 < self.snapshot_every <= journal_rows
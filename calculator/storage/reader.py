@@ -0,0 +1,125 @@
+"""Constant-memory readers for paging through history files."""
+import collections
+import csv
+import itertools
+import os
+from decimal import Decimal
+from calculator.numeric import to_decimal
+from calculator.storage.compression import compression, open_text
+from calculator.storage.formats import is_binary, is_sqlite, read_history
+from calculator.storage.locking import file_lock
+from calculator.storage.migration import migrate_legacy_csv
+from calculator.storage.segments import segment_paths
+from calculator.storage.sqlite_file import query_sqlite, sqlite_rows, sqlite_tail
+
+BLOCK_SIZE = 64 * 1024  # Bytes read per step when seeking backwards from the end of a file
+
+def iter_rows(path: str):
+    """Yield (operation, operands, result) rows one at a time."""
+    if is_sqlite(path):
+        yield from sqlite_rows(path)
+        return
+    if is_binary(path):
+        # Columnar files are loaded as a whole, there is no row order on disk to stream
+        yield from read_history(path).itertuples(index=False, name=None)
+        return
+
+    migrate_legacy_csv(path)
+    # Every segment is opened at once under the lock, so a seal or compaction cannot move rows mid-read
+    with file_lock(path, shared=True):
+        files = [open_text(segment)  # pylint: disable=consider-using-with
+                 for segment in segment_paths(path) + [path] if os.path.isfile(segment)]
+    try:
+        for file in files:
+            reader = csv.reader(file)
+            next(reader, None)  # Header
+            for row in reader:
+                if row:
+                    yield tuple(row)
+    finally:
+        for file in files:
+            file.close()
+
+def head_rows(path: str, count: int) -> list:
+    """Return the first count rows."""
+    if is_sqlite(path):
+        return sqlite_rows(path, 0, count)
+    return list(itertools.islice(iter_rows(path), count))
+
+def page_rows(path: str, page: int, page_size: int) -> list:
+    """Return the rows on a 1-based page."""
+    start = (page - 1) * page_size
+    if is_sqlite(path):
+        return sqlite_rows(path, start, page_size)
+    return list(itertools.islice(iter_rows(path), start, start + page_size))
+
+def tail_rows(path: str, count: int) -> list:
+    """Return the last count rows, reading backwards from the end of the file."""
+    if count <= 0:
+        return []
+    if is_sqlite(path):
+        return sqlite_tail(path, count)
+    if is_binary(path):
+        return list(read_history(path).tail(count).itertuples(index=False, name=None))
+
+    migrate_legacy_csv(path)
+    # The end of the file is where writers append, so it is read under a shared lock
+    with file_lock(path, shared=True):
+        rows = _tail_file(path, count) if os.path.isfile(path) else []
+        # Only when the active file is shorter than count are the newest sealed segments read as well
+        for segment in reversed(segment_paths(path) if len(rows) < count else []):
+            rows = _tail_file(segment, count - len(rows)) + rows
+            if len(rows) >= count:
+                break
+    return rows
+
+def _tail_file(path: str, count: int) -> list:
+    """Return the last count rows of one CSV file, reading backwards from its end.
+
+    A compressed file can only be decompressed forwards, so it is streamed keeping just the last count rows.
+    """
+    if compression(path) is not None:
+        with open_text(path) as file:
+            reader = csv.reader(file)
+            next(reader, None)  # Header
+            return list(collections.deque((tuple(row) for row in reader if row), maxlen=count))
+    with open(path, 'rb') as file:
+        position = file.seek(0, os.SEEK_END)
+        data = b""
+        # count complete lines need count + 1 newlines, the extra one ends the line before them
+        while position > 0 and data.count(b"\n") <= count:
+            step = min(BLOCK_SIZE, position)
+            position -= step
+            file.seek(position)
+            data = file.read(step) + data
+
+    lines = data.splitlines()
+    if position == 0:
+        lines = lines[1:]  # The whole file was read, so the first line is the header
+    lines = [line.decode('utf-8') for line in lines if line][-count:]
+    return [tuple(row) for row in csv.reader(lines)]
+
+def query_rows(path: str, operation: str = None, min_result=None, max_result=None, since: float = None,
+               until: float = None, last: int = None) -> list:
+    """Return the rows matching every given filter, oldest first; last keeps only the newest matches.
+
+    SQLite files run the filter as an indexed query, other formats are streamed row by row.
+    """
+    if is_sqlite(path):
+        return query_sqlite(path, operation, min_result, max_result, since, until, last)
+    # LBYL: Only SQLite history files record when each entry was made
+    if since is not None or until is not None:
+        raise ValueError("Time filters need a SQLite history file (.db or .sqlite).")
+
+    min_result = Decimal(min_result) if min_result is not None else None
+    max_result = Decimal(max_result) if max_result is not None else None
+    matches = collections.deque(maxlen=last)  # Keeps only the newest matches when last is given
+    for row in iter_rows(path):
+        if operation is not None and row[0] != operation:
+            continue
+        if min_result is not None or max_result is not None:
+            result = to_decimal(row[2])
+            if result is None or (min_result is not None and result < min_result) or (max_result is not None and result > max_result):
+                continue
+        matches.append(row)
+    return list(matches)
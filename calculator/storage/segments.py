@@ -0,0 +1,260 @@
+"""Segmented CSV histories: the active file is sealed into numbered segments listed in a small manifest.
+
+data/history.csv is always the active segment, the only one appended to or truncated on the hot path.
+Once it reaches the segment policy's size it is renamed to the next sealed segment (history.000001.csv,
+history.000002.csv, ...) and a new active file is started; a compressed history.csv.gz seals as
+history.000001.csv.gz and so on. The manifest, data/.calculator/history.csv.segments.json,
+lists the sealed segments oldest first with their row counts, sizes and when they were sealed.
+Sealed segments are only ever replaced whole or deleted, and every change to them and the manifest is
+made holding the history file's lock. Compressed segments rewritten as one stream instead of many
+appended members are marked packed, compaction repacks the others.
+"""
+import csv
+import io
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from calculator.storage.compression import compression, decompressed_text, open_text, split_extension
+from calculator.storage.locking import atomic_write, file_lock, sidecar_path
+from calculator.storage.policy import SegmentPolicy
+from calculator.store import HISTORY_COLUMNS
+
+logger = logging.getLogger('calculator_app')
+
+MANIFEST_VERSION = 1
+HEADER = ",".join(HISTORY_COLUMNS) + "\n"
+
+def manifest_path(history_path: str) -> str:
+    """Return the manifest of a history file's sealed segments, e.g. data/.calculator/history.csv.segments.json."""
+    return sidecar_path(history_path, "segments.json")
+
+def segment_path(history_path: str, number: int) -> str:
+    """Return the path of a sealed segment, e.g. data/history.000003.csv or data/history.000003.csv.gz."""
+    base, extension = split_extension(history_path)
+    return f"{base}.{number:06d}{extension}"
+
+def read_manifest(history_path: str) -> dict:
+    """Read the manifest, or an empty one if the history has never been sealed."""
+    # EAFP: Most histories have no manifest at all
+    try:
+        with open(manifest_path(history_path), 'r', encoding='utf-8') as file:
+            manifest = json.load(file)
+    except FileNotFoundError:
+        manifest = None
+    except (OSError, ValueError) as e:
+        logger.warning("Ignoring unreadable segment manifest of %s: %s", history_path, e)
+        manifest = None
+    if manifest is None or manifest.get("version") != MANIFEST_VERSION:
+        return {"version": MANIFEST_VERSION, "next": 1, "expired": 0, "segments": []}
+    return manifest
+
+def write_manifest(history_path: str, manifest: dict) -> None:
+    """Replace the manifest atomically; the caller holds the history file's lock."""
+    with atomic_write(manifest_path(history_path)) as temp_path, open(temp_path, 'w', encoding='utf-8') as file:
+        json.dump(manifest, file, indent=1)
+
+def sealed_segments(history_path: str, manifest: dict = None) -> list:
+    """Return (path, entry) for every sealed segment on disk, oldest first."""
+    manifest = manifest or read_manifest(history_path)
+    directory = os.path.dirname(os.path.abspath(history_path))
+    # LBYL: A segment listed but missing (a seal interrupted before its rename) holds no entries
+    return [(path, entry) for path, entry in
+            ((os.path.join(directory, entry["file"]), entry) for entry in manifest["segments"])
+            if os.path.isfile(path)]
+
+def segment_paths(history_path: str) -> list:
+    """Return the sealed segments of a history file, oldest first; the active file is not included."""
+    return [path for path, _ in sealed_segments(history_path)]
+
+def read_journal(path: str, start: int = 0, end: int = None) -> tuple:
+    """Parse a CSV file's rows from byte start (a row boundary, 0 for the top) to end or the end of the file.
+
+    In a compressed file start and end are member boundaries; the bytes between them are decompressed a
+    chunk at a time. Returns the rows as one list per column and the offset reading stopped at.
+    """
+    columns = {column: [] for column in HISTORY_COLUMNS}
+    appenders = [columns[column].append for column in HISTORY_COLUMNS]
+    with open(path, 'rb') as file:
+        end = os.fstat(file.fileno()).st_size if end is None else end
+        file.seek(start)
+        data = file.read(end - start)
+    codec = compression(path)
+    if codec is None:
+        lines = io.StringIO(data.decode('utf-8'), newline='')
+    else:
+        lines = decompressed_text(io.BytesIO(data), codec)
+    if start == 0:
+        lines.readline()  # Header
+    for row in csv.reader(lines):
+        if len(row) == len(appenders):
+            for append, value in zip(appenders, row):
+                append(value)
+    return columns, start + len(data)
+
+def count_rows(path: str) -> int:
+    """Count the entries of a CSV history file without parsing them."""
+    if compression(path) is not None:
+        with open_text(path) as file:
+            return max(sum(1 for _ in file) - 1, 0)
+    with open(path, 'rb') as file:
+        return max(file.read().count(b"\n") - 1, 0)
+
+def seal_active(history_path: str, policy: SegmentPolicy, rows: int) -> str:
+    """Seal the active file as the next segment, start an empty one and apply retention.
+
+    The caller holds the file lock and has closed its handle on the active file. Returns the segment's path.
+    """
+    manifest = read_manifest(history_path)
+    number = manifest["next"]
+    target = segment_path(history_path, number)
+    manifest["next"] = number + 1
+    manifest["segments"].append({"file": os.path.basename(target), "rows": rows,
+                                 "bytes": os.path.getsize(history_path), "sealed": time.time()})
+    # The manifest goes first: a crash before the rename leaves the entries in the active file, not lost
+    write_manifest(history_path, manifest)
+    os.replace(history_path, target)
+    with open_text(history_path, 'w') as file:
+        file.write(HEADER)
+
+    if _expire(history_path, manifest, policy):
+        write_manifest(history_path, manifest)
+    logger.info("Sealed %s entries of %s as %s", rows, history_path, target)
+    return target
+
+def _expire(history_path: str, manifest: dict, policy: SegmentPolicy) -> int:
+    """Delete the oldest sealed segments beyond the retention count or age; return how many were deleted."""
+    segments = manifest["segments"]
+    now = time.time()
+    expired = 0
+    while segments and ((policy.keep and len(segments) > policy.keep) or policy.expired(segments[0]["sealed"], now)):
+        entry = segments.pop(0)
+        path = os.path.join(os.path.dirname(os.path.abspath(history_path)), entry["file"])
+        if os.path.isfile(path):
+            os.remove(path)
+        manifest["expired"] += entry["rows"]
+        expired += 1
+        logger.info("Retention deleted %s with %s entries", path, entry["rows"])
+    return expired
+
+def truncate_sealed(history_path: str, count: int, fsync: bool = False) -> list:
+    """Remove the last count entries of the sealed segments, newest first, and return them oldest first.
+
+    The caller holds the file lock. A segment is rewritten whole without its last entries, or deleted
+    once none are left.
+    """
+    manifest = read_manifest(history_path)
+    removed = []
+    while count > 0 and manifest["segments"]:
+        entry = manifest["segments"][-1]
+        path = os.path.join(os.path.dirname(os.path.abspath(history_path)), entry["file"])
+        rows = list(zip(*read_journal(path)[0].values())) if os.path.isfile(path) else []
+        cut = max(len(rows) - count, 0)
+        removed = rows[cut:] + removed
+        count -= len(rows) - cut
+        if cut == 0:
+            manifest["segments"].pop()
+            if os.path.isfile(path):
+                os.remove(path)
+        else:
+            rewrite_rows(path, rows[:cut], fsync)
+            entry["rows"], entry["bytes"] = cut, os.path.getsize(path)
+            if compression(path) is not None:
+                entry["packed"] = True
+    if removed:
+        write_manifest(history_path, manifest)
+        logger.info("Truncated %s entries from the sealed segments of %s", len(removed), history_path)
+    return removed
+
+def rewrite_rows(path: str, rows: list, fsync: bool = False) -> None:
+    """Replace a CSV file with a header and rows, compressed as one stream if its extension asks for it."""
+    # The temporary file keeps the compression suffix, so open_text picks the same codec
+    with atomic_write(path, fsync=fsync) as temp_path, open_text(temp_path, 'w') as file:
+        file.write(HEADER)
+        csv.writer(file, lineterminator='\n').writerows(rows)
+
+def repack_active(history_path: str, fsync: bool = False) -> bool:
+    """Rewrite a compressed active file as one stream instead of one member per flush; return whether it was.
+
+    The caller holds the file lock. Plain files are left alone, they have nothing to repack.
+    """
+    # LBYL: Only an existing compressed file is made of appended members
+    if compression(history_path) is None or not os.path.isfile(history_path):
+        return False
+    rewrite_rows(history_path, list(zip(*read_journal(history_path)[0].values())), fsync)
+    logger.info("Repacked %s as one compressed stream", history_path)
+    return True
+
+def remove_segments(history_path: str) -> None:
+    """Delete every sealed segment and the manifest; the caller holds the file lock."""
+    for path in segment_paths(history_path):
+        os.remove(path)
+    if os.path.isfile(manifest_path(history_path)):
+        os.remove(manifest_path(history_path))
+
+def _plan(segments: list, max_rows: int, repack: bool = False) -> list:
+    """Group adjacent segments into runs of at most max_rows entries (0 for no limit), keeping runs of two or more.
+
+    With repack, a single segment that is not yet packed is kept as a run of its own.
+    """
+    runs, run, total = [], [], 0
+    for entry in segments:
+        if run and max_rows and total + entry["rows"] > max_rows:
+            runs.append(run)
+            run, total = [], 0
+        run.append(entry)
+        total += entry["rows"]
+    runs.append(run)
+    return [run for run in runs if len(run) > 1 or (repack and run and not run[0].get("packed"))]
+
+def compact_segments(history_path: str, max_rows: int = 0) -> int:
+    """Merge adjacent sealed segments into segments of up to max_rows entries (0 merges them all).
+
+    Each merged segment is written beside the others without holding the lock, then swapped in under the
+    lock only if its sources are still unchanged. Compressed segments are decompressed and written again as
+    one stream, which also repacks a single segment made of many small appended members. Returns how many
+    segments were merged away.
+    """
+    codec = compression(history_path)
+    with file_lock(history_path, shared=True):
+        runs = _plan(read_manifest(history_path)["segments"], max_rows, repack=codec is not None)
+    directory = os.path.dirname(os.path.abspath(history_path))
+    merged = 0
+    for run in runs:
+        paths = [os.path.join(directory, entry["file"]) for entry in run]
+        # The temporary file keeps the compression suffix, so open_text picks the same codec
+        suffix = ".tmp" + (os.path.splitext(paths[0])[1] if codec else "")
+        handle, temp_path = tempfile.mkstemp(prefix=f".{run[0]['file']}.", suffix=suffix, dir=directory)
+        try:
+            os.chmod(temp_path, os.stat(paths[0]).st_mode & 0o777)  # mkstemp makes it private to the owner
+            os.close(handle)
+            with open_text(temp_path, 'w') if codec else open(temp_path, 'wb') as target:
+                for index, path in enumerate(paths):
+                    with open_text(path) if codec else open(path, 'rb') as source:
+                        if index > 0:
+                            source.readline()  # Only the first segment's header is kept
+                        shutil.copyfileobj(source, target)
+            with file_lock(history_path):
+                manifest = read_manifest(history_path)
+                start = next((index for index, entry in enumerate(manifest["segments"]) if entry == run[0]), None)
+                # LBYL: A seal, truncation or retention may have changed the run while it was copied
+                if start is None or manifest["segments"][start:start + len(run)] != run:
+                    logger.info("Skipped compacting %s, its segments changed", paths[0])
+                    continue
+                os.replace(temp_path, paths[0])
+                for path in paths[1:]:
+                    os.remove(path)
+                compacted = {"file": run[0]["file"], "rows": sum(entry["rows"] for entry in run),
+                             "bytes": os.path.getsize(paths[0]), "sealed": run[-1]["sealed"]}
+                if codec:
+                    compacted["packed"] = True
+                manifest["segments"][start:start + len(run)] = [compacted]
+                write_manifest(history_path, manifest)
+            merged += len(run) - 1
+            logger.info("Compacted %s segments into %s", len(run), paths[0])
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+    return merged
@@ -0,0 +1,165 @@
+"""Snapshots of CSV history files, so opening a long history replays only the entries appended since.
+
+The CSV file stays the append-only journal every writer and reader uses. Its snapshot is a sidecar
+(.calculator/history.csv.snapshot.json) holding the entries up to a byte offset of the journal: a one-line header
+with the offset, the row count and a fingerprint of the journal at that offset, then every column as JSON.
+Opening a history reads the header, checks the fingerprint and parses only the journal past the offset;
+the snapshot body is read the first time the older entries are actually needed.
+"""
+import functools
+import json
+import logging
+import os
+import zlib
+from calculator.metrics import timed
+from calculator.storage.background import run_in_background
+from calculator.storage.formats import file_format, read_columns
+from calculator.storage.locking import atomic_write, file_lock, sidecar_path
+from calculator.storage.migration import migrate_legacy_csv
+from calculator.storage.policy import FlushPolicy
+from calculator.storage.segments import read_journal, read_manifest, sealed_segments
+from calculator.store import HISTORY_COLUMNS, HistoryStore
+
+logger = logging.getLogger('calculator_app')
+
+SNAPSHOT_VERSION = 1
+CHECK_BYTES = 4096  # Bytes before the offset whose checksum tells a truncated or rewritten journal apart
+
+def snapshot_path(history_path: str) -> str:
+    """Return the snapshot file for a history file, e.g. data/.calculator/history.csv.snapshot.json."""
+    return sidecar_path(history_path, "snapshot.json")
+
+def _fingerprint(path: str, offset: int) -> dict:
+    """Identify the journal's first offset bytes by its inode and a checksum of the bytes just before offset."""
+    with open(path, 'rb') as file:
+        file.seek(max(offset - CHECK_BYTES, 0))
+        checksum = zlib.crc32(file.read(min(offset, CHECK_BYTES)))
+        return {"inode": os.fstat(file.fileno()).st_ino, "checksum": checksum}
+
+def _matches(path: str, header: dict) -> bool:
+    """Tell whether the journal still starts with the entries the snapshot holds."""
+    # LBYL: A journal shorter than the offset was truncated, one that was replaced has another inode
+    if os.path.getsize(path) < header["offset"]:
+        return False
+    return _fingerprint(path, header["offset"]) == {"inode": header["inode"], "checksum": header["checksum"]}
+
+def read_snapshot_header(path: str):
+    """Return the header of a history file's snapshot, or None if it has none that can be read."""
+    # EAFP: A missing or damaged snapshot only means the whole journal is replayed
+    try:
+        with open(snapshot_path(path), 'r', encoding='utf-8') as file:
+            header = json.loads(file.readline())
+    except (OSError, ValueError):
+        return None
+    return header if isinstance(header, dict) and header.get("version") == SNAPSHOT_VERSION else None
+
+def _read_body(path: str, header: dict):
+    """Read the columns of the snapshot written with header, or None if it has been replaced since."""
+    # EAFP: Another snapshot may have been renamed over this one, or the file removed with its history
+    try:
+        with open(snapshot_path(path), 'r', encoding='utf-8') as file:
+            if json.loads(file.readline()) != header:
+                return None
+            return json.loads(file.read())
+    except (OSError, ValueError):
+        return None
+
+def load_snapshot(path: str, header: dict) -> dict:
+    """Return the entries covered by a snapshot header, from the snapshot or, if it was replaced, the journal."""
+    columns = _read_body(path, header)
+    if columns is None:
+        with file_lock(path, shared=True):
+            columns = read_journal(path, 0, min(header["offset"], os.path.getsize(path)))[0]
+    logger.info("Read %s snapshot entries of %s", len(columns["operation"]), path)
+    return columns
+
+def read_head(path: str, expired: int, count: int) -> dict:
+    """Read the first count entries of a history as it is now, from its sealed segments and active file.
+
+    expired is the manifest's count of entries deleted by retention when count was taken; entries
+    deleted since are no longer part of the history and are taken off count. The active file's entries
+    come from its snapshot while that still matches.
+    """
+    columns = {column: [] for column in HISTORY_COLUMNS}
+    with file_lock(path, shared=True):
+        manifest = read_manifest(path)
+        count -= manifest["expired"] - expired
+        for segment, _ in sealed_segments(path, manifest):
+            if len(columns["operation"]) >= count:
+                break
+            _extend(columns, read_journal(segment)[0])
+        needed = count - len(columns["operation"])
+        if needed > 0:
+            header = read_snapshot_header(path)
+            active = None
+            if header is not None and header["rows"] >= needed and _matches(path, header):
+                active = _read_body(path, header)
+            _extend(columns, active if active is not None else read_journal(path)[0])
+    for values in columns.values():
+        del values[max(count, 0):]
+    logger.info("Read the first %s entries of %s", len(columns["operation"]), path)
+    return columns
+
+def _extend(columns: dict, more: dict) -> None:
+    """Append one set of column lists to another."""
+    for column in HISTORY_COLUMNS:
+        columns[column].extend(more[column])
+
+def open_store(path: str, policy: FlushPolicy = None) -> HistoryStore:
+    """Read an existing history file into a store.
+
+    For a CSV file only the active file's journal past its snapshot is parsed; the entries in the snapshot
+    and in sealed segments are read once the store needs them. When the journal has grown past
+    policy.snapshot_every entries a new snapshot is written in the background. Other formats are read whole.
+    """
+    if file_format(path) != "csv":
+        return HistoryStore.from_columns(read_columns(path))
+
+    migrate_legacy_csv(path)
+    header = read_snapshot_header(path)
+    # The check and the replay see the same files, no writer can append or seal in between
+    with file_lock(path, shared=True):
+        manifest = read_manifest(path)
+        sealed = sum(entry["rows"] for _, entry in sealed_segments(path, manifest))
+        if header is not None and not _matches(path, header):
+            logger.info("Snapshot of %s no longer matches it, replaying the whole journal", path)
+            header = None
+        journal, _ = read_journal(path, header["offset"] if header else 0)
+
+    replayed = len(journal["operation"])
+    if policy is not None and policy.should_snapshot(replayed):
+        schedule_snapshot(path)
+    deferred = sealed + (header["rows"] if header else 0)
+    if deferred == 0:
+        return HistoryStore.from_columns(journal)
+    logger.info("Opened %s with %s entries deferred and %s journal entries", path, deferred, replayed)
+    return HistoryStore.deferred(functools.partial(read_head, path, manifest["expired"]), deferred, journal)
+
+@timed("history", "snapshot")
+def write_snapshot(path: str) -> int:
+    """Write a snapshot of everything in the journal, extending the previous snapshot, and return its row count."""
+    # LBYL: Only an existing CSV history has a journal to snapshot
+    if file_format(path) != "csv" or not os.path.isfile(path):
+        return 0
+    header = read_snapshot_header(path)
+    with file_lock(path, shared=True):
+        if header is not None and not _matches(path, header):
+            header = None
+        journal, end = read_journal(path, header["offset"] if header else 0)
+        fingerprint = _fingerprint(path, end)
+
+    columns = load_snapshot(path, header) if header else {column: [] for column in HISTORY_COLUMNS}
+    for column in HISTORY_COLUMNS:
+        columns[column].extend(journal[column])
+    rows = len(columns["operation"])
+    header = {"version": SNAPSHOT_VERSION, "rows": rows, "offset": end, **fingerprint}
+    # Readers see the old snapshot or the new one, never half of one
+    with atomic_write(snapshot_path(path)) as temp_path, open(temp_path, 'w', encoding='utf-8') as file:
+        # One dumps call instead of the many small writes json.dump makes
+        file.write(json.dumps(header) + "\n" + json.dumps(columns, separators=(",", ":")))
+    logger.info("Snapshot of %s written with %s entries", path, rows)
+    return rows
+
+def schedule_snapshot(path: str):
+    """Write a snapshot of path on a background thread, unless one is already being written, and return the thread."""
+    return run_in_background("snapshot", path, write_snapshot, path)
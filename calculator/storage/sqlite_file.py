@@ -0,0 +1,182 @@
+"""SQLite history files: batched inserts in WAL mode and filters that run inside the database."""
+import contextlib
+import logging
+import os
+import sqlite3
+import time
+from calculator.numeric import to_decimal
+from calculator.storage.base import BufferedHistoryFile
+from calculator.storage.policy import FlushPolicy
+from calculator.store import HISTORY_COLUMNS
+
+logger = logging.getLogger('calculator_app')
+
+SQLITE_EXTENSIONS = (".db", ".sqlite")
+
+# Results are kept as exact encoded text ("2.5", "1/3", "0.25f"). Range filters use the value column, the result
+# decoded to a number when it is written, since SQLite's own CAST would read "1/3" as 1.0
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS history ("
+    " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+    " operation TEXT NOT NULL,"
+    " operands TEXT NOT NULL,"
+    " result TEXT NOT NULL,"
+    " timestamp REAL NOT NULL,"
+    " value REAL)",
+)
+INDEXES = (
+    "DROP INDEX IF EXISTS history_operation",  # The CAST(result AS REAL) index of earlier databases
+    "CREATE INDEX IF NOT EXISTS history_operation_value ON history (operation, value)",
+    "CREATE INDEX IF NOT EXISTS history_timestamp ON history (timestamp)",
+)
+SELECT_ROWS = "SELECT operation, operands, result FROM history"
+INSERT_ROW = "INSERT INTO history (operation, operands, result, timestamp, value) VALUES (?, ?, ?, ?, ?)"
+
+def result_value(result) -> float:
+    """The numeric value range filters compare, or None for a result that is not a finite number."""
+    value = to_decimal(str(result))
+    return None if value is None else float(value)
+
+def _insert_parameters(rows: list, now: float) -> list:
+    """INSERT_ROW parameters for (operation, operands, result) rows written at time now."""
+    return [(*row[:2], str(row[2]), now, result_value(row[2])) for row in rows]
+
+def _add_value_column(connection: sqlite3.Connection) -> None:
+    """Give a database written before the value column one, filled in from its results."""
+    if "value" in {row[1] for row in connection.execute("PRAGMA table_info(history)")}:
+        return
+    connection.execute("ALTER TABLE history ADD COLUMN value REAL")
+    rows = connection.execute("SELECT id, result FROM history").fetchall()
+    connection.executemany("UPDATE history SET value = ? WHERE id = ?",
+                           [(result_value(result), row_id) for row_id, result in rows])
+    logger.info("Added result values to %s rows", len(rows))
+
+def connect(path: str, fsync: bool = False) -> sqlite3.Connection:
+    """Open a history database in WAL mode, creating the table and indexes if needed."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # The connection is shared with the flush timer thread, BufferedHistoryFile serializes its use
+    connection = sqlite3.connect(path, check_same_thread=False)
+    connection.execute("PRAGMA journal_mode=WAL")
+    # In WAL mode NORMAL only risks the last transactions on power loss, FULL syncs every commit
+    connection.execute(f"PRAGMA synchronous={'FULL' if fsync else 'NORMAL'}")
+    with connection:
+        for statement in SCHEMA:
+            connection.execute(statement)
+        _add_value_column(connection)
+        for statement in INDEXES:
+            connection.execute(statement)
+    return connection
+
+@contextlib.contextmanager
+def _reading(path: str):
+    """Open a short-lived connection for reading."""
+    connection = connect(path)
+    try:
+        yield connection
+    finally:
+        connection.close()
+
+def _as_text(rows) -> list:
+    """Rows as (operation, operands, result) strings, the same as the other formats hold."""
+    return [(operation, operands, str(result)) for operation, operands, result in rows]
+
+def read_sqlite_columns(path: str, columns: list = None) -> dict:
+    """Read every row of a history database into one list per column, in insertion order."""
+    columns = list(columns or HISTORY_COLUMNS)
+    with _reading(path) as connection:
+        rows = connection.execute(f"SELECT {', '.join(columns)} FROM history ORDER BY id").fetchall()
+    values = list(zip(*rows)) if rows else [()] * len(columns)
+    return {column: list(column_values) for column, column_values in zip(columns, values)}
+
+def write_sqlite(path: str, rows: list) -> None:
+    """Create a history database at path holding rows, inserted in one transaction."""
+    connection = connect(path)
+    try:
+        now = time.time()
+        with connection:
+            connection.executemany(INSERT_ROW, _insert_parameters(rows, now))
+        connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")  # Everything in the main file before a rename
+    finally:
+        connection.close()
+
+def sqlite_rows(path: str, offset: int = 0, limit: int = -1) -> list:
+    """Return rows in insertion order, skipping offset rows and returning at most limit (-1 for all)."""
+    with _reading(path) as connection:
+        return _as_text(connection.execute(f"{SELECT_ROWS} ORDER BY id LIMIT ? OFFSET ?", (limit, offset)))
+
+def sqlite_tail(path: str, count: int) -> list:
+    """Return the last count rows, oldest first, through the primary key index."""
+    with _reading(path) as connection:
+        rows = connection.execute(f"{SELECT_ROWS} ORDER BY id DESC LIMIT ?", (count,)).fetchall()
+    return _as_text(reversed(rows))
+
+def query_sqlite(path: str, operation: str = None, min_result=None, max_result=None, since: float = None,
+                 until: float = None, last: int = None) -> list:
+    """Return the rows matching every given filter, oldest first; last keeps only the newest matches."""
+    clauses, parameters = [], []
+    if operation is not None:
+        clauses.append("operation = ?")
+        parameters.append(operation)
+    # An operation plus a result range is one scan of the (operation, value) index
+    if min_result is not None:
+        clauses.append("value >= ?")
+        parameters.append(float(min_result))
+    if max_result is not None:
+        clauses.append("value <= ?")
+        parameters.append(float(max_result))
+    if since is not None:
+        clauses.append("timestamp >= ?")
+        parameters.append(since)
+    if until is not None:
+        clauses.append("timestamp <= ?")
+        parameters.append(until)
+    where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+
+    with _reading(path) as connection:
+        if last is not None:
+            rows = connection.execute(f"{SELECT_ROWS}{where} ORDER BY id DESC LIMIT ?", (*parameters, last))
+            return _as_text(reversed(rows.fetchall()))
+        return _as_text(connection.execute(f"{SELECT_ROWS}{where} ORDER BY id", parameters))
+
+class SqliteHistoryFile(BufferedHistoryFile):
+    """Insert buffered history rows into a SQLite database, one transaction per flush."""
+    def __init__(self, path: str, policy: FlushPolicy = None):
+        super().__init__(path, policy)
+        self._connection = None
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the connection on first use and keep it for later flushes."""
+        if self._connection is None:
+            self._connection = connect(self.path, self.policy.fsync)
+        return self._connection
+
+    def write_rows(self, rows: list) -> None:
+        """Insert every buffered row in a single transaction."""
+        # Rows are stamped when written, which is when they were calculated unless flushing is deferred
+        now = time.time()
+        connection = self._connect()
+        with connection:
+            connection.executemany(INSERT_ROW, _insert_parameters(rows, now))
+        logger.info("%s entries inserted into %s", len(rows), self.path)
+
+    def truncate_rows(self, count: int) -> list:
+        """Delete the newest count rows and return them oldest first."""
+        if not os.path.isfile(self.path):
+            return []
+        connection = self._connect()
+        with connection:
+            rows = connection.execute("SELECT id, operation, operands, result FROM history "
+                                      "ORDER BY id DESC LIMIT ?", (count,)).fetchall()
+            if not rows:
+                return []
+            connection.execute("DELETE FROM history WHERE id >= ?", (rows[-1][0],))
+        logger.info("Deleted %s entries from %s", len(rows), self.path)
+        return _as_text((operation, operands, result) for _, operation, operands, result in reversed(rows))
+
+    def release(self) -> None:
+        """Close the connection; the last one to close checkpoints the WAL into the database file."""
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
@@ -0,0 +1,141 @@
+"""Append-only in-memory store for calculation history."""
+from __future__ import annotations
+from typing import TYPE_CHECKING
+from calculator.numeric import NUMBER_TYPES, decode_result, encode_number
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+HISTORY_COLUMNS = ("operation", "operands", "result")
+
+class HistoryStore:
+    """Keep history as one list per column and build a DataFrame only when asked for one.
+
+    Operands and results are held encoded, as the history file has them, whether they were just calculated
+    or read back; records() decodes the results into numbers of the type they were recorded with.
+    """
+    def __init__(self):
+        self._columns = {column: [] for column in HISTORY_COLUMNS}
+        self._frame = None  # Cached DataFrame, dropped whenever the store changes
+        self._load = None  # Reads the entries still on disk, which come before the ones in _columns
+        self._deferred = 0  # Number of entries to read with it
+
+    @classmethod
+    def from_frame(cls, frame: pd.DataFrame) -> "HistoryStore":
+        """Build a store from a DataFrame with the history columns."""
+        store = cls()
+        for column in HISTORY_COLUMNS:
+            # LBYL: Tolerate frames that are missing a column by filling it with blanks
+            if column == "result" and column in frame.columns:
+                # Numbers are encoded like calculated results, text is kept as the file had it
+                store._columns[column] = [encode_number(value) if isinstance(value, (*NUMBER_TYPES, int)) else value
+                                          for value in frame[column].tolist()]
+            elif column in frame.columns:
+                store._columns[column] = frame[column].tolist()
+            else:
+                store._columns[column] = [None] * len(frame)
+        return store
+
+    @classmethod
+    def from_columns(cls, columns: dict) -> "HistoryStore":
+        """Build a store from a dictionary of column lists, taking ownership of the lists."""
+        store = cls()
+        length = len(columns.get("operation", []))
+        for column in HISTORY_COLUMNS:
+            store._columns[column] = columns.get(column, [None] * length)
+        return store
+
+    @classmethod
+    def deferred(cls, load, count: int, columns: dict = None) -> "HistoryStore":
+        """Build a store whose first count entries are only read, by calling load(), once they are needed.
+
+        load(n) returns the first n entries as a dictionary of column lists; columns holds the entries
+        that follow them. Appending, counting and truncating never call load.
+        """
+        store = cls.from_columns(columns) if columns else cls()
+        # LBYL: Nothing deferred means nothing to read later
+        if count > 0:
+            store._load = load
+            store._deferred = count
+        return store
+
+    @property
+    def loaded(self) -> bool:
+        """Tell whether every entry is in memory."""
+        return self._load is None
+
+    def _materialize(self) -> None:
+        """Read the deferred entries in front of the ones already in memory."""
+        if self._load is None:
+            return
+        columns = self._load(self._deferred)  # Fewer than asked for if some were deleted on disk since
+        for column in HISTORY_COLUMNS:
+            values = columns[column]
+            values.extend(self._columns[column])
+            self._columns[column] = values
+        self._load = None
+        self._deferred = 0
+
+    def __len__(self) -> int:
+        return self._deferred + len(self._columns["operation"])
+
+    def append(self, operation: str, operands: str, result) -> None:
+        """Append one entry in amortized O(1)."""
+        self._columns["operation"].append(operation)
+        self._columns["operands"].append(operands)
+        self._columns["result"].append(result)
+        self._frame = None
+
+    def extend(self, operations: list, operands: list, results: list) -> None:
+        """Append a block of entries given column-wise."""
+        self._columns["operation"].extend(operations)
+        self._columns["operands"].extend(operands)
+        self._columns["result"].extend(results)
+        self._frame = None
+
+    def truncate(self, count: int) -> None:
+        """Remove the last count entries."""
+        in_memory = len(self._columns["operation"])
+        # Entries still on disk are dropped by reading fewer later
+        self._deferred = max(self._deferred - max(count - in_memory, 0), 0)
+        keep = max(in_memory - count, 0)
+        for values in self._columns.values():
+            del values[keep:]
+        self._frame = None
+
+    def clear(self) -> None:
+        """Remove every entry."""
+        self._load = None
+        self._deferred = 0
+        for values in self._columns.values():
+            values.clear()
+        self._frame = None
+
+    def column(self, name: str) -> list:
+        """Return the values of one column without copying them."""
+        self._materialize()
+        return self._columns[name]
+
+    def records(self) -> list:
+        """Return the entries as a list of dictionaries, with decoded results."""
+        self._materialize()
+        return [
+            {"operation": operation, "operands": operands, "result": decode_result(result)}
+            for operation, operands, result in zip(*(self._columns[column] for column in HISTORY_COLUMNS))
+        ]
+
+    def to_frame(self) -> pd.DataFrame:
+        """Return the entries as a DataFrame with decoded results, reusing the last one built if nothing changed."""
+        if self._frame is None:
+            self._materialize()
+            import pandas as pd  # pylint: disable=import-outside-toplevel
+            self._frame = pd.DataFrame({"operation": self._columns["operation"],
+                                        "operands": self._columns["operands"],
+                                        "result": [decode_result(result) for result in self._columns["result"]]})
+        return self._frame
+
+    def encoded_frame(self) -> pd.DataFrame:
+        """Return the entries as a DataFrame holding exactly what a history file stores."""
+        self._materialize()
+        import pandas as pd  # pylint: disable=import-outside-toplevel
+        return pd.DataFrame({column: self._columns[column] for column in HISTORY_COLUMNS})
@@ -1,9 +1,19 @@
 import os
+import sys
+import argparse
+import asyncio
 import logging
-import concurrent.futures
 from calculator.factory import CommandFactory
+from calculator.registry import CommandRegistry
 from calculator import Calculator
-from decimal import Decimal
+from calculator.executor import CommandExecutor
+from calculator.log import configure_from_env
+from calculator.metrics import METRICS
+from calculator.numeric import get_backend
+from calculator.expression import NARY_OPERATIONS, ExpressionEngine
+from calculator.batch import Sharding, run_batch
+from calculator.server import serve
+from calculator.storage import FlushPolicy
 from dotenv import load_dotenv
 
 # Load environment variables from the .env file
@@ -12,20 +22,217 @@ load_dotenv()
 # Get the environment variable (now ENV instead of ENVIRONMENT)
 environment = os.getenv('ENV', 'prod').lower()
 
-# Set the logging format with a timestamp
-log_format = "%(asctime)s - %(levelname)s - %(message)s"
-date_format = "%Y-%m-%d %H:%M:%S"
+# Optional result cache for the pure arithmetic commands (0 disables it)
+result_cache_size = int(os.getenv('CALC_RESULT_CACHE_SIZE', '0'))
+if result_cache_size > 0:
+    CommandFactory.enable_result_cache(result_cache_size, os.getenv('CALC_RESULT_CACHE_POLICY', 'lru').lower())
 
-os.makedirs('logs', exist_ok=True)
+# Optional instrumentation of commands, history I/O and plugin loads (also switched with 'stats on|off')
+if os.getenv('CALC_METRICS', '0').lower() in ('1', 'true', 'yes', 'on'):
+    CommandRegistry.enable_metrics()
+
+# Configure logging based on environment: records are queued and written to a rotating file off the REPL thread
 log_file = os.path.join('logs', 'calc.log')
+configure_from_env(environment, log_file)
+
+class ReplSession:
+    """One interactive session: its calculator, the commands the REPL runs itself and the plugin commands."""
+
+    def __init__(self, calculator: Calculator, executor: CommandExecutor):
+        self.calculator = calculator
+        self.executor = executor
+        # Command instances are created once per session and reused for every line
+        self.registry = CommandRegistry(calculator)
+        # Expressions and chained operations, with variables that live for the session
+        self.engine = ExpressionEngine(calculator)
+        # Commands the REPL handles itself, by their first word; anything else is run as a plugin command
+        self.commands = {"help": lambda arguments: self.display_menu(),
+                         "plugins": lambda arguments: self.display_plugins(),
+                         "reload": lambda arguments: self.reload(), "stats": self.handle_stats,
+                         "backend": self.handle_backend, "eval": self.handle_eval, "let": self.handle_let,
+                         "history": self.handle_history}
+
+    def run(self, parts: list) -> None:
+        """Run one input line, already split into words."""
+        handler = self.commands.get(parts[0])
+        if handler is None:
+            self.run_operation(parts[0], parts[1:])
+        else:
+            handler(parts[1:])
+
+    @staticmethod
+    def display_menu() -> None:
+        """List the plugin commands and the REPL's own commands."""
+        logging.debug("Displaying available plugins")
+        print("\nAvailable commands:")
+        for command in CommandRegistry.names():
+            print(f" - {command}")
+        print(" - eval <expression>, e.g. eval (a + 2) * b")
+        print(" - let <name> = <expression>")
+        print(" - plugins")
+        print(" - reload")
+        print(" - stats [on|off|reset|json|prometheus|export <file>]")
+        print(" - backend [decimal [<precision> [<rounding>]] | float | fraction]")
+        print("\nRun <command> help to see additional usage details.")
+
+    @staticmethod
+    def display_plugins() -> None:
+        """List plugins with how long each took to import."""
+        load_times = CommandRegistry.load_times()
+        print("\nPlugins:")
+        for command in CommandRegistry.names():
+            # LBYL: Plugins are imported on first use, so most have no load time yet
+            if command in load_times:
+                print(f" - {command}: loaded in {load_times[command] * 1000:.2f} ms")
+            else:
+                print(f" - {command}: not loaded")
+
+    def reload(self) -> None:
+        """Re-import the plugins whose files changed, here and in any worker processes."""
+        changed = CommandRegistry.reload_changed(self.executor)
+        print(f"\nReloaded plugins: {', '.join(changed)}" if changed else "\nNo plugin changes found.")
+
+    @staticmethod
+    def handle_stats(arguments: list) -> None:
+        """Show, switch or export the instrumentation."""
+        action = arguments[0] if arguments else "show"
+        if action == "on":
+            CommandRegistry.enable_metrics()
+            print("\nInstrumentation enabled.")
+        elif action == "off":
+            CommandRegistry.disable_metrics()
+            print("\nInstrumentation disabled.")
+        elif action == "reset":
+            METRICS.reset()
+            print("\nInstrumentation reset.")
+        elif action in ("json", "prometheus"):
+            print(METRICS.export(action))
+        elif action == "export" and len(arguments) == 2:
+            # The format follows the extension, Prometheus text for anything but .json
+            export_format = "json" if arguments[1].endswith(".json") else "prometheus"
+            # EAFP: Try the write and report a path that cannot be written
+            try:
+                with open(arguments[1], 'w', encoding='utf-8') as file:
+                    file.write(METRICS.export(export_format))
+                print(f"\nExported {export_format} metrics to {arguments[1]}")
+            except OSError as e:
+                logging.error("Failed to export metrics: %s", e)
+                print(f"\nCould not write {arguments[1]}: {e}")
+        elif action == "show":
+            lines = METRICS.report()
+            # LBYL: Say why there is nothing to show instead of printing an empty table
+            if not lines:
+                print("\nNo measurements yet." if METRICS.enabled else
+                      "\nInstrumentation is off. Use 'stats on' or set CALC_METRICS=1.")
+            else:
+                print("\n" + "\n".join(lines))
+        else:
+            print("\nUsage: stats [on|off|reset|json|prometheus|export <file>]")
+
+    def handle_backend(self, arguments: list) -> None:
+        """Show or switch the number type used for this session."""
+        if arguments:
+            # EAFP: get_backend rejects unknown names, precisions and rounding modes
+            try:
+                self.calculator.backend = get_backend(arguments[0], *(int(arg) for arg in arguments[1:2]),
+                                                      *arguments[2:3])
+            except ValueError as e:
+                print(f"\n{e}")
+                print("Usage: backend [decimal [<precision> [<rounding>]] | float | fraction]")
+                return
+            logging.info("Switched numeric backend to %s", self.calculator.backend.describe())
+        print(f"\nNumeric backend: {self.calculator.backend.describe()}")
+
+    def handle_eval(self, arguments: list) -> None:
+        """Evaluate an expression, e.g. eval (a + 2) * b."""
+        # The session's precision and rounding apply while a command runs, not to history statistics
+        # LBYL: Check there is an expression to evaluate
+        if not arguments:
+            print("\nUsage: eval <expression>")
+            return
+        with self.calculator.backend.active():
+            result = self.engine.evaluate(" ".join(arguments))
+        print(f"\nResult: {result}")
+
+    def handle_let(self, arguments: list) -> None:
+        """Bind a variable for the rest of the session, e.g. let a = 2 * 3."""
+        name, equals, source = " ".join(arguments).partition("=")
+        # LBYL: Check the binding has both a name and an expression
+        if not equals or not name.strip() or not source.strip():
+            print("\nUsage: let <name> = <expression>")
+            return
+        with self.calculator.backend.active():
+            result = self.engine.assign(name.strip(), source)
+        print(f"\n{name.strip()} = {result}")
+
+    def handle_history(self, arguments: list) -> None:
+        """Run a history subcommand with the arguments it takes on the command line."""
+        command_instance = self.registry.get("history")
+        # LBYL: Check the history plugin is there and the subcommand has the arguments it needs
+        if command_instance is None:
+            print("\nHistory command not found.")
+            return
+        history_command = arguments[0] if arguments else None
+        if history_command == "help":
+            command_instance.show_help()
+        elif history_command in ("load", "save") and len(arguments) == 2:
+            # EAFP: Assume loading or saving will succeed, the command reports any failure
+            command_instance.execute(history_command, arguments[1])
+        elif history_command in ("clear", "compact"):
+            command_instance.execute(history_command)
+        elif history_command == "delete":
+            command_instance.execute("delete", **({"count": int(arguments[1])} if len(arguments) == 2 else {}))
+        elif history_command == "show":
+            filename, options = command_instance.parse_show_options(arguments[1:])
+            command_instance.execute("show", filename, **options)
+        elif history_command == "stats":
+            command_instance.execute("stats", rebuild="--rebuild" in arguments[1:])
+        elif history_command == "query":
+            command_instance.execute("query", **command_instance.parse_query_options(arguments[1:]))
+        else:
+            print("\nInvalid subcommand. Use load, save, clear, delete, show, query, stats, or compact.")
+
+    def run_operation(self, operation: str, arguments: list) -> None:
+        """Run a plugin command, e.g. add 1 2, or show its help."""
+        # LBYL: Check if the command exists before calling help
+        if arguments[:1] == ["help"]:
+            command_instance = self.registry.get(operation)
+            if command_instance:
+                command_instance.show_help()
+            else:
+                print("\nInvalid command for help. Type 'help' to see available plugins.")
+            return
+
+        # Convert values to the session's number type for arithmetic operations
+        # LBYL: Check if the input values are valid before conversion
+        try:
+            values = [self.calculator.backend.parse(value) for value in arguments]
+        except ValueError:
+            logging.error("Invalid decimal value provided.")
+            print("\nPlease enter valid numbers.")
+            return
+
+        # Chained operations such as add 1 2 3 are folded and recorded as one entry
+        if len(values) > 2 and operation in NARY_OPERATIONS:
+            with self.calculator.backend.active():
+                result = self.engine.apply(operation, values)
+            print(f"\nResult: {result}")
+            return
+
+        # Check if the operation is valid
+        # LBYL: Check if the command exists before execution
+        command_instance = self.registry.get(operation)
+        if command_instance is None:
+            logging.warning("Invalid operation attempted: %s", operation)
+            print("\nInvalid operation. Type 'help' to see available plugins.")
+            return
+
+        # EAFP: Assume the execution will succeed and catch exceptions later
+        with self.calculator.backend.active():
+            result = self.executor.execute(command_instance, *values)
 
-# Configure logging based on environment, writing to a file
-if environment == 'dev':
-    logging.basicConfig(level=logging.DEBUG, format=log_format, datefmt=date_format, filename=log_file, filemode='a')
-elif environment == 'uat':
-    logging.basicConfig(level=logging.INFO, format=log_format, datefmt=date_format, filename=log_file, filemode='a')
-else:  # 'prod'
-    logging.basicConfig(level=logging.WARNING, format=log_format, datefmt=date_format, filename=log_file, filemode='a')
+        logging.debug("Operation '%s' executed with result: %s", operation, result)
+        print(f"\nResult: {result}")
 
 # REPL function
 def repl():
@@ -41,108 +248,89 @@ def repl():
     # Initialize the Calculator with the specified or default history file
     calculator = Calculator(history_file=user_history_file)
 
-    # Display menu function
-    def display_menu():
-        logging.debug("Displaying available plugins")
-        print("\nAvailable commands:")
-        for command in CommandFactory.command_classes.keys():
-            print(f" - {command}")
-        print("\nRun <command> help to see additional usage details.")
-
     # Display the menu when the application starts
-    display_menu()
+    ReplSession.display_menu()
 
-    while True:
-        # Print the currently active history file
-        print(f"\n[Active history file: {calculator.active_history_file}]")
+    # One execution backend for the whole session instead of a new pool per command
+    with CommandExecutor.from_env() as executor:
+        session = ReplSession(calculator, executor)
+        while True:
+            # Print the currently active history file
+            print(f"\n[Active history file: {calculator.active_history_file}]")
 
-        user_input = input("Enter command or 'help' to see options or 'exit' to quit: ").strip().lower()
+            user_input = input("Enter command or 'help' to see options or 'exit' to quit: ").strip().lower()
 
-        if user_input == "exit":
-            logging.info("User exited the application.")
-            print("\nExiting the calculator. Goodbye!")
-            break
-        elif user_input == "help":
-            display_menu()
-            continue
+            if user_input == "exit":
+                calculator.close()  # Write out any buffered history entries
+                logging.info("User exited the application.")
+                print("\nExiting the calculator. Goodbye!")
+                break
 
-        try:
             parts = user_input.split()
-            operation = parts[0]
-
-            # Handle help commands
-            if len(parts) > 1 and parts[1] == "help":
-                # LBYL: Check if the command exists before calling help
-                command_instance = CommandFactory.create_command(operation, calculator)
-                if command_instance:
-                    command_instance.show_help()
-                else:
-                    print("\nInvalid command for help. Type 'help' to see available plugins.")
+            # LBYL: Ignore an empty line instead of looking up an empty command
+            if not parts:
                 continue
 
-            # Handle history subcommands
-            if operation == "history" and len(parts) > 1:
-                history_command = parts[1]
-                command_instance = CommandFactory.create_command("history", calculator)
-                if command_instance:
-                    if history_command == "load" and len(parts) == 3:
-                        filename = parts[2]
-                        # EAFP: Assume loading will succeed and catch exceptions later
-                        command_instance.execute("load", filename)
-                    elif history_command == "save" and len(parts) == 3:
-                        filename = parts[2]
-                        command_instance.execute("save", filename)
-                    elif history_command == "clear":
-                        command_instance.execute("clear")
-                    elif history_command == "delete":
-                        command_instance.execute("delete")
-                    elif history_command == "show":
-                        command_instance.execute("show")
-                    else:
-                        print("\nInvalid subcommand. Use load, save, clear, delete, or show.")
-                else:
-                    print("\nHistory command not found.")
-                continue
+            try:
+                session.run(parts)
+            except ValueError:
+                logging.error("Invalid input provided.")
+                print("\nInvalid input. Please enter valid numbers and an operation.")
+            except ZeroDivisionError:
+                logging.error("Division by zero attempted.")
+                print("\nError: Division by zero.")
+            except Exception as e:
+                logging.exception("An error occurred during command execution: %s", e)
+                print(f"\nAn error occurred: {e}")
+                print("Run <command> help to see usage details.")
 
-            # Convert values to Decimal for arithmetic operations
-            # LBYL: Check if the input values are valid before conversion
-            if len(parts) > 1:
-                try:
-                    values = [Decimal(value) for value in parts[1:]]
-                except ValueError:
-                    logging.error("Invalid decimal value provided.")
-                    print("\nPlease enter valid numbers.")
-                    continue
-            else:
-                values = []
-
-            # Check if the operation is valid
-            # LBYL: Check if the command exists before execution
-            command_instance = CommandFactory.create_command(operation, calculator)
-            if command_instance is None:
-                logging.warning(f"Invalid operation attempted: {operation}")
-                print("\nInvalid operation. Type 'help' to see available plugins.")
-                continue
+def batch(path: str, history_file: str, quiet: bool = False, sharding: Sharding = None) -> None:
+    """Run every operation in a file (or stdin for '-') and record the history in one write."""
+    # Nothing is flushed until the batch is done, then the whole block is written at once
+    calculator = Calculator(history_file=history_file, flush_policy=FlushPolicy(max_entries=sys.maxsize))
 
-            # EAFP: Assume the execution will succeed and catch exceptions later
-            with concurrent.futures.ProcessPoolExecutor() as executor:
-                future = executor.submit(command_instance.execute, *values)
-                result = future.result()  # This will block until the result is available
+    if path == "-":
+        report = run_batch(calculator, sys.stdin, quiet=quiet, sharding=sharding)
+    else:
+        with open(path, 'r', encoding='utf-8') as file:
+            report = run_batch(calculator, file, quiet=quiet, sharding=sharding)
+    calculator.close()
+    print(report.summary(), file=sys.stderr)
 
-            logging.debug(f"Operation '{operation}' executed with result: {result}")
-            print(f"\nResult: {result}")
+def main(argv: list = None) -> None:
+    """Start the REPL, or run a batch file when --batch is given."""
+    parser = argparse.ArgumentParser(description="Advanced Python Calculator")
+    parser.add_argument("--batch", metavar="FILE", help="run the operations in FILE ('-' for stdin) and exit")
+    parser.add_argument("--history", default=os.path.join('data', 'history.csv'),
+                        help="history file used in batch mode (default: data/history.csv)")
+    parser.add_argument("--quiet", action="store_true", help="do not print each result in batch mode")
+    parser.add_argument("--workers", type=int, help="worker processes for batch mode, 0 for one per core "
+                        "(default: CALC_BATCH_WORKERS, or 1 to run in this process)")
+    parser.add_argument("--chunk-size", type=int, help="lines handed to a worker at a time in batch mode "
+                        "(default: CALC_BATCH_CHUNK, or 5000)")
+    parser.add_argument("--serve", metavar="[HOST:]PORT", help="serve calculator sessions over TCP instead of the REPL")
+    parser.add_argument("--history-dir", default=os.path.join('data', 'sessions'),
+                        help="directory for per-client history files in server mode (default: data/sessions)")
+    args = parser.parse_args(argv)
 
-        except ValueError:
-            logging.error("Invalid input provided.")
-            print("\nInvalid input. Please enter valid numbers and an operation.")
-        except ZeroDivisionError:
-            logging.error("Division by zero attempted.")
-            print("\nError: Division by zero.")
-        except Exception as e:
-            logging.exception(f"An error occurred during command execution: {e}")
-            print(f"\nAn error occurred: {e}")
-            print("Run <command> help to see usage details.")
+    if args.batch:
+        sharding = Sharding.from_env()
+        # EAFP: Command line settings override the environment's and are checked the same way
+        try:
+            sharding = Sharding(workers=sharding.workers if args.workers is None else args.workers,
+                                chunk_size=sharding.chunk_size if args.chunk_size is None else args.chunk_size)
+        except ValueError as e:
+            parser.error(str(e))
+        batch(args.batch, args.history, quiet=args.quiet, sharding=sharding)
+    elif args.serve:
+        host, _, port = args.serve.rpartition(":")
+        try:
+            asyncio.run(serve(args.history_dir, host or "127.0.0.1", int(port)))
+        except KeyboardInterrupt:
+            logging.info("Server stopped by the user.")
+    else:
+        repl()
 
 # Starting the REPL
 if __name__ == "__main__":
-    repl()
+    main()
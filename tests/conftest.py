@@ -3,6 +3,7 @@ from typing import List, Dict
 import random
 from faker import Faker
 import pytest
+from calculator import Calculator
 
 # Initialize Faker
 fake = Faker()
@@ -39,3 +40,15 @@ def fake_data(request) -> List[Dict[str, int]]:
         records.append(record)
 
     return records
+
+@pytest.fixture
+def calculator(tmp_path):
+    """A Calculator writing to a temporary history file."""
+    return Calculator(history_file=str(tmp_path / 'history.csv'))
+
+@pytest.fixture
+def in_tmp_path(tmp_path, monkeypatch):
+    """Run a test from an empty directory with a data folder, so relative history paths stay under tmp_path."""
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'data').mkdir()
+    return tmp_path
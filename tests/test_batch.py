@@ -0,0 +1,94 @@
+""" Batch Mode Tests """
+import io
+import os
+from decimal import Decimal
+import pytest
+from calculator import Calculator
+from calculator.batch import Sharding, parse_line, run_batch
+from calculator.storage import FlushPolicy
+
+def test_parse_line():
+    """Lines are split into an operation and Decimal values, comments are skipped."""
+    assert parse_line("ADD 1 2.5\n") == ("add", [Decimal('1'), Decimal('2.5')])
+    assert parse_line("# a comment") is None
+    assert parse_line("   ") is None
+
+def test_run_batch(tmp_path):
+    """Every line is executed, failures are counted and history is written once at the end."""
+    path = str(tmp_path / 'history.csv')
+    calc = Calculator(history_file=path, flush_policy=FlushPolicy(max_entries=1000))
+    lines = ["add 1 2", "divide 1 0", "multiply 2 3", "history show", "subtract 5 x", "add 4 4"]
+    output = io.StringIO()
+
+    report = run_batch(calc, lines, output=output)
+
+    assert (report.succeeded, report.failed, report.total) == (3, 3, 6)
+    assert output.getvalue().split() == ["3", "6", "8"]
+    assert calc.history.shape[0] == 3
+    with open(path, 'r', encoding='utf-8') as f:
+        assert len(f.readlines()) == 4
+    assert "ops/s" in report.summary()
+
+def test_run_batch_quiet(tmp_path):
+    """Quiet mode prints no results."""
+    calc = Calculator(history_file=str(tmp_path / 'history.csv'))
+    output = io.StringIO()
+    report = run_batch(calc, ["add 1 1"] * 10, output=output, quiet=True)
+    assert report.succeeded == 10
+    assert output.getvalue() == ""
+
+def run_sharded(tmp_path, name, lines, sharding):
+    """Run lines with the given sharding into a fresh history, returning the report, output, file and calculator."""
+    path = str(tmp_path / name)
+    calc = Calculator(history_file=path, flush_policy=FlushPolicy(max_entries=1000))
+    output = io.StringIO()
+    report = run_batch(calc, lines, output=output, sharding=sharding)
+    calc.close()
+    with open(path, 'r', encoding='utf-8') as f:
+        return report, output.getvalue(), f.read(), calc
+
+def test_sharded_batch_matches_serial(tmp_path, capsys):
+    """Chunks run on a process pool give the same output, errors and history, in the same order."""
+    lines = [f"add {i} 1" for i in range(7)] + ["divide 1 0", "", "multiply 2 3", "bogus 1 1"] * 3 + ["subtract 9 4"]
+    serial = run_sharded(tmp_path, 'serial.csv', lines, Sharding(workers=1))
+    serial_errors = capsys.readouterr().err
+    sharded = run_sharded(tmp_path, 'sharded.csv', lines, Sharding(workers=2, chunk_size=3))
+
+    assert (sharded[0].succeeded, sharded[0].failed) == (serial[0].succeeded, serial[0].failed) == (11, 6)
+    assert sharded[1:3] == serial[1:3]
+    assert capsys.readouterr().err == serial_errors
+    assert sharded[3].store.column("result") == serial[3].store.column("result")
+
+def test_sharded_batch_merges_stats(tmp_path):
+    """The aggregates computed in the workers are merged into the calculator's running stats."""
+    lines = [f"{operation} {i} 2" for i in range(20) for operation in ("add", "multiply")]
+    serial = run_sharded(tmp_path, 'serial.csv', lines, Sharding(workers=1))[3]
+    sharded = run_sharded(tmp_path, 'sharded.csv', lines, Sharding(workers=3, chunk_size=7))[3]
+    assert sharded.history_stats() == serial.history_stats()
+    assert sharded.history_stats()["add"]["count"] == 20
+
+def test_sharding_settings(monkeypatch):
+    """Settings come from the environment, 0 workers means one per core, and nonsense is rejected."""
+    monkeypatch.setenv('CALC_BATCH_WORKERS', '3')
+    monkeypatch.setenv('CALC_BATCH_CHUNK', '100')
+    sharding = Sharding.from_env()
+    assert (sharding.workers, sharding.chunk_size, sharding.parallel) == (3, 100, True)
+    assert Sharding(workers=0).workers == (os.cpu_count() or 1)
+    assert not Sharding().parallel
+    with pytest.raises(ValueError):
+        Sharding(chunk_size=0)
+    with pytest.raises(ValueError):
+        Sharding(workers=-1)
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_batch_chains_and_expressions(tmp_path, workers, capsys):
+    """Chained operations and eval lines are recorded like in the REPL, let and short lines get clear errors."""
+    lines = ["add 1 2 3", "eval (1 + 2) * 4", "let a = 2", "eval a + 1", "eval", "divide 8 2 2", "add 1"]
+    report, output, _, calc = run_sharded(tmp_path, 'history.csv', lines, Sharding(workers=workers, chunk_size=2))
+    assert (report.succeeded, report.failed) == (3, 4)
+    assert output.split() == ["6", "12", "2"]
+    assert calc.store.column("operation") == ["add", "eval", "divide"]
+    assert calc.store.column("operands") == ["1 2 3", "=(1+2)*4", "8 2 2"]
+    errors = capsys.readouterr().err
+    assert "Line 3: error: let is not supported in batch mode" in errors
+    assert "Line 7: error: add needs at least two operands" in errors
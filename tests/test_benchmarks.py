@@ -0,0 +1,41 @@
+""" Benchmark Suite Tests """
+import json
+from benchmarks import batch_scaling, suite
+from benchmarks.datasets import synthetic_rows
+from benchmarks.harness import compare, load_results, save_results
+
+def test_datasets_are_reproducible():
+    """The same seed gives the same rows, a different seed different ones."""
+    assert list(synthetic_rows(50, seed=3)) == list(synthetic_rows(50, seed=3))
+    assert list(synthetic_rows(50, seed=3)) != list(synthetic_rows(50, seed=4))
+
+def test_compare_flags_regressions(tmp_path):
+    """Only benchmarks slower than the threshold allows are reported, and results survive a round trip."""
+    baseline = {"fast": {"seconds": 1.0}, "slow": {"seconds": 1.0}, "gone": {"seconds": 1.0}}
+    current = {"fast": {"seconds": 1.05}, "slow": {"seconds": 1.5}, "new": {"seconds": 9.0}}
+    path = str(tmp_path / "baseline.json")
+    save_results(path, baseline)
+    assert load_results(path) == baseline
+    assert compare(current, load_results(path), threshold=0.10) == [("slow", 1.0, 1.5, 0.5)]
+
+def test_suite_runs_and_detects_regression(tmp_path, capsys):
+    """A short run writes every benchmark, and an impossible baseline makes the exit status fail."""
+    results = suite.run(str(tmp_path), scales=["small"], repeat=1, repl_lines=20)
+    assert {"discovery.cold", "repl_dispatch.add", "add_to_history.small", "load.small",
+            "show_all.small"} <= set(results)
+
+    baseline = tmp_path / "baseline.json"
+    save_results(str(baseline), {name: {"seconds": 1e-12} for name in results})
+    output = tmp_path / "results.json"
+    status = suite.main(["--scales", "small", "--only", "discovery", "--repeat", "1", "--workdir", str(tmp_path),
+                         "--output", str(output), "--compare", str(baseline)])
+    assert status == 1
+    assert "REGRESSION discovery.cold" in capsys.readouterr().err
+    assert set(json.loads(output.read_text(encoding='utf-8'))["results"]) == {"discovery.cold", "discovery.warm"}
+
+def test_batch_scaling_runs_identically(capsys):
+    """Every worker count records the same history and output, and the speedup is reported per run."""
+    assert batch_scaling.worker_counts(6) == [1, 2, 4, 6]
+    assert batch_scaling.main(["--lines", "300", "--max-workers", "2", "--chunk-size", "64"]) == 0
+    report = json.loads(capsys.readouterr().out)
+    assert [run["workers"] for run in report["runs"]] == [1, 2] and report["identical"]
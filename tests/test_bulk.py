@@ -0,0 +1,53 @@
+""" Bulk Operation Tests """
+from decimal import Decimal
+import numpy as np
+import pytest
+from calculator.factory import CommandFactory
+
+@pytest.mark.parametrize("operation, expected", [
+    ("add", [5.0, 7.0, 9.0]),
+    ("subtract", [-3.0, -3.0, -3.0]),
+    ("multiply", [4.0, 10.0, 18.0]),
+    ("divide", [0.25, 0.4, 0.5]),
+])
+def test_execute_many_float(calculator, operation, expected):
+    """The float path computes element-wise and records one history row per pair."""
+    command = CommandFactory.create_command(operation, calculator)
+    results = command.execute_many([1, 2, 3], np.array([4, 5, 6]))
+
+    assert isinstance(results, np.ndarray)
+    assert results.tolist() == expected
+    assert calculator.history.shape[0] == 3
+    assert calculator.history.iloc[2]['operands'] == "3.0f 6.0f"  # Recorded as floats
+
+def test_execute_many_exact(calculator):
+    """The exact path keeps Decimal precision."""
+    command = CommandFactory.create_command("divide", calculator)
+    results = command.execute_many([Decimal('1'), Decimal('2')], [Decimal('3'), Decimal('4')], exact=True)
+    assert results == [Decimal('1') / Decimal('3'), Decimal('0.5')]
+    assert calculator.history.iloc[0]['operands'] == "1 3"
+
+def test_execute_many_divide_by_zero(calculator):
+    """A zero anywhere in the divisors rejects the whole block before anything is recorded."""
+    command = CommandFactory.create_command("divide", calculator)
+    with pytest.raises(ZeroDivisionError):
+        command.execute_many([1, 2, 3], [1, 0, 3])
+    with pytest.raises(ZeroDivisionError):
+        command.execute_many([Decimal('1')], [Decimal('0')], exact=True)
+    assert calculator.history.empty
+
+def test_execute_many_invalid(calculator):
+    """Mismatched lengths and non-Decimal exact operands are rejected."""
+    command = CommandFactory.create_command("add", calculator)
+    with pytest.raises(ValueError):
+        command.execute_many([1, 2], [1])
+    with pytest.raises(TypeError):
+        command.execute_many([1], [2], exact=True)
+
+def test_execute_many_writes_one_block(calculator):
+    """The block reaches the history file in one flush."""
+    command = CommandFactory.create_command("multiply", calculator)
+    command.execute_many(np.arange(1000), np.arange(1000))
+    calculator.save_history()
+    with open(calculator.active_history_file, 'r', encoding='utf-8') as f:
+        assert len(f.readlines()) == 1001
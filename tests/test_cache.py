@@ -0,0 +1,108 @@
+""" Result Cache Tests """
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal, localcontext
+import pytest
+from calculator.cache import CachedCommand, ResultCache, cache_key
+from calculator.executor import CommandExecutor
+from calculator.factory import CommandFactory
+
+@pytest.fixture
+def cache():
+    """Enable a small result cache on the factory for one test."""
+    yield CommandFactory.enable_result_cache(maxsize=2)
+    CommandFactory.disable_result_cache()
+
+def test_lru_eviction():
+    """The least recently used entry is evicted first."""
+    lru = ResultCache(maxsize=2, policy="lru")
+    lru.put("a", 1)
+    lru.put("b", 2)
+    lru.get("a")
+    lru.put("c", 3)
+    assert lru.get("b") == (False, None)
+    assert lru.get("a") == (True, 1)
+    assert lru.stats()["evictions"] == 1
+
+def test_lfu_eviction():
+    """The least frequently used entry is evicted first."""
+    lfu = ResultCache(maxsize=2, policy="lfu")
+    lfu.put("a", 1)
+    lfu.put("b", 2)
+    lfu.get("b")
+    lfu.get("a")
+    lfu.get("a")
+    lfu.put("c", 3)
+    assert lfu.get("b") == (False, None)
+    assert lfu.get("a") == (True, 1)
+    assert lfu.get("c") == (True, 3)
+
+@pytest.mark.parametrize("policy", ["lru", "lfu"])
+def test_concurrent_use(policy):
+    """Threads sharing one small cache keep its entries and counters consistent."""
+    cache = ResultCache(maxsize=8, policy=policy)
+    def work(offset):
+        for i in range(2000):
+            key = (i + offset) % 32
+            hit, result = cache.get(key)
+            if hit:
+                assert result == key
+            else:
+                cache.put(key, key)
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # Switch threads as often as possible so gets and puts interleave
+    try:
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(work, range(8)))
+    finally:
+        sys.setswitchinterval(interval)
+    stats = cache.stats()
+    assert stats["size"] == len(cache) <= 8
+    assert stats["hits"] + stats["misses"] == 16000
+
+def test_invalid_settings():
+    """Size and policy are validated."""
+    with pytest.raises(ValueError):
+        ResultCache(maxsize=0)
+    with pytest.raises(ValueError):
+        ResultCache(policy="fifo")
+
+def test_cache_key_is_exact():
+    """Equal values with different representations or contexts get different keys."""
+    assert cache_key("add", [Decimal('1.0')]) != cache_key("add", [Decimal('1')])
+    default_key = cache_key("divide", [Decimal('1'), Decimal('3')])
+    with localcontext() as context:
+        context.prec = 5
+        assert cache_key("divide", [Decimal('1'), Decimal('3')]) != default_key
+
+def test_hits_still_record_history(calculator, cache):
+    """A cache hit returns the same result and still adds a history entry."""
+    command = CommandFactory.create_command("divide", calculator)
+    assert isinstance(command, CachedCommand)
+
+    first = command.execute(Decimal('10'), Decimal('4'))
+    second = command.execute(Decimal('10'), Decimal('4'))
+    assert first == second == Decimal('2.5')
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert calculator.history.shape[0] == 2
+
+def test_errors_are_not_cached(calculator, cache):
+    """Failing calculations raise every time."""
+    command = CommandFactory.create_command("divide", calculator)
+    for _ in range(2):
+        with pytest.raises(ZeroDivisionError):
+            command.execute(Decimal('1'), Decimal('0'))
+    assert len(cache) == 0
+
+def test_history_command_is_not_cached(calculator, cache):  # pylint: disable=unused-argument
+    """Only cacheable commands are wrapped."""
+    assert not isinstance(CommandFactory.create_command("history", calculator), CachedCommand)
+
+def test_process_executor_uses_cache(calculator, cache):
+    """The process executor serves hits from the parent's cache."""
+    command = CommandFactory.create_command("multiply", calculator)
+    with CommandExecutor(mode="process", max_workers=1) as executor:
+        executor.execute(command, Decimal('6'), Decimal('7'))
+        assert executor.execute(command, Decimal('6'), Decimal('7')) == Decimal('42')
+    assert cache.hits == 1
+    assert calculator.history.shape[0] == 2
@@ -6,6 +6,8 @@ import pytest
 from calculator import Calculator
 from calculator.factory import CommandFactory
 
+pytestmark = pytest.mark.usefixtures('in_tmp_path')
+
 # Fixtures for calculator
 @pytest.fixture
 def calculator():
@@ -157,4 +159,18 @@ def test_history_execute_invalid_subcommand(history_command, capsys):
     """Test handling of an invalid subcommand."""
     history_command.execute("invalid")
     captured = capsys.readouterr()
-    assert "Invalid subcommand. Use load, save, clear, delete, or show." in captured.out
+    assert "Invalid subcommand. Use load, save, clear, delete, show, query, stats, or compact." in captured.out
+
+def test_history_show_options(history_command):
+    """Paging options are parsed and passed on to show_history."""
+    filename, options = history_command.parse_show_options(["--tail", "5"])
+    assert filename is None
+    history_command.execute("show", filename, **options)
+    history_command.calculator.show_history.assert_called_once_with(tail=5)
+
+def test_history_show_options_invalid(history_command):
+    """Paging options need a positive number."""
+    with pytest.raises(ValueError):
+        history_command.parse_show_options(["--head"])
+    with pytest.raises(ValueError):
+        history_command.parse_show_options(["--page", "0"])
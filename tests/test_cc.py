@@ -4,6 +4,8 @@ import os
 import pytest
 from calculator import Calculator
 
+pytestmark = pytest.mark.usefixtures('in_tmp_path')
+
 @pytest.fixture
 def mock_history_file():
     """Fixture to create a mock history file"""
@@ -42,7 +44,7 @@ def test_add_to_history(calculator):
 
     assert calc.history.shape[0] == 1
     assert calc.history.iloc[0]['operation'] == "add"
-    assert calc.history.iloc[0]['operands'] == "[1, 2]"
+    assert calc.history.iloc[0]['operands'] == "1 2"
     assert calc.history.iloc[0]['result'] == 3.0
 
 def test_save_history_new_file(calculator):
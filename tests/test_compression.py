@@ -0,0 +1,93 @@
+""" Compressed History Tests """
+import gzip
+import importlib.util
+import json
+import os
+from decimal import Decimal
+import pytest
+from calculator import Calculator
+from calculator.storage import (FlushPolicy, SegmentPolicy, iter_rows, read_columns, read_history, segment_paths,
+                                tail_rows)
+from calculator.storage.background import wait_for_background
+from calculator.storage.segments import manifest_path
+
+HAS_ZSTANDARD = importlib.util.find_spec("zstandard") is not None
+CODECS = ["gz", "xz", pytest.param("zst", marks=pytest.mark.skipif(not HAS_ZSTANDARD, reason="needs zstandard"))]
+
+def add_entries(calc, start, stop):
+    """Record add entries for start..stop-1, each with result i + 1."""
+    for i in range(start, stop):
+        calc.add_to_history("add", [Decimal(i), Decimal(1)], Decimal(i + 1))
+
+def results(path):
+    """Results of every entry on disk, oldest first."""
+    return [row[2] for row in iter_rows(path)]
+
+@pytest.mark.parametrize("codec", CODECS)
+def test_appends_and_reads_round_trip(tmp_path, codec):
+    """Entries appended over two sessions read back the same through every reader."""
+    path = str(tmp_path / f'history.csv.{codec}')
+    calc = Calculator(history_file=path)
+    add_entries(calc, 0, 3)
+    calc.close()
+    reopened = Calculator(history_file=path)
+    add_entries(reopened, 3, 5)
+    reopened.close()
+
+    assert results(path) == ["1", "2", "3", "4", "5"]
+    assert read_columns(path)["result"] == results(path)
+    assert list(read_history(path)["result"]) == results(path)
+    assert [row[2] for row in tail_rows(path, 2)] == ["4", "5"]
+    assert [str(record["result"]) for record in Calculator(history_file=path).get_history()] == results(path)
+
+def test_each_flush_is_one_gzip_member(tmp_path):
+    """Appends add gzip members to the end of the file; delete and compact repack it as one stream."""
+    path = str(tmp_path / 'history.csv.gz')
+    calc = Calculator(history_file=path)
+    add_entries(calc, 0, 4)
+    with open(path, 'rb') as file:
+        assert file.read().count(b"\x1f\x8b\x08") == 5  # The header's member and one per entry
+
+    calc.delete_last_calculation(2)
+    assert results(path) == ["1", "2"]
+    add_entries(calc, 4, 6)
+    calc.compact_history()
+    with open(path, 'rb') as file:
+        data = file.read()
+    assert data.count(b"\x1f\x8b\x08") == 1
+    lines = gzip.decompress(data).decode('utf-8').splitlines()
+    assert lines[1:] == ["add,0 1,1", "add,1 1,2", "add,4 1,5", "add,5 1,6"]
+
+def test_segments_keep_the_codec(tmp_path):
+    """A compressed history seals into compressed segments, and compaction leaves them packed."""
+    path = str(tmp_path / 'history.csv.gz')
+    calc = Calculator(history_file=path, flush_policy=FlushPolicy(segments=SegmentPolicy(max_rows=2)))
+    add_entries(calc, 0, 7)
+    calc.close()
+    assert [os.path.basename(segment) for segment in segment_paths(path)] == [
+        "history.000001.csv.gz", "history.000002.csv.gz", "history.000003.csv.gz"]
+
+    calc.compact_history()
+    wait_for_background()
+    manifest = json.load(open(manifest_path(path), encoding='utf-8'))
+    assert [(segment["rows"], segment["packed"]) for segment in manifest["segments"]] == [(6, True)]
+    assert results(path) == [str(i) for i in range(1, 8)]
+
+def test_cut_short_member_is_ignored(tmp_path):
+    """A member cut off at the end of the file, as a crash mid-append leaves it, ends the history there."""
+    path = str(tmp_path / 'history.csv.gz')
+    calc = Calculator(history_file=path)
+    add_entries(calc, 0, 3)
+    calc.close()
+    with open(path, 'ab') as file:
+        file.write(gzip.compress(b"add,3 1,4\n")[:12])
+
+    assert results(path) == ["1", "2", "3"]
+    assert len(Calculator(history_file=path).store) == 3
+
+@pytest.mark.skipif(HAS_ZSTANDARD, reason="zstandard is installed")
+def test_zstd_without_zstandard(tmp_path):
+    """Writing a .csv.zst history without the optional zstandard package says what is missing."""
+    calc = Calculator(history_file=str(tmp_path / 'history.csv.zst'))
+    with pytest.raises(ImportError, match="zstandard"):
+        calc.history_writer.write_rows([("add", "1 1", "2")])
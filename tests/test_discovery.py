@@ -0,0 +1,60 @@
+""" Plugin Discovery Tests """
+import json
+import os
+import sys
+import pytest
+from calculator.discovery import PluginCatalog, find_command_class
+
+PLUGIN_SOURCE = '''
+class Helper:
+    pass
+
+class {name}Command:
+    def execute(self, *args):
+        return "{name}"
+
+    def show_help(self):
+        pass
+'''
+
+@pytest.fixture
+def plugin_package(tmp_path, monkeypatch):
+    """A throwaway plugin package on sys.path."""
+    package = tmp_path / "fakeplugins"
+    package.mkdir()
+    (package / "__init__.py").write_text("", encoding='utf-8')
+    (package / "power.py").write_text(PLUGIN_SOURCE.format(name="Power"), encoding='utf-8')
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield package
+    for module in [name for name in sys.modules if name.startswith("fakeplugins")]:
+        del sys.modules[module]
+
+def test_find_command_class():
+    """The command class is found from the source without importing it."""
+    assert find_command_class(PLUGIN_SOURCE.format(name="Power"), "power") == "PowerCommand"
+    assert find_command_class("class Helper:\n    pass\n", "helper") is None
+
+def test_catalog_imports_on_first_use(plugin_package):
+    """Discovery does not import plugins, looking one up does."""
+    catalog = PluginCatalog("fakeplugins", str(plugin_package))
+    assert list(catalog) == ["power"]
+    assert "fakeplugins.power" not in sys.modules
+
+    assert catalog["power"]().execute() == "Power"
+    assert "fakeplugins.power" in sys.modules
+    with pytest.raises(KeyError):
+        catalog["missing"]  # pylint: disable=pointless-statement
+
+def test_manifest_is_cached_and_invalidated(plugin_package):
+    """The manifest is written once and picks up new or changed plugin files."""
+    catalog = PluginCatalog("fakeplugins", str(plugin_package))
+    with open(catalog.manifest_path, 'r', encoding='utf-8') as f:
+        assert json.load(f)["modules"]["power"]["class"] == "PowerCommand"
+
+    (plugin_package / "root.py").write_text(PLUGIN_SOURCE.format(name="Root"), encoding='utf-8')
+    catalog.refresh()
+    assert "root" in catalog
+
+    os.remove(plugin_package / "power.py")
+    catalog.refresh()
+    assert list(catalog) == ["root"]
@@ -0,0 +1,59 @@
+""" Command Executor Tests """
+from decimal import Decimal
+import pytest
+from calculator.executor import CommandExecutor, operand_cost
+from calculator.factory import CommandFactory
+
+@pytest.mark.parametrize("mode", ["inline", "thread", "process"])
+def test_execute_records_history_in_parent(calculator, mode):
+    """Every mode returns the result and records history on the session calculator."""
+    command = CommandFactory.create_command("add", calculator)
+    with CommandExecutor(mode=mode, max_workers=1) as executor:
+        result = executor.execute(command, Decimal('5'), Decimal('7'))
+        executor.execute(command, Decimal('1'), Decimal('2'))
+
+    assert result == Decimal('12')
+    assert calculator.history.shape[0] == 2
+    assert calculator.history.iloc[0]['operation'] == "add"
+
+def test_pool_is_reused(calculator):
+    """The worker pool is created once and reused across commands."""
+    command = CommandFactory.create_command("multiply", calculator)
+    executor = CommandExecutor(mode="thread", max_workers=1)
+    executor.execute(command, Decimal('2'), Decimal('3'))
+    pool = executor._pool  # pylint: disable=protected-access
+    executor.execute(command, Decimal('4'), Decimal('5'))
+    assert executor._pool is pool  # pylint: disable=protected-access
+    executor.shutdown()
+    assert executor._pool is None  # pylint: disable=protected-access
+
+def test_cheap_operations_run_inline(calculator):
+    """Operations below the cutoff never start a pool."""
+    command = CommandFactory.create_command("subtract", calculator)
+    with CommandExecutor(mode="process", inline_cutoff=10) as executor:
+        assert executor.execute(command, Decimal('9'), Decimal('4')) == Decimal('5')
+        assert executor._pool is None  # pylint: disable=protected-access
+
+def test_process_mode_propagates_errors(calculator):
+    """Errors raised in a worker process reach the caller."""
+    command = CommandFactory.create_command("divide", calculator)
+    with CommandExecutor(mode="process", max_workers=1) as executor:
+        with pytest.raises(ZeroDivisionError):
+            executor.execute(command, Decimal('1'), Decimal('0'))
+
+def test_operand_cost():
+    """Cost is the number of digits across operands."""
+    assert operand_cost([Decimal('123'), Decimal('4.5')]) == 5
+
+def test_unknown_mode():
+    """An unknown mode is rejected."""
+    with pytest.raises(ValueError):
+        CommandExecutor(mode="gpu")
+
+def test_from_env(monkeypatch):
+    """Settings are read from the environment."""
+    monkeypatch.setenv('CALC_EXECUTOR', 'thread')
+    monkeypatch.setenv('CALC_WORKERS', '2')
+    monkeypatch.setenv('CALC_INLINE_CUTOFF', '8')
+    executor = CommandExecutor.from_env()
+    assert (executor.mode, executor.max_workers, executor.inline_cutoff) == ("thread", 2, 8)
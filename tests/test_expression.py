@@ -0,0 +1,60 @@
+""" Expression Engine Tests """
+from decimal import Decimal
+import pytest
+from calculator.expression import ExpressionEngine, compile_expression
+
+def test_expression_precedence_and_literals(calculator):
+    """Operator precedence, parentheses and unary minus follow the usual rules with exact decimals."""
+    engine = ExpressionEngine(calculator)
+    assert engine.evaluate("(1 + 2) * 3 - 4 / 2") == Decimal("7")
+    assert engine.evaluate("0.1 + 0.2") == Decimal("0.3")
+    assert engine.evaluate("-(2 - 5)") == Decimal("3")
+
+def test_compiled_expression_is_reused():
+    """Spelling variants share one compiled expression that evaluates with new bindings."""
+    expression = compile_expression("(a + b) * c")
+    assert compile_expression("(a + b)  * c") is compile_expression("(a + b) * c")
+    assert expression.variables == ("a", "b", "c")
+    assert expression.evaluate({"a": 1, "b": 2, "c": 3}) == Decimal("9")
+    assert expression.evaluate({"a": Decimal("0.5"), "b": 0.5, "c": 10}) == Decimal("10")
+    with pytest.raises(ValueError, match="Unbound variable"):
+        expression.evaluate({"a": 1})
+
+def test_history_recorded_once_per_expression(calculator):
+    """Only the top-level expression is recorded, with the variable values as operands."""
+    engine = ExpressionEngine(calculator)
+    assert engine.evaluate("(a + b) * c / d", a=1, b=2, c=4, d=3) == Decimal(4)
+    assert calculator.get_history() == [
+        {"operation": "eval", "operands": "=(a+b)*c/d 1 2 4 3", "result": Decimal(4)},
+    ]
+    assert calculator.history_stats()["eval"]["operands"]["sum"] == Decimal(10)
+
+def test_session_variables(calculator):
+    """let-style bindings are available to later expressions."""
+    engine = ExpressionEngine(calculator)
+    assert engine.assign("x", "2 * 3") == Decimal(6)
+    assert engine.assign("y", "-1.5") == Decimal("-1.5")
+    assert engine.evaluate("x + y") == Decimal("4.5")
+    # Binding a plain number calculates nothing and is not recorded
+    assert [entry["operands"] for entry in calculator.get_history()] == ["=2*3", "=x+y 6 -1.5"]
+    with pytest.raises(ValueError):
+        engine.assign("2x", "1")
+
+def test_nary_operations(calculator):
+    """add 1 2 3 folds left to right through the plugin and records one entry."""
+    engine = ExpressionEngine(calculator)
+    assert engine.apply("add", [Decimal(1), Decimal(2), Decimal(3), Decimal(4)]) == Decimal(10)
+    assert engine.apply("subtract", [Decimal(10), Decimal(2), Decimal(3)]) == Decimal(5)
+    assert len(calculator.get_history()) == 2
+    assert calculator.get_history()[0]["operands"] == "1 2 3 4"
+    with pytest.raises(ZeroDivisionError):
+        engine.apply("divide", [Decimal(1), Decimal(2), Decimal(0)])
+    with pytest.raises(ValueError):
+        engine.apply("history", [Decimal(1), Decimal(2), Decimal(3)])
+
+@pytest.mark.parametrize("source", ["1 ** 2", "a(1)", "1 +", "True + 1", "'1' + 2"])
+def test_invalid_expressions(calculator, source):
+    """Syntax outside the four arithmetic operators is rejected before anything runs."""
+    with pytest.raises(ValueError):
+        ExpressionEngine(calculator).evaluate(source)
+    assert calculator.get_history() == []
@@ -0,0 +1,110 @@
+""" History File Format Tests """
+import os
+import pandas as pd
+import pytest
+from calculator import Calculator
+from calculator.storage import FlushPolicy, file_format, open_history_file, part_paths, read_history, write_history
+from calculator.storage.binary_file import BINARY_MIN_BATCH
+
+@pytest.fixture
+def frame():
+    """A small history DataFrame."""
+    return pd.DataFrame({
+        "operation": ["add", "divide"],
+        "operands": ["5 7", "10 12"],
+        "result": ["12", "0.8333333333333333333333333333"],
+    })
+
+def test_file_format():
+    """The extension picks the format, anything unknown is CSV."""
+    assert file_format("data/history.npz") == "npz"
+    assert file_format("data/history.PARQUET") == "parquet"
+    assert file_format("data/history.csv") == "csv"
+    assert file_format("data/history") == "csv"
+
+def test_npz_round_trip_and_projection(tmp_path, frame):
+    """An npz file keeps exact strings and can load a subset of columns."""
+    path = str(tmp_path / 'history.npz')
+    write_history(path, frame)
+
+    loaded = read_history(path)
+    assert loaded.to_dict(orient='records') == frame.to_dict(orient='records')
+    assert list(read_history(path, ["result"]).columns) == ["result"]
+
+def test_parquet_round_trip(tmp_path, frame):
+    """Parquet is used when pyarrow is available."""
+    pytest.importorskip("pyarrow")
+    path = str(tmp_path / 'history.parquet')
+    write_history(path, frame)
+    assert read_history(path).to_dict(orient='records') == frame.to_dict(orient='records')
+
+def test_binary_history_file_appends(tmp_path):
+    """Buffered rows are added to an existing binary file."""
+    path = str(tmp_path / 'history.npz')
+    history_file = open_history_file(path)
+    history_file.append(("add", "1 2", "3"))
+    history_file.append(("add", "2 2", "4"))
+    history_file.close()
+    reopened = open_history_file(path)
+    reopened.append(("multiply", "2 3", "6"))
+    reopened.close()
+    assert read_history(path)["operation"].tolist() == ["add", "add", "multiply"]
+
+def test_binary_history_file_batches_flushes(tmp_path):
+    """A binary file is written once per BINARY_MIN_BATCH entries, not once per entry."""
+    path = str(tmp_path / 'history.npz')
+    policy = FlushPolicy(max_entries=1)
+    history_file = open_history_file(path, policy)
+    for i in range(BINARY_MIN_BATCH - 1):
+        history_file.append(("add", f"{i} 1", str(i + 1)))
+    assert history_file.pending == BINARY_MIN_BATCH - 1 and not os.path.exists(path)
+    history_file.append(("add", "0 0", "0"))
+    assert history_file.pending == 0 and len(read_history(path)) == BINARY_MIN_BATCH
+    assert policy.max_entries == 1  # The caller's policy is left alone
+
+def test_binary_flushes_write_parts(tmp_path):
+    """Each flush writes a part instead of rewriting the file; parts are merged, cut and compacted in order."""
+    path = str(tmp_path / 'history.npz')
+    calc = Calculator(history_file=path, flush_policy=FlushPolicy(max_entries=BINARY_MIN_BATCH))
+    for i in range(BINARY_MIN_BATCH):
+        calc.add_to_history("add", [i, 1], i + 1)
+    base = os.stat(path)
+    for i in range(BINARY_MIN_BATCH, BINARY_MIN_BATCH + 2):
+        calc.add_to_history("add", [i, 1], i + 1)
+    calc.save_history()
+    # The two new entries went to a part, the history file was left alone
+    assert len(part_paths(path)) == 1 and os.stat(path).st_mtime_ns == base.st_mtime_ns
+    assert read_history(path)["operands"].tolist()[-3:] == [f"{BINARY_MIN_BATCH - 1} 1", f"{BINARY_MIN_BATCH} 1",
+                                                             f"{BINARY_MIN_BATCH + 1} 1"]
+
+    calc.delete_last_calculation(3)  # The whole part and one entry of the history file
+    assert part_paths(path) == [] and len(read_history(path)) == BINARY_MIN_BATCH - 1
+
+    for i in range(5 * BINARY_MIN_BATCH):
+        calc.add_to_history("multiply", [i, 2], i * 2)
+    calc.save_history()
+    assert 1 <= len(part_paths(path)) <= 3  # Equal sized parts are merged as they pile up
+    assert len(read_history(path)) == 6 * BINARY_MIN_BATCH - 1
+    assert calc.compact_history() >= 1 and part_paths(path) == []
+    assert read_history(path)["operation"].tolist() == ["add"] * (BINARY_MIN_BATCH - 1) + ["multiply"] * (
+        5 * BINARY_MIN_BATCH)
+
+    calc.add_to_history("add", [1, 1], 2)
+    calc.save_history()
+    calc.clear_history()
+    assert not os.path.exists(path) and part_paths(path) == []
+
+def test_convert_csv_to_npz_and_back(tmp_path):
+    """Saving with a different extension converts the active history."""
+    csv_path = str(tmp_path / 'history.csv')
+    npz_path = str(tmp_path / 'history.npz')
+    calc = Calculator(history_file=csv_path)
+    calc.add_to_history("add", [1, 2], 3)
+    calc.save_as_new_file(npz_path)
+
+    calc.load_history(npz_path)
+    assert calc.active_history_file == npz_path
+    calc.add_to_history("subtract", [5, 1], 4)
+    calc.delete_last_calculation()
+    assert read_history(npz_path)["operation"].tolist() == ["add"]
+    assert calc.history.iloc[0]["operands"] == "1 2"
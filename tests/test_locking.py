@@ -0,0 +1,67 @@
+""" History File Locking Tests """
+import os
+import threading
+from decimal import Decimal
+import pytest
+from benchmarks.concurrent_writers import run
+from calculator import Calculator
+from calculator.storage import FlushPolicy, atomic_write, file_lock, migrate_sidecars
+from calculator.storage.locking import lock_path
+
+def test_file_lock_is_reentrant(tmp_path):
+    """Nested locks on one path in one thread do not deadlock, and the lock file sits in the sidecar folder."""
+    path = str(tmp_path / "history.csv")
+    with file_lock(path):
+        with file_lock(path, shared=True):
+            pass
+    assert os.path.isfile(lock_path(path))
+    assert lock_path(path) == str(tmp_path / ".calculator" / "history.csv.lock")
+    assert os.listdir(tmp_path) == [".calculator"]
+
+def test_legacy_sidecars_are_moved(tmp_path):
+    """Sidecar dotfiles beside a history file are moved into the sidecar folder when it is opened."""
+    path = str(tmp_path / "history.csv")
+    for suffix in ("lock", "stats.json", "snapshot.json"):
+        (tmp_path / f".history.csv.{suffix}").write_text("{}", encoding='utf-8')
+    assert migrate_sidecars(path) and not migrate_sidecars(path)
+    assert sorted(os.listdir(tmp_path)) == [".calculator"]
+    assert sorted(os.listdir(tmp_path / ".calculator")) == ["history.csv.lock", "history.csv.snapshot.json",
+                                                           "history.csv.stats.json"]
+
+def test_atomic_write_keeps_original_on_failure(tmp_path):
+    """A failed rewrite leaves the old file untouched and no temporary file behind."""
+    path = tmp_path / "history.csv"
+    path.write_text("old\n", encoding='utf-8')
+    with pytest.raises(RuntimeError):
+        with atomic_write(str(path)) as temp_path:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write("half")
+            raise RuntimeError("disk full")
+    assert path.read_text(encoding='utf-8') == "old\n"
+    assert os.listdir(tmp_path) == ["history.csv"]
+
+def test_threads_sharing_a_calculator(tmp_path):
+    """Entries added from many threads stay aligned in memory and all reach the file."""
+    calc = Calculator(history_file=str(tmp_path / "history.csv"), flush_policy=FlushPolicy(max_entries=7))
+
+    def worker(tag):
+        for sequence in range(200):
+            calc.add_to_history("add", [Decimal(tag), Decimal(sequence)], Decimal(tag + sequence))
+
+    threads = [threading.Thread(target=worker, args=(tag,)) for tag in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    calc.close()
+
+    records = calc.get_history()
+    assert len(records) == 1600
+    assert all(sum(Decimal(value) for value in record["operands"].split()) == record["result"] for record in records)
+    assert len(Calculator(history_file=str(tmp_path / "history.csv")).get_history()) == 1600
+
+@pytest.mark.parametrize("flush_every", [1, 25])
+def test_concurrent_writer_processes_lose_nothing(tmp_path, flush_every):
+    """Several processes with several threads each append to one file without losing or tearing records."""
+    report = run(str(tmp_path / "history.csv"), processes=3, threads=2, records=150, flush_every=flush_every)
+    assert report["ok"], report
@@ -0,0 +1,61 @@
+""" Logging Setup Tests """
+import logging
+import os
+import threading
+import pytest
+from calculator.log import configure_logging, file_handler, stop_logging
+
+class CountingValue:
+    """Argument that counts how often it is formatted."""
+    def __init__(self):
+        self.formatted = 0
+
+    def __str__(self):
+        self.formatted += 1
+        return "value"
+
+@pytest.fixture
+def log_file(tmp_path):
+    """Path of a log file whose setup is torn down after the test."""
+    yield str(tmp_path / "logs" / "calc.log")
+    stop_logging()
+
+def test_disabled_levels_are_not_formatted(log_file):
+    """Arguments of records below the level are never turned into text, enabled ones reach the file."""
+    configure_logging("prod", log_file)
+    logger = logging.getLogger('calculator_app')
+    hidden, shown = CountingValue(), CountingValue()
+    logger.info("Executed Add: %s", hidden)
+    logger.warning("Kept: %s", shown)
+    stop_logging()
+    assert hidden.formatted == 0
+    assert shown.formatted >= 1
+    with open(log_file, 'r', encoding='utf-8') as f:
+        assert f.read().endswith(" - WARNING - Kept: value\n")
+
+def test_file_is_written_off_the_calling_thread(log_file, monkeypatch):
+    """The file handler runs on the listener thread, not on the thread that logs."""
+    threads = []
+    original_emit = logging.handlers.RotatingFileHandler.emit
+    def emit(handler, record):
+        threads.append(threading.current_thread())
+        original_emit(handler, record)
+    monkeypatch.setattr(logging.handlers.RotatingFileHandler, "emit", emit)
+    configure_logging("dev", log_file)
+    logging.getLogger('calculator_app').debug("Added to history: %s", "add")
+    stop_logging()
+    assert threads and threads[0] is not threading.current_thread()
+
+def test_size_rotation(log_file):
+    """A full log file is rolled over into numbered backups, keeping at most the configured number."""
+    configure_logging("uat", log_file, max_bytes=500, backups=2)
+    for number in range(100):
+        logging.getLogger('calculator_app').info("Entry %s", number)
+    stop_logging()
+    assert sorted(os.listdir(os.path.dirname(log_file))) == ["calc.log", "calc.log.1", "calc.log.2"]
+    assert os.path.getsize(log_file) <= 500
+
+def test_unknown_rotation(tmp_path):
+    """Rotation modes other than size, time or none are rejected."""
+    with pytest.raises(ValueError):
+        file_handler(str(tmp_path / "calc.log"), rotation="weekly")
@@ -0,0 +1,95 @@
+""" Instrumentation Tests """
+import json
+from decimal import Decimal
+import dotenv
+import pytest
+from calculator import Calculator
+from calculator.executor import CommandExecutor
+from calculator.log import stop_logging
+from calculator.metrics import METRICS, Histogram, Metrics, TimedCommand
+from calculator.registry import CommandRegistry
+from calculator.storage import iter_rows
+
+@pytest.fixture
+def metrics():
+    """Enable instrumentation for one test, starting from nothing recorded."""
+    METRICS.reset()
+    CommandRegistry.enable_metrics()
+    yield METRICS
+    CommandRegistry.disable_metrics()
+    METRICS.reset()
+
+def test_histogram_quantiles():
+    """Durations fall into their buckets and quantiles never exceed the largest duration."""
+    histogram = Histogram()
+    for seconds in [0.0001] * 90 + [0.02] * 10:
+        histogram.observe(seconds)
+    summary = histogram.summary()
+    assert summary["count"] == 100
+    assert summary["p50"] == 0.0001
+    assert summary["p99"] == 0.02
+    assert summary["buckets"] == {"0.0001": 90, "0.025": 10}
+
+def test_disabled_records_nothing(tmp_path):
+    """Commands are not wrapped and history I/O is not timed while instrumentation is off."""
+    calculator = Calculator(history_file=str(tmp_path / "history.csv"))
+    command = CommandRegistry(calculator).get("add")
+    assert not isinstance(command, TimedCommand)
+    command.execute(Decimal(1), Decimal(2))
+    calculator.save_history()
+    assert METRICS.snapshot() == {}
+
+def test_commands_and_history_are_timed(tmp_path, metrics):
+    """Calls, errors and latency are recorded per command and per history operation."""
+    calculator = Calculator(history_file=str(tmp_path / "history.csv"))
+    registry = CommandRegistry(calculator)
+    assert isinstance(registry.get("divide"), TimedCommand)
+    with CommandExecutor("thread") as executor:
+        assert executor.execute(registry.get("add"), Decimal(1), Decimal(2)) == 3
+    registry.get("divide").execute(Decimal(4), Decimal(2))
+    with pytest.raises(ZeroDivisionError):
+        registry.get("divide").execute(Decimal(1), Decimal(0))
+    calculator.save_history()
+
+    snapshot = metrics.snapshot()
+    assert snapshot["command"]["divide"]["counters"] == {"calls": 2, "errors": 1}
+    assert snapshot["command"]["divide"]["latency"]["count"] == 2
+    assert snapshot["command"]["add"]["counters"] == {"calls": 1}
+    assert snapshot["history"]["append"]["counters"]["calls"] == 2
+    assert "save" in snapshot["history"]
+
+def test_exports():
+    """JSON and Prometheus exports carry the same counts."""
+    metrics = Metrics()
+    metrics.observe("command", "add", 0.003)
+    metrics.count("command", "add", "calls")
+    metrics.count("cache", 'we"ird', "hits", 2)
+    assert json.loads(metrics.export("json"))["metrics"]["command"]["add"]["counters"] == {"calls": 1}
+    text = metrics.export("prometheus")
+    assert '# TYPE calculator_command_seconds histogram' in text
+    assert 'calculator_command_seconds_bucket{command="add",le="0.0025"} 0' in text
+    assert 'calculator_command_seconds_bucket{command="add",le="+Inf"} 1' in text
+    assert 'calculator_command_calls_total{command="add"} 1' in text
+    assert 'calculator_cache_hits_total{command="we\\"ird"} 2' in text
+    with pytest.raises(ValueError):
+        metrics.export("xml")
+
+def test_repl_history_subcommands_with_metrics_on(tmp_path, monkeypatch, capsys):
+    """History subcommands that take keyword options still run once 'stats on' wraps every command."""
+    monkeypatch.chdir(tmp_path)  # The REPL keeps its history under data/ and its log under logs/
+    monkeypatch.setattr(dotenv, "load_dotenv", lambda *args, **kwargs: False)
+    import main  # pylint: disable=import-outside-toplevel
+    lines = iter(["", "stats on", "add 1 2", "divide 6 3", "multiply 2 2", "history query --op divide",
+                  "history show --tail 1", "history delete 1", "history show", "exit"])
+    monkeypatch.setattr("builtins.input", lambda prompt="": next(lines))
+    try:
+        main.repl()
+    finally:
+        CommandRegistry.disable_metrics()
+        METRICS.reset()
+        stop_logging()
+
+    output = capsys.readouterr().out
+    assert "unexpected keyword" not in output and "An error occurred" not in output
+    assert "divide" in output
+    assert [row[2] for row in iter_rows(str(tmp_path / "data" / "history.csv"))] == ["3", "2"]
@@ -0,0 +1,83 @@
+""" Numeric Backend Tests """
+from decimal import Decimal
+from fractions import Fraction
+import pytest
+from calculator import Calculator
+from calculator.batch import run_batch
+from calculator.expression import ExpressionEngine
+from calculator.factory import CommandFactory
+from calculator.numeric import decode_number, encode_number, get_backend
+from calculator.operands import decode_operands
+from calculator.server import Session
+
+@pytest.mark.parametrize("value", [Decimal("0.1"), Decimal("-3E+5"), 0.1, 3.0, float("inf"), Fraction(1, 3),
+                                   Fraction(4)])
+def test_encoding_round_trip(value):
+    """Every number comes back from its encoded form with the same type and value."""
+    decoded = decode_number(encode_number(value))
+    assert type(decoded) is type(value)
+    assert decoded == value
+
+@pytest.mark.parametrize("extension", ["csv", "db", "npz"])
+def test_results_read_the_same_before_and_after_a_reload(tmp_path, extension, capsys):
+    """get_history and history show give the same numbers, of the same types, for a session and its reload."""
+    path = str(tmp_path / f"history.{extension}")
+    calculator = Calculator(history_file=path)
+    calculator.add_to_history("add", [0.1, 0.2], 0.1 + 0.2)
+    calculator.add_to_history("divide", [Fraction(1), Fraction(3)], Fraction(1, 3))
+    calculator.add_to_history("multiply", [Decimal("1.5"), Decimal(2)], Decimal("3.0"))
+    before = calculator.get_history()
+    calculator.show_history()
+    shown = capsys.readouterr().out
+    calculator.close()
+
+    reloaded = Calculator(history_file=path)
+    after = reloaded.get_history()
+    assert after == before
+    assert [type(record["result"]) for record in after] == [float, Fraction, Decimal]
+    assert list(reloaded.history["result"]) == [0.1 + 0.2, Fraction(1, 3), Decimal("3.0")]
+    reloaded.show_history()
+    assert capsys.readouterr().out == shown
+    assert "0.1        0.2        0.30000000000000004" in shown
+    assert "1          3          1/3" in shown
+
+def test_plugins_follow_operand_type(tmp_path):
+    """The arithmetic commands work on floats and fractions, and reject mixed types."""
+    calculator = Calculator(history_file=str(tmp_path / "history.csv"))
+    divide = CommandFactory.create_command("divide", calculator)
+    assert divide.execute(Fraction(1), Fraction(3)) == Fraction(1, 3)
+    assert divide.execute(1.0, 4.0) == 0.25
+    with pytest.raises(TypeError):
+        divide.execute(Decimal(1), 4.0)
+    calculator.save_history()
+    # History keeps the types, so a reload reads the same numbers back
+    reloaded = Calculator(history_file=str(tmp_path / "history.csv"))
+    assert [decode_operands(operands) for operands in reloaded.store.column("operands")] == [
+        [Fraction(1), Fraction(3)], [1.0, 4.0]]
+    assert [decode_number(result) for result in reloaded.store.column("result")] == [Fraction(1, 3), 0.25]
+    assert reloaded.history_stats()["divide"]["results"]["max"] == Decimal("0.3333333333333333333333333333")
+
+def test_decimal_precision(tmp_path):
+    """The decimal backend rounds results to its precision and rounding mode."""
+    backend = get_backend("decimal", precision=5, rounding="down")
+    calculator = Calculator(history_file=str(tmp_path / "history.csv"), backend=backend)
+    with backend.active():
+        assert ExpressionEngine(calculator).evaluate("2 / 3") == Decimal("0.66666")
+    with pytest.raises(ValueError):
+        get_backend("decimal", rounding="sideways")
+    with pytest.raises(ValueError):
+        get_backend("complex")
+
+def test_backend_per_session(tmp_path):
+    """Expressions, batches and server sessions parse input with the calculator's backend."""
+    calculator = Calculator(history_file=str(tmp_path / "history.csv"), backend=get_backend("fraction"))
+    assert ExpressionEngine(calculator).evaluate("1 / 3 + x", x=Fraction(1, 6)) == Fraction(1, 2)
+    report = run_batch(calculator, ["add 1/3 1/6", "multiply 0.5 4"], quiet=True)
+    assert report.succeeded == 2
+    assert [record["result"] for record in calculator.get_history()[-2:]] == [Fraction(1, 2), Fraction(2)]
+
+    session = Session(1, str(tmp_path))
+    assert session.handle_many(["backend float", "divide 1 4", "backend fraction", "divide 1 3",
+                                "backend decimal 3", "divide 1 3"]) == [
+        "OK float", "OK 0.25", "OK fraction", "OK 1/3", "OK decimal", "OK 0.333"]
+    session.close()
@@ -0,0 +1,40 @@
+""" Operand Encoding and Migration Tests """
+from decimal import Decimal
+from calculator import Calculator
+from calculator.operands import decode_operands, encode_operands, parse_legacy_operands
+from calculator.storage import migrate_legacy_csv
+
+def test_encode_decode_round_trip():
+    """Operands survive encoding exactly."""
+    operands = [Decimal('5'), Decimal('-0.10'), Decimal('1E+3')]
+    assert encode_operands(operands) == "5 -0.10 1E+3"
+    assert decode_operands(encode_operands(operands)) == operands
+
+def test_parse_legacy_operands():
+    """Old str(list) values are converted without eval."""
+    assert parse_legacy_operands("[Decimal('5'), Decimal('7')]") == "5 7"
+    assert parse_legacy_operands("'[Decimal('5'), Decimal('3')]'") == "5 3"
+    assert parse_legacy_operands("[1, 2]") == "1 2"
+
+def test_migrate_legacy_csv(tmp_path):
+    """A legacy file is rewritten once in the encoded format."""
+    path = tmp_path / 'history.csv'
+    path.write_text("operation,operands,result\n"
+                    "add,\"[Decimal('5'), Decimal('7')]\",12\n"
+                    "divide,\"[Decimal('10'), Decimal('4')]\",2.5\n", encoding='utf-8')
+
+    assert migrate_legacy_csv(str(path))
+    assert path.read_text(encoding='utf-8') == "operation,operands,result\nadd,5 7,12\ndivide,10 4,2.5\n"
+    assert not migrate_legacy_csv(str(path))
+
+def test_show_history_after_migration(tmp_path, capsys):
+    """Legacy history loads and displays with exact operands and results."""
+    path = tmp_path / 'history.csv'
+    path.write_text("operation,operands,result\n"
+                    "divide,\"[Decimal('10'), Decimal('12')]\",0.8333333333333333333333333333\n", encoding='utf-8')
+    calc = Calculator(history_file=str(path))
+    calc.show_history()
+    captured = capsys.readouterr()
+    assert "divide" in captured.out
+    assert "0.8333333333333333333333333333" in captured.out
+    assert calc.history.iloc[0]['operands'] == "10 12"
@@ -0,0 +1,55 @@
+""" Paginated History Reader Tests """
+import pytest
+from calculator import Calculator
+from calculator.storage import head_rows, page_rows, tail_rows
+from calculator.storage import reader
+
+@pytest.fixture
+def history_path(tmp_path):
+    """A CSV history file with 100 entries."""
+    path = tmp_path / 'history.csv'
+    lines = ["operation,operands,result"] + [f"add,{i} 1,{i + 1}" for i in range(100)]
+    path.write_text("\n".join(lines) + "\n", encoding='utf-8')
+    return str(path)
+
+def test_head_rows(history_path):
+    """The first rows come back in order."""
+    assert head_rows(history_path, 2) == [("add", "0 1", "1"), ("add", "1 1", "2")]
+
+def test_page_rows(history_path):
+    """Pages are 1-based and the last one may be short."""
+    assert page_rows(history_path, 2, 10)[0] == ("add", "10 1", "11")
+    assert len(page_rows(history_path, 4, 30)) == 10
+    assert not page_rows(history_path, 5, 30)
+
+@pytest.mark.parametrize("block_size", [8, 64, 65536])
+def test_tail_rows(history_path, monkeypatch, block_size):
+    """The last rows are found by seeking backwards, whatever the block size."""
+    monkeypatch.setattr(reader, "BLOCK_SIZE", block_size)
+    assert tail_rows(history_path, 3) == [("add", "97 1", "98"), ("add", "98 1", "99"), ("add", "99 1", "100")]
+    assert len(tail_rows(history_path, 500)) == 100
+    assert not tail_rows(history_path, 0)
+
+def test_show_history_tail(history_path, capsys):
+    """show_history prints only the requested entries."""
+    calc = Calculator(history_file=history_path)
+    calc.show_history(tail=2)
+    output = capsys.readouterr().out
+    assert "99    add             98" in output
+    assert "100   add             99" in output
+    assert " 97 " not in output
+
+def test_show_history_page(history_path, capsys):
+    """Page indexes continue from the previous page."""
+    calc = Calculator(history_file=history_path)
+    calc.show_history(page=3, page_size=5)
+    output = capsys.readouterr().out
+    assert "11    add" in output
+    assert "16    add" not in output
+
+def test_show_history_page_size_alone(history_path, capsys):
+    """A page size without a page number shows the first page."""
+    Calculator(history_file=history_path).show_history(page_size=3)
+    output = capsys.readouterr().out
+    assert "3     add" in output
+    assert "4     add" not in output
@@ -0,0 +1,84 @@
+""" Command Registry Tests """
+import os
+import sys
+import pytest
+from calculator.cache import CachedCommand
+from calculator.discovery import PluginCatalog
+from calculator.executor import CommandExecutor
+from calculator.registry import CommandRegistry
+
+PLUGIN_SOURCE = '''
+class PowerCommand:
+    def __init__(self, calculator):
+        self.calculator = calculator
+
+    def execute(self, *args):
+        return "{version}"
+
+    def show_help(self):
+        pass
+'''
+
+@pytest.fixture
+def fake_catalog(tmp_path, monkeypatch):
+    """Point the registry at a throwaway plugin package."""
+    package = tmp_path / "registryplugins"
+    package.mkdir()
+    (package / "__init__.py").write_text("", encoding='utf-8')
+    (package / "power.py").write_text(PLUGIN_SOURCE.format(version="v1"), encoding='utf-8')
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setattr(CommandRegistry, "_catalog", PluginCatalog("registryplugins", str(package)))
+    yield package
+    for module in [name for name in sys.modules if name.startswith("registryplugins")]:
+        del sys.modules[module]
+
+def test_get_reuses_instances(calculator):
+    """Each command is created once per registry and bound to its calculator."""
+    registry = CommandRegistry(calculator)
+    add_command = registry.get("add")
+    assert registry.get("add") is add_command
+    assert add_command.calculator is calculator
+    assert CommandRegistry(calculator).get("add") is not add_command
+    with pytest.raises(ValueError, match="Unknown command"):
+        registry.get("modulo")
+
+def test_load_times_are_recorded(calculator):
+    """Importing a plugin records how long it took."""
+    CommandRegistry(calculator).get("multiply")
+    assert CommandRegistry.load_times()["multiply"] >= 0
+
+def test_result_cache_toggle_drops_instances(calculator):
+    """Instances created before the cache was enabled are replaced by cached ones."""
+    registry = CommandRegistry(calculator)
+    assert not isinstance(registry.get("add"), CachedCommand)
+    CommandRegistry.enable_result_cache(maxsize=4)
+    try:
+        assert isinstance(registry.get("add"), CachedCommand)
+    finally:
+        CommandRegistry.disable_result_cache()
+    assert not isinstance(registry.get("add"), CachedCommand)
+
+def touch_plugin(path, version):
+    """Rewrite a plugin file with a later modification time, so the change is visible on coarse clocks."""
+    path.write_text(PLUGIN_SOURCE.format(version=version), encoding='utf-8')
+    mtime = os.path.getmtime(path) + 5
+    os.utime(path, (mtime, mtime))
+
+def test_reload_changed_plugin(calculator, fake_catalog):
+    """Editing a plugin file and reloading replaces the live instance with the new code."""
+    registry = CommandRegistry(calculator)
+    assert registry.get("power").execute() == "v1"
+    assert CommandRegistry.reload_changed() == []
+
+    touch_plugin(fake_catalog / "power.py", "v2")
+    assert CommandRegistry.reload_changed() == ["power"]
+    assert registry.get("power").execute() == "v2"
+
+def test_reload_reaches_worker_processes(calculator, fake_catalog):
+    """After a reload, commands run in process mode use the new plugin code instead of the workers' old copy."""
+    registry = CommandRegistry(calculator)
+    with CommandExecutor(mode="process", max_workers=1) as executor:
+        assert executor.execute(registry.get("power"), 1) == "v1"
+        touch_plugin(fake_catalog / "power.py", "v2")
+        assert CommandRegistry.reload_changed(executor) == ["power"]
+        assert executor.execute(registry.get("power"), 1) == "v2"
@@ -0,0 +1,74 @@
+""" Segmented History Tests """
+import json
+import os
+from decimal import Decimal
+import pytest
+from calculator import Calculator
+from calculator.storage import FlushPolicy, SegmentPolicy, iter_rows, read_columns, segment_paths, tail_rows
+from calculator.storage.background import wait_for_background
+from calculator.storage.segments import manifest_path
+
+def segmented(tmp_path, **limits):
+    """Return a history path and a calculator on it that seals segments with the given limits."""
+    path = str(tmp_path / 'history.csv')
+    return path, Calculator(history_file=path, flush_policy=FlushPolicy(segments=SegmentPolicy(**limits)))
+
+def add_entries(calc, start, stop):
+    """Record add entries for start..stop-1, each with result i + 1."""
+    for i in range(start, stop):
+        calc.add_to_history("add", [Decimal(i), Decimal(1)], Decimal(i + 1))
+
+def results(path):
+    """Results of every entry on disk, oldest first."""
+    return [row[2] for row in iter_rows(path)]
+
+@pytest.mark.parametrize("limits", [{"max_rows": 3}, {"max_bytes": 40}])
+def test_active_file_is_sealed(tmp_path, limits):
+    """A full active file becomes a segment; reads still see every entry in order."""
+    path, calc = segmented(tmp_path, **limits)
+    add_entries(calc, 0, 8)
+    calc.close()
+
+    assert len(segment_paths(path)) >= 2
+    assert results(path) == [str(i) for i in range(1, 9)]
+    assert read_columns(path)["result"] == results(path)
+    assert [row[2] for row in tail_rows(path, 5)] == ["4", "5", "6", "7", "8"]
+
+def test_delete_reaches_into_sealed_segments(tmp_path):
+    """Deleting more entries than the active file holds continues in the newest segments."""
+    path, calc = segmented(tmp_path, max_rows=3)
+    add_entries(calc, 0, 7)
+    calc.delete_last_calculation(5)
+    calc.close()
+
+    assert results(path) == ["1", "2"]
+    assert len(segment_paths(path)) == 1
+    assert len(Calculator(history_file=path).store) == 2
+
+def test_retention_keeps_newest_segments(tmp_path):
+    """Only the newest keep segments stay, and a reopened history defers them until needed."""
+    path, calc = segmented(tmp_path, max_rows=2, keep=2)
+    add_entries(calc, 0, 9)
+    calc.close()
+
+    assert results(path) == ["5", "6", "7", "8", "9"]
+    assert json.load(open(manifest_path(path), encoding='utf-8'))["expired"] == 4
+    path, reopened = segmented(tmp_path, max_rows=2, keep=2)
+    assert not reopened.store.loaded
+    add_entries(reopened, 9, 12)  # Seals again, expiring entries the store has not read yet
+    assert [str(record["result"]) for record in reopened.get_history()] == results(path)
+
+def test_compaction_merges_segments(tmp_path):
+    """Compaction merges adjacent segments up to compact_rows entries without changing the history."""
+    path, calc = segmented(tmp_path, max_rows=2, compact_rows=4)
+    add_entries(calc, 0, 9)
+    calc.close()
+    wait_for_background()  # Each seal already started a compaction
+    calc.compact_history()
+
+    manifest = json.load(open(manifest_path(path), encoding='utf-8'))
+    assert [segment["rows"] for segment in manifest["segments"]] == [4, 4]
+    assert results(path) == [str(i) for i in range(1, 10)]
+
+    calc.clear_history()
+    assert not segment_paths(path) and not os.path.exists(manifest_path(path))
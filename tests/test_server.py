@@ -0,0 +1,131 @@
+""" Calculator Server Tests """
+import asyncio
+import os
+from calculator.expression import ExpressionEngine
+from calculator.server import CalculatorServer, Session, next_session_id
+
+def run_with_server(tmp_path, client, **options):
+    """Start a server on a free loopback port, run the client coroutine against it and stop the server."""
+    async def scenario():
+        server = CalculatorServer(str(tmp_path), port=0, **options)
+        host, port = await server.start()
+        try:
+            return await client(host, port)
+        finally:
+            await server.close()
+    return asyncio.run(scenario())
+
+async def request_all(host, port, lines):
+    """Send every line at once (pipelined), then read one response per line."""
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write("".join(f"{line}\n" for line in lines).encode('utf-8'))
+    await writer.drain()
+    responses = [(await reader.readline()).decode('utf-8').strip() for _ in lines]
+    writer.close()
+    await writer.wait_closed()
+    return responses
+
+def test_session_requests(tmp_path):
+    """Requests are answered in order, errors do not end the session."""
+    session = Session(1, str(tmp_path))
+    assert session.handle_many(["add 1 2", "divide 1 0", "add 1 2 3", "let x = 4", "eval x * 2", "", "sqrt 4"]) == [
+        "OK 3", "ERR division by zero", "OK 6", "OK 4", "OK 8", "ERR empty request", "ERR Unknown command: sqrt"]
+    assert session.handle("history count") == "OK 3"  # let x = 4 binds a plain number, nothing is recorded
+    assert session.handle("history delete 2") == "OK 1"
+    assert session.handle("history use ../../escape.csv") == "OK escape.csv"
+    assert session.calculator.active_history_file == os.path.join(str(tmp_path), "escape.csv")
+    session.close()
+
+def test_history_use_rejects_unsafe_names(tmp_path):
+    """history use refuses names that resolve to a directory or a hidden sidecar file."""
+    session = Session(1, str(tmp_path))
+    for name in [".", "..", "data/..", ".session-1.csv.stats.json", "/"]:
+        assert session.handle(f"history use {name}").startswith("ERR invalid history file name")
+    assert session.handle("history file") == "OK session-1.csv"
+    session.close()
+
+def test_history_use_keeps_sessions_apart(tmp_path):
+    """A session cannot switch to another session's history, only to its own or a shared name."""
+    first, second = Session(1, str(tmp_path)), Session(2, str(tmp_path))
+    first.handle("add 1 2")
+    assert second.handle("history use session-1.csv") == "ERR session-1.csv belongs to another session"
+    assert second.handle("history use session-1.db") == "ERR session-1.db belongs to another session"
+    assert second.handle("history clear") == "OK 0"
+    assert first.handle("history count") == "OK 1"
+    assert second.handle("history use shared.csv") == "OK shared.csv"
+    assert second.handle("history use session-2.csv") == "OK session-2.csv"
+    first.close()
+    second.close()
+
+def test_unexpected_errors_end_only_the_request(tmp_path, monkeypatch):
+    """An exception the session does not expect is answered as an error and the session carries on."""
+    def evaluate(self, source, **bindings):
+        raise RecursionError(f"{source} nests too deeply")
+    monkeypatch.setattr(ExpressionEngine, "evaluate", evaluate)
+    session = Session(1, str(tmp_path))
+    assert session.handle_many(["eval 1 + 1", "add 1 2"]) == ["ERR internal error: RecursionError", "OK 3"]
+    session.close()
+
+def test_failed_batch_keeps_the_connection(tmp_path, monkeypatch):
+    """A batch that fails on the worker thread is answered with errors and later requests are still served."""
+    batches = []
+    def handle_many(self, lines):
+        batches.append(lines)
+        if len(batches) == 1:
+            raise RuntimeError("worker failed")
+        return [self.handle(line) for line in lines]
+    monkeypatch.setattr(Session, "handle_many", handle_many)
+
+    async def client(host, port):
+        reader, writer = await asyncio.open_connection(host, port)
+        responses = []
+        for line in ["add 1 1", "add 2 2"]:
+            writer.write(f"{line}\n".encode('utf-8'))
+            responses.append((await reader.readline()).decode('utf-8').strip())
+        writer.close()
+        await writer.wait_closed()
+        return responses
+
+    assert run_with_server(tmp_path, client) == ["ERR internal error: RuntimeError", "OK 4"]
+
+def test_session_ids_survive_a_restart(tmp_path):
+    """A restarted server numbers its sessions after the history files already on disk."""
+    (tmp_path / "session-7.csv").write_text("operation,operands,result\n", encoding='utf-8')
+    (tmp_path / "session-9.csv.stats.json").write_text("{}", encoding='utf-8')
+    assert next_session_id(str(tmp_path)) == 8
+    responses = run_with_server(tmp_path, lambda host, port: request_all(host, port, ["history file"]))
+    assert responses == ["OK session-8.csv"]
+
+def test_pipelined_requests(tmp_path):
+    """Many pipelined requests come back in order and end up in the session's own history file."""
+    lines = [f"add {i} {i}" for i in range(500)] + ["history count", "quit"]
+    responses = run_with_server(tmp_path, lambda host, port: request_all(host, port, lines), max_pending=8)
+    assert responses[:500] == [f"OK {2 * i}" for i in range(500)]
+    assert responses[500:] == ["OK 500", "OK bye"]
+    with open(tmp_path / "session-1.csv", 'r', encoding='utf-8') as f:
+        assert len(f.readlines()) == 501
+
+def test_concurrent_sessions_are_isolated(tmp_path):
+    """Clients running at the same time each get their own history file."""
+    async def clients(host, port):
+        return await asyncio.gather(*(
+            request_all(host, port, [f"multiply {n} {i}" for i in range(50)] + ["history file", "history count"])
+            for n in range(1, 5)))
+
+    results = run_with_server(tmp_path, clients)
+    assert sorted(responses[-2] for responses in results) == [f"OK session-{n}.csv" for n in range(1, 5)]
+    assert all(responses[-1] == "OK 50" for responses in results)
+    for responses in results:
+        factor = int(responses[1].split()[1])  # multiply n 1
+        assert responses[:50] == [f"OK {factor * i}" for i in range(50)]
+
+def test_slow_reader_does_not_stall_others(tmp_path):
+    """A client that never reads its responses is pushed back without blocking other clients."""
+    async def clients(host, port):
+        _, flooding = await asyncio.open_connection(host, port)
+        flooding.write(b"add 1 1\n" * 200000)  # Far more than the socket buffers hold, never read back
+        responses = await asyncio.wait_for(request_all(host, port, ["ping", "add 2 2"]), timeout=10)
+        flooding.transport.abort()
+        return responses
+
+    assert run_with_server(tmp_path, clients, max_pending=4) == ["OK pong", "OK 4"]
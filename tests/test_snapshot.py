@@ -0,0 +1,69 @@
+""" History Snapshot Tests """
+import os
+from decimal import Decimal
+from calculator import Calculator
+from calculator.storage import FlushPolicy, open_store, schedule_snapshot, snapshot_path, write_snapshot
+from calculator.storage.snapshot import read_snapshot_header
+
+def write_csv(path, count, start=0):
+    """Append count add entries to a CSV history, writing the header for a new file."""
+    new = not os.path.isfile(path)
+    with open(path, 'a', encoding='utf-8') as f:
+        if new:
+            f.write("operation,operands,result\n")
+        for i in range(start, start + count):
+            f.write(f"add,{i} 1,{i + 1}\n")
+
+def test_open_replays_only_the_journal(tmp_path):
+    """Entries covered by the snapshot are read only when the store needs them."""
+    path = str(tmp_path / 'history.csv')
+    write_csv(path, 5)
+    assert write_snapshot(path) == 5
+    write_csv(path, 2, start=5)
+
+    store = open_store(path)
+    assert len(store) == 7
+    assert not store.loaded
+    store.append("add", "7 1", "8")
+    store.truncate(4)  # Two in memory and two from the snapshot
+    assert not store.loaded
+    assert store.column("operands") == ["0 1", "1 1", "2 1", "3 1"]
+    assert store.loaded
+
+def test_truncated_journal_is_replayed(tmp_path):
+    """A snapshot covering entries deleted from the file is ignored."""
+    path = str(tmp_path / 'history.csv')
+    write_csv(path, 4)
+    write_snapshot(path)
+    calc = Calculator(history_file=path, flush_policy=FlushPolicy(snapshot_every=0))
+    calc.delete_last_calculation(2)
+    calc.add_to_history("multiply", [Decimal(2), Decimal(3)], Decimal(6))
+    calc.close()
+
+    reopened = Calculator(history_file=path)
+    assert reopened.store.loaded  # Nothing deferred, the snapshot no longer matches
+    assert reopened.store.column("operation") == ["add", "add", "multiply"]
+
+def test_long_journal_is_snapshotted_in_background(tmp_path):
+    """Appends past snapshot_every rewrite the snapshot, later opens start from it."""
+    path = str(tmp_path / 'history.csv')
+    calc = Calculator(history_file=path, flush_policy=FlushPolicy(snapshot_every=3))
+    for i in range(4):
+        calc.add_to_history("add", [Decimal(i), Decimal(1)], Decimal(i + 1))
+    calc.close()
+    schedule_snapshot(path).join()
+
+    assert read_snapshot_header(path)["rows"] >= 3
+    reopened = Calculator(history_file=path)
+    assert not reopened.store.loaded
+    assert [record["result"] for record in reopened.get_history()] == [Decimal(1), Decimal(2), Decimal(3), Decimal(4)]
+
+def test_clear_removes_snapshot(tmp_path):
+    """Clearing the history deletes its snapshot with it."""
+    path = str(tmp_path / 'history.csv')
+    write_csv(path, 3)
+    write_snapshot(path)
+    calc = Calculator(history_file=path)
+    calc.clear_history()
+    assert not os.path.exists(snapshot_path(path))
+    assert len(calc.store) == 0
@@ -0,0 +1,103 @@
+""" SQLite History Tests """
+import sqlite3
+import time
+from decimal import Decimal
+from fractions import Fraction
+import pytest
+from calculator import Calculator
+from calculator.numeric import get_backend
+from calculator.plugins.history import HistoryCommand
+from calculator.storage import FlushPolicy, SqliteHistoryFile, file_format, query_rows, read_history, tail_rows
+
+@pytest.fixture
+def sqlite_calculator(tmp_path):
+    """A calculator on a SQLite history file with a few entries."""
+    calc = Calculator(history_file=str(tmp_path / "history.db"), flush_policy=FlushPolicy(max_entries=4))
+    for operation, operand1, operand2, result in [
+            ("add", 1, 2, 3), ("divide", 10, 4, "2.5"), ("divide", 90, 3, 30), ("multiply", 6, 7, 42),
+            ("divide", 50, 2, 25), ("add", 5, 5, 10)]:
+        calc.add_to_history(operation, [Decimal(operand1), Decimal(operand2)], Decimal(result))
+    return calc
+
+def test_sqlite_format_and_schema(sqlite_calculator):
+    """.db files use WAL mode, the indexes exist and rows are inserted in batches."""
+    assert file_format("history.sqlite") == "sqlite"
+    sqlite_calculator.save_history()
+    with sqlite3.connect(sqlite_calculator.active_history_file) as connection:
+        assert connection.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        indexes = {row[1] for row in connection.execute("PRAGMA index_list(history)")}
+        assert {"history_operation_value", "history_timestamp"} <= indexes
+        plan = connection.execute("EXPLAIN QUERY PLAN SELECT * FROM history WHERE operation = 'divide' "
+                                  "AND value >= 20").fetchall()
+        assert "history_operation_value" in str(plan)
+    assert isinstance(sqlite_calculator.history_writer, SqliteHistoryFile)
+
+def test_query_filters_run_in_sqlite(sqlite_calculator):
+    """Operation, result range and last-N filters are combined."""
+    assert sqlite_calculator.query_history(operation="divide", min_result=Decimal(20)) == [
+        ("divide", "90 3", "30"), ("divide", "50 2", "25")]
+    assert sqlite_calculator.query_history(last=2) == [("divide", "50 2", "25"), ("add", "5 5", "10")]
+    assert sqlite_calculator.query_history(operation="add", max_result=5) == [("add", "1 2", "3")]
+    assert sqlite_calculator.query_history(since=time.time() + 60) == []
+
+@pytest.mark.parametrize("extension", ["db", "csv"])
+def test_query_fraction_and_float_results(tmp_path, extension):
+    """Range filters compare the value of "n/d" and "f" suffixed results, the same on SQLite and CSV files."""
+    calc = Calculator(history_file=str(tmp_path / f"history.{extension}"), backend=get_backend("fraction"))
+    calc.add_to_history("divide", [Fraction(1), Fraction(3)], Fraction(1, 3))
+    calc.add_to_history("divide", [Fraction(6), Fraction(2)], Fraction(3))
+    calc.add_to_history("add", [0.1, 0.2], 0.1 + 0.2)
+    calc.add_to_history("add", [25.5, 0.5], 26.0)
+    calc.save_history()
+    assert calc.query_history(min_result=Decimal("0.9")) == [
+        ("divide", "6/1 2/1", "3/1"), ("add", "25.5f 0.5f", "26.0f")]
+    assert calc.query_history(max_result=Decimal("0.31")) == [("add", "0.1f 0.2f", "0.30000000000000004f")]
+    assert calc.query_history(operation="divide", max_result=1) == [("divide", "1/1 3/1", "1/3")]
+
+def test_database_without_value_column(tmp_path):
+    """A database written before the value column gets one, filled in from the existing results."""
+    path = str(tmp_path / "history.db")
+    with sqlite3.connect(path) as connection:
+        connection.execute("CREATE TABLE history (id INTEGER PRIMARY KEY AUTOINCREMENT, operation TEXT NOT NULL,"
+                           " operands TEXT NOT NULL, result TEXT NOT NULL, timestamp REAL NOT NULL)")
+        connection.execute("CREATE INDEX history_operation ON history (operation, CAST(result AS REAL))")
+        connection.executemany("INSERT INTO history (operation, operands, result, timestamp) VALUES (?, ?, ?, 0)",
+                               [("divide", "1/1 3/1", "1/3"), ("add", "1 2", "3")])
+    connection.close()
+    assert query_rows(path, min_result="0.9") == [("add", "1 2", "3")]
+    with sqlite3.connect(path) as connection:
+        indexes = {row[1] for row in connection.execute("PRAGMA index_list(history)")}
+    connection.close()
+    assert "history_operation" not in indexes and "history_operation_value" in indexes
+
+def test_query_on_csv_streams(tmp_path):
+    """CSV files give the same answers without timestamps."""
+    calc = Calculator(history_file=str(tmp_path / "history.csv"))
+    calc.add_to_history("divide", [Decimal(9), Decimal(3)], Decimal(3))
+    calc.add_to_history("divide", [Decimal(8), Decimal(2)], Decimal(4))
+    assert query_rows(calc.active_history_file, operation="divide", min_result="3.5") == [("divide", "8 2", "4")]
+    with pytest.raises(ValueError):
+        calc.query_history(since=0)
+
+def test_reload_delete_and_convert(sqlite_calculator, tmp_path):
+    """A database is read back in order, loses its newest rows on delete and converts to other formats."""
+    sqlite_calculator.save_history()
+    reopened = Calculator(history_file=sqlite_calculator.active_history_file)
+    assert len(reopened.get_history()) == 6
+    reopened.delete_last_calculation(2)
+    assert tail_rows(reopened.active_history_file, 1) == [("multiply", "6 7", "42")]
+    assert len(reopened.get_history()) == 4
+    reopened.save_as_new_file(str(tmp_path / "data_copy.csv"))
+    assert read_history(str(tmp_path / "data_copy.csv"))["result"].tolist() == ["3", "2.5", "30", "42"]
+
+def test_parse_query_options():
+    """Query arguments become typed filters."""
+    assert HistoryCommand.parse_query_options(["--op", "divide", "--min", "2.5", "--last", "10"]) == {
+        "operation": "divide", "min_result": Decimal("2.5"), "last": 10}
+    assert HistoryCommand.parse_query_options(["--since", "2024-01-01"])["since"] > 0
+    with pytest.raises(ValueError):
+        HistoryCommand.parse_query_options(["--op"])
+    with pytest.raises(ValueError):
+        HistoryCommand.parse_query_options(["--last", "0"])
+    with pytest.raises(ValueError, match="invalid number for --min: ten"):
+        HistoryCommand.parse_query_options(["--min", "ten"])
@@ -0,0 +1,82 @@
+""" History Statistics Tests """
+import os
+from decimal import Decimal
+import numpy as np
+import pytest
+from calculator import Calculator
+from calculator.numeric import get_backend
+from calculator.stats import HistoryStats, stats_path
+
+@pytest.fixture
+def calculator(calculator):
+    """The shared calculator with a few entries of two operations."""
+    for operand1, operand2 in [(1, 2), (10, 20), (3, 4)]:
+        calculator.add_to_history("add", [Decimal(operand1), Decimal(operand2)], Decimal(operand1 + operand2))
+    calculator.add_to_history("divide", [Decimal(1), Decimal(4)], Decimal("0.25"))
+    return calculator
+
+def test_incremental_matches_rebuild(calculator):
+    """Aggregates kept while adding equal the ones computed from scratch."""
+    summary = calculator.history_stats()
+    assert summary["add"]["count"] == 3
+    assert summary["add"]["results"] == {
+        "count": 3, "sum": Decimal(40), "mean": Decimal(40) / 3, "min": Decimal(3), "max": Decimal(30)}
+    assert summary["add"]["operands"]["max"] == Decimal(20)
+    assert summary["divide"]["arity"] == {2: 1}
+    assert calculator.history_stats(rebuild=True) == summary
+
+def test_delete_and_clear(calculator):
+    """Deleting the current maximum recomputes the extremes, clearing empties the summary."""
+    calculator.add_to_history("add", [Decimal(50), Decimal(50)], Decimal(100))
+    calculator.delete_last_calculation(2)
+    summary = calculator.history_stats()
+    assert summary["add"]["results"]["max"] == Decimal(30)
+    assert summary["add"]["results"]["sum"] == Decimal(40)
+    assert "divide" not in summary
+
+    calculator.clear_history()
+    assert calculator.history_stats() == {}
+    assert not os.path.exists(stats_path(calculator.active_history_file))
+
+def test_summary_file_is_reused(calculator, monkeypatch):
+    """A reopened history uses the saved summary instead of recomputing it, unless the file changed."""
+    calculator.close()
+    assert os.path.isfile(stats_path(calculator.active_history_file))
+
+    def no_rebuild(*args):
+        raise AssertionError("summary was recomputed")
+    monkeypatch.setattr(HistoryStats, "from_columns", classmethod(no_rebuild))
+    reopened = Calculator(history_file=calculator.active_history_file)
+    assert reopened.history_stats()["add"]["count"] == 3
+    monkeypatch.undo()
+
+    with open(calculator.active_history_file, 'a', encoding='utf-8') as f:
+        f.write("multiply,2 3,6\n")  # Written behind the summary's back
+    changed = Calculator(history_file=calculator.active_history_file)
+    assert changed.history_stats()["multiply"]["count"] == 1
+
+def test_bulk_blocks(tmp_path):
+    """Vectorized blocks are summarized without converting every element."""
+    calc = Calculator(history_file=str(tmp_path / "history.csv"))
+    calc.add_many_to_history("multiply", [np.array([1.5, 2.0]), np.array([2.0, 4.0])], np.array([3.0, 8.0]))
+    results = calc.history_stats()["multiply"]["results"]
+    assert (results["count"], results["sum"], results["min"], results["max"]) == (2, 11, 3, 8)
+
+def test_session_precision_does_not_round_aggregates(tmp_path):
+    """Aggregates keep their own precision even when entries arrive under a low-precision session context."""
+    backend = get_backend("decimal", precision=3)
+    calc = Calculator(history_file=str(tmp_path / "history.csv"), backend=backend)
+    with backend.active():
+        calc.add_to_history("add", [Decimal(100000), Decimal(3)], Decimal(100003))
+        calc.add_to_history("add", [Decimal(1), Decimal(2)], Decimal(3))
+        operands = calc.history_stats()["add"]["operands"]
+    assert (operands["sum"], operands["mean"]) == (Decimal(100006), Decimal("25001.5"))
+    assert calc.history_stats(rebuild=True)["add"]["operands"]["sum"] == Decimal(100006)
+
+def test_show_stats(calculator, capsys):
+    """The table lists every operation with its operand aggregates."""
+    calculator.show_stats()
+    out = capsys.readouterr().out
+    assert "History Statistics:" in out
+    assert "add" in out and "divide" in out and "operands" in out
+    assert "2 operands: 3" in out
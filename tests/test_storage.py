@@ -0,0 +1,120 @@
+""" History Storage Tests """
+import time
+import pytest
+from calculator import Calculator
+from calculator.storage import CsvHistoryFile, FlushPolicy, csv_file
+
+def read_lines(path):
+    """Return the lines of a file, or an empty list if it does not exist."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read().splitlines()
+    except FileNotFoundError:
+        return []
+
+def test_flush_after_n_entries(tmp_path):
+    """Rows stay buffered until the entry limit is reached."""
+    path = str(tmp_path / 'history.csv')
+    history_file = CsvHistoryFile(path, FlushPolicy(max_entries=3))
+    history_file.append(("add", "[1, 2]", 3))
+    history_file.append(("add", "[2, 2]", 4))
+    assert not read_lines(path)
+    assert history_file.pending == 2
+
+    history_file.append(("add", "[3, 2]", 5))
+    assert read_lines(path) == ["operation,operands,result", 'add,"[1, 2]",3', 'add,"[2, 2]",4', 'add,"[3, 2]",5']
+    history_file.close()
+
+def test_flush_after_delay(tmp_path):
+    """A quiet buffer is written once the delay has passed."""
+    path = str(tmp_path / 'history.csv')
+    history_file = CsvHistoryFile(path, FlushPolicy(max_entries=100, max_delay_ms=20))
+    history_file.append(("add", "[1, 2]", 3))
+    deadline = time.monotonic() + 2
+    while history_file.pending and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(read_lines(path)) == 2
+    history_file.close()
+
+def test_handle_is_reused(tmp_path):
+    """Consecutive flushes write through the same handle and only one header."""
+    path = str(tmp_path / 'history.csv')
+    history_file = CsvHistoryFile(path, FlushPolicy(max_entries=1, fsync=True))
+    history_file.append(("add", "[1, 2]", 3))
+    handle = history_file._handle  # pylint: disable=protected-access
+    history_file.append(("add", "[2, 2]", 4))
+    assert history_file._handle is handle  # pylint: disable=protected-access
+    history_file.close()
+    assert len(read_lines(path)) == 3
+
+def test_invalid_policy():
+    """A policy has to flush at some point."""
+    with pytest.raises(ValueError):
+        FlushPolicy(max_entries=0)
+
+def test_calculator_flushes_on_save_and_close(tmp_path):
+    """Buffered calculator entries reach the file on save_history and close."""
+    path = str(tmp_path / 'history.csv')
+    calc = Calculator(history_file=path, flush_policy=FlushPolicy(max_entries=10))
+    calc.add_to_history("add", [1, 2], 3)
+    assert not read_lines(path)
+
+    calc.save_history()
+    assert len(read_lines(path)) == 2
+
+    calc.add_to_history("add", [2, 2], 4)
+    calc.close()
+    assert len(read_lines(path)) == 3
+
+def test_clear_discards_buffered_entries(tmp_path):
+    """Clearing history drops entries that were never written."""
+    path = str(tmp_path / 'history.csv')
+    calc = Calculator(history_file=path, flush_policy=FlushPolicy(max_entries=10))
+    calc.add_to_history("add", [1, 2], 3)
+    calc.clear_history()
+    calc.close()
+    assert not read_lines(path)
+
+@pytest.mark.parametrize("block_size", [4, 65536])
+def test_delete_last_truncates_file(tmp_path, monkeypatch, block_size):
+    """The last rows are cut off the end of the file and returned, the header stays."""
+    monkeypatch.setattr(csv_file, "BLOCK_SIZE", block_size)
+    path = str(tmp_path / 'history.csv')
+    history_file = CsvHistoryFile(path)
+    for i in range(5):
+        history_file.append(("add", f"{i} 1", str(i + 1)))
+
+    assert history_file.delete_last(2) == [("add", "3 1", "4"), ("add", "4 1", "5")]
+    assert read_lines(path) == ["operation,operands,result", "add,0 1,1", "add,1 1,2", "add,2 1,3"]
+
+    assert len(history_file.delete_last(10)) == 3
+    assert read_lines(path) == ["operation,operands,result"]
+    assert not history_file.delete_last()
+
+    history_file.append(("multiply", "2 3", "6"))
+    history_file.close()
+    assert read_lines(path) == ["operation,operands,result", "multiply,2 3,6"]
+
+def test_delete_last_takes_buffered_rows_first(tmp_path):
+    """Rows that were never written are dropped from the buffer before the file is touched."""
+    path = str(tmp_path / 'history.csv')
+    history_file = CsvHistoryFile(path, FlushPolicy(max_entries=2))
+    history_file.append(("add", "1 1", "2"))
+    history_file.append(("add", "2 1", "3"))
+    history_file.append(("add", "3 1", "4"))
+
+    assert history_file.delete_last(2) == [("add", "2 1", "3"), ("add", "3 1", "4")]
+    assert history_file.pending == 0
+    assert read_lines(path) == ["operation,operands,result", "add,1 1,2"]
+
+def test_calculator_delete_updates_history(tmp_path):
+    """Deleting entries also removes them from the in-memory history."""
+    path = str(tmp_path / 'history.csv')
+    calc = Calculator(history_file=path)
+    calc.add_to_history("add", [1, 2], 3)
+    calc.add_to_history("add", [2, 2], 4)
+    calc.add_to_history("add", [3, 2], 5)
+
+    calc.delete_last_calculation(2)
+    assert calc.history.shape[0] == 1
+    assert read_lines(path) == ["operation,operands,result", "add,1 2,3"]
@@ -0,0 +1,39 @@
+""" History Store Tests """
+import pandas as pd
+from calculator.store import HistoryStore
+
+def test_append_and_frame():
+    """Appended entries show up in the DataFrame."""
+    store = HistoryStore()
+    store.append("add", "[1, 2]", 3)
+    store.append("multiply", "[2, 3]", 6)
+    frame = store.to_frame()
+
+    assert len(store) == 2
+    assert list(frame.columns) == ["operation", "operands", "result"]
+    assert frame.iloc[1]['operation'] == "multiply"
+
+def test_frame_is_cached_until_append():
+    """The DataFrame is reused until the store changes."""
+    store = HistoryStore()
+    store.append("add", "[1, 2]", 3)
+    frame = store.to_frame()
+    assert store.to_frame() is frame
+
+    store.append("add", "[2, 2]", 4)
+    assert store.to_frame() is not frame
+    assert store.to_frame().shape[0] == 2
+
+def test_from_frame_and_records():
+    """A store built from a DataFrame returns the same records."""
+    frame = pd.DataFrame({"operation": ["subtract"], "operands": ["[5, 2]"], "result": [3]})
+    store = HistoryStore.from_frame(frame)
+    assert store.records() == [{"operation": "subtract", "operands": "[5, 2]", "result": 3}]
+
+def test_clear():
+    """Clearing empties the store and its DataFrame."""
+    store = HistoryStore()
+    store.append("add", "[1, 2]", 3)
+    store.clear()
+    assert len(store) == 0
+    assert store.to_frame().empty